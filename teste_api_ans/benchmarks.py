@@ -0,0 +1,533 @@
+import argparse
+import contextlib
+import functools
+import io
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import pandas as pd  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    pd = None
+
+import cnpj_cache
+import consolidate_ans_expenses
+import download_ans_demos
+import operadoras_lookup
+import process_ans_files
+
+SYNTHETIC_HEADER = (
+    "DATA;REG_ANS;CD_CONTA_CONTABIL;DESCRICAO;VL_SALDO_INICIAL;VL_SALDO_FINAL\n"
+)
+SYNTHETIC_ACCOUNTS = [
+    ("41", "EVENTOS INDENIZÁVEIS LÍQUIDOS / SINISTROS RETIDOS"),
+    ("411", "Despesas com Eventos / Sinistros"),
+    ("4111", "Despesas com Eventos / Sinistros - Judicial"),
+    ("31", "CONTRAPRESTAÇÕES EFETIVAS DE PLANO DE ASSISTÊNCIA À SAÚDE"),
+    ("46", "DESPESAS ADMINISTRATIVAS"),
+    ("4119", "DESPESA COM SINISTROS - CORRESPONSABILIDADE"),
+]
+
+
+class StubHandler(SimpleHTTPRequestHandler):
+    delay = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def list_directory(self, path):
+        if self.delay:
+            time.sleep(self.delay)
+        return super().list_directory(path)
+
+
+@contextmanager
+def serve_directory(root, delay=0.0):
+    handler_cls = type("DelayedStubHandler", (StubHandler,), {"delay": delay})
+    handler = functools.partial(handler_cls, directory=root)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.request_queue_size = 128
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def build_stub_tree(root, years, subdirs):
+    listings = 1
+    for year in range(2024 - years + 1, 2025):
+        listings += 1
+        for quarter in range(1, 5):
+            quarter_dir = os.path.join(root, str(year), f"{quarter}T")
+            listings += 1
+            for idx in range(subdirs):
+                sub_dir = os.path.join(quarter_dir, f"parte{idx}")
+                os.makedirs(sub_dir, exist_ok=True)
+                listings += 1
+                with open(os.path.join(sub_dir, f"{quarter}T{year}.zip"), "wb") as f:
+                    f.write(b"PK")
+    return listings
+
+
+def crawl_all(base_url, timeout, workers, max_depth):
+    quarter_map = download_ans_demos.gather_quarter_entries(
+        base_url, timeout, workers=workers
+    )
+    dir_entries = [
+        entry
+        for entries in quarter_map.values()
+        for entry in entries
+        if download_ans_demos.is_dir_link(entry)
+    ]
+    listings = download_ans_demos.crawl_links(dir_entries, timeout, max_depth, workers)
+    files = []
+    for entry in dir_entries:
+        files.extend(
+            download_ans_demos.collect_files(
+                entry, timeout, None, max_depth, listings=listings
+            )
+        )
+    return quarter_map, sorted(files)
+
+
+def bench_crawl(args):
+    with tempfile.TemporaryDirectory() as root:
+        listings = build_stub_tree(root, args.years, args.subdirs)
+        with serve_directory(root, delay=args.delay) as base_url:
+            results = {}
+            for workers in (1, args.workers):
+                start = time.perf_counter()
+                results[workers] = crawl_all(base_url, 10, workers, 2)
+                elapsed = time.perf_counter() - start
+                print(
+                    f"crawl workers={workers:>3}: {elapsed:.2f}s "
+                    f"({listings} listagens, {len(results[workers][1])} arquivos)"
+                )
+            assert results[1] == results[args.workers], "resultado divergente"
+
+
+def synthetic_lines(rows, seed=0):
+    for idx in range(rows):
+        code, desc = SYNTHETIC_ACCOUNTS[(idx + seed) % len(SYNTHETIC_ACCOUNTS)]
+        reg_ans = 300000 + (idx * 7919 + seed) % 1500
+        month = 1 + 3 * ((idx // 1000) % 4)
+        valor = f"{(idx * 37 % 10_000_000) / 100:,.2f}"
+        valor = valor.replace(",", "_").replace(".", ",").replace("_", ".")
+        yield (
+            f'2024-{month:02d}-01;"{reg_ans}";"{code}{idx % 97:02d}";"{desc}";'
+            f'"0,00";"{valor}"\n'
+        )
+
+
+def build_synthetic_zips(root, files, rows):
+    os.makedirs(root, exist_ok=True)
+    for idx in range(files):
+        zip_path = os.path.join(root, f"{idx % 4 + 1}T{2024 - idx // 4}.zip")
+        member = os.path.splitext(os.path.basename(zip_path))[0] + ".csv"
+        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            with zf.open(member, "w") as f:
+                f.write(SYNTHETIC_HEADER.encode("utf-8"))
+                batch = []
+                for line in synthetic_lines(rows, seed=idx):
+                    batch.append(line)
+                    if len(batch) >= 50_000:
+                        f.write("".join(batch).encode("utf-8"))
+                        batch = []
+                f.write("".join(batch).encode("utf-8"))
+
+
+def bench_process(args):
+    with tempfile.TemporaryDirectory() as root:
+        input_dir = os.path.join(root, "input")
+        build_synthetic_zips(input_dir, args.files, args.rows)
+        total_rows = args.files * args.rows
+        print(f"{args.files} arquivos x {args.rows:,} linhas, {os.cpu_count()} CPUs")
+        baseline = None
+        for jobs in [int(value) for value in args.jobs.split(",")]:
+            output_dir = os.path.join(root, f"out_{jobs}")
+            argv = ["--input-dir", input_dir, "--output-dir", output_dir]
+            argv += ["--manifest", "", "--jobs", str(jobs)]
+            argv += list(args.extra)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                process_ans_files.main(argv)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(
+                f"process jobs={jobs:>2}: {elapsed:.2f}s "
+                f"({total_rows / elapsed:,.0f} linhas/s, speedup {baseline / elapsed:.2f}x)"
+            )
+
+
+def bench_engines(args):
+    with tempfile.TemporaryDirectory() as root:
+        source = os.path.join(root, "1T2024.csv")
+        with open(source, "w", encoding="utf-8", newline="") as f:
+            f.write(SYNTHETIC_HEADER)
+            f.writelines(synthetic_lines(args.rows))
+        outputs = {}
+        for engine in process_ans_files.ENGINES:
+            start = time.perf_counter()
+            entry = process_ans_files.process_file(source, root, engine=engine)
+            elapsed = time.perf_counter() - start
+            with open(entry["output_file"], "rb") as f:
+                outputs[engine] = f.read()
+            print(
+                f"engine {engine:>10}: {elapsed:.2f}s "
+                f"({args.rows / elapsed:,.0f} linhas/s, {entry['rows_written']} filtradas)"
+            )
+        assert len(set(outputs.values())) == 1, "saidas divergentes entre engines"
+
+
+def build_synthetic_operadoras(path):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write("Registro_Operadora;CNPJ;Razao_Social\n")
+        for idx in range(1500):
+            f.write(f"{300000 + idx};{idx:014d};OPERADORA SINTETICA {idx}\n")
+
+
+def time_loads(label, csv_path, read_csv, repeat):
+    parquet_path = os.path.splitext(csv_path)[0] + ".parquet"
+    csv_size = os.path.getsize(csv_path)
+    parquet_size = os.path.getsize(parquet_path)
+    timings = {}
+    for fmt, reader in (
+        ("csv", lambda: read_csv(csv_path)),
+        ("parquet", lambda: pd.read_parquet(parquet_path)),
+    ):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            frame = reader()
+        timings[fmt] = (time.perf_counter() - start) / repeat
+    print(
+        f"{label:>12}: {len(frame):,} linhas | csv {csv_size / 1e6:.1f} MB "
+        f"em {timings['csv']:.3f}s | parquet {parquet_size / 1e6:.1f} MB "
+        f"em {timings['parquet']:.3f}s "
+        f"({csv_size / parquet_size:.1f}x menor, "
+        f"{timings['csv'] / timings['parquet']:.1f}x mais rapido)"
+    )
+
+
+def bench_formats(args):
+    with tempfile.TemporaryDirectory() as root:
+        source = os.path.join(root, "1T2024.csv")
+        with open(source, "w", encoding="utf-8", newline="") as f:
+            f.write(SYNTHETIC_HEADER)
+            f.writelines(synthetic_lines(args.rows))
+        entry = process_ans_files.process_file(
+            source, os.path.join(root, "normalized"), engine="vectorized"
+        )
+        normalized_csv = entry["output_file"]
+        process_ans_files.write_parquet_copy(normalized_csv)
+        time_loads(
+            "normalizado",
+            normalized_csv,
+            lambda path: pd.read_csv(
+                path, dtype={"cnpj": str, "reg_ans": str}, keep_default_na=False
+            ),
+            args.repeat,
+        )
+
+        operadoras = os.path.join(root, "operadoras.csv")
+        build_synthetic_operadoras(operadoras)
+        consolidate_ans_expenses.OPERADORAS_LOCAL_PATH = operadoras
+        os.environ["ANS_OFFLINE"] = "1"
+        rows, _ = consolidate_ans_expenses.consolidate(os.path.dirname(normalized_csv))
+        consolidated_csv = os.path.join(root, "consolidado_despesas.csv")
+        consolidate_ans_expenses.write_output(rows.rows(), consolidated_csv)
+        process_ans_files.write_parquet_copy(
+            consolidated_csv, consolidate_ans_expenses.CONSOLIDATED_PARQUET_COLUMNS
+        )
+        time_loads(
+            "consolidado",
+            consolidated_csv,
+            lambda path: pd.read_csv(path, dtype={"CNPJ": str, "RazaoSocial": str}),
+            args.repeat,
+        )
+
+
+NORMALIZED_HEADER = (
+    "cnpj,reg_ans,razao_social,valor_despesas,descricao,"
+    "competencia_raw,ano,trimestre,source_file\n"
+)
+
+
+def build_synthetic_normalized(root, quarters, rows):
+    os.makedirs(root, exist_ok=True)
+    for quarter in range(quarters):
+        year, trimestre = 2024 - quarter // 4, quarter % 4 + 1
+        path = os.path.join(root, f"{trimestre}T{year}.csv")
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(NORMALIZED_HEADER)
+            batch = []
+            for idx in range(rows):
+                reg_ans = 300000 + (idx * 7919 + quarter) % 1500
+                valor = (idx * 37 % 10_000_000) / 100 - 10
+                batch.append(
+                    f",{reg_ans},,{valor:.2f},Despesas com Eventos / Sinistros,"
+                    f"{year}-{3 * trimestre:02d},{year},{trimestre},{path}\n"
+                )
+                if len(batch) >= 50_000:
+                    f.writelines(batch)
+                    batch = []
+            f.writelines(batch)
+
+
+def traced(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            func(*args)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def consolidate_as_dicts(input_dir, output_csv, issues_csv):
+    # Representacao anterior: um dict por linha com listas de strings proprias.
+    operadoras_map = consolidate_ans_expenses.load_operadoras_or_warn()
+    entries = [
+        {"cnpj": base_row[0], "base_row": base_row, "issues": issues, "source": src}
+        for base_row, issues, src in consolidate_ans_expenses.iter_consolidated_rows(
+            input_dir, operadoras_map
+        )
+    ]
+    razoes = {}
+    for entry in entries:
+        if entry["cnpj"] and entry["base_row"][1]:
+            razoes.setdefault(entry["cnpj"], set()).add(entry["base_row"][1])
+    duplicated = {cnpj for cnpj, names in razoes.items() if len(names) > 1}
+    counts = defaultdict(int)
+    issue_rows = [
+        consolidate_ans_expenses.finalize_issues(
+            e["base_row"], e["issues"], e["source"], duplicated, counts
+        )
+        for e in entries
+    ]
+    consolidate_ans_expenses.write_output([e["base_row"] for e in entries], output_csv)
+    consolidate_ans_expenses.write_issues([r for r in issue_rows if r], issues_csv)
+
+
+def consolidate_compact(input_dir, output_csv, issues_csv):
+    rows, _ = consolidate_ans_expenses.consolidate(input_dir)
+    consolidate_ans_expenses.write_output(rows.rows(), output_csv)
+    consolidate_ans_expenses.write_issues(rows.issue_rows(), issues_csv)
+
+
+def bench_consolidate(args):
+    with tempfile.TemporaryDirectory() as root:
+        operadoras = os.path.join(root, "operadoras.csv")
+        build_synthetic_operadoras(operadoras)
+        consolidate_ans_expenses.OPERADORAS_LOCAL_PATH = operadoras
+        os.environ["ANS_OFFLINE"] = "1"
+        for quarters in [int(value) for value in args.quarters.split(",")]:
+            input_dir = os.path.join(root, f"normalized_{quarters}")
+            build_synthetic_normalized(input_dir, quarters, args.rows)
+            outputs = {}
+            for mode, func in (
+                ("dicts", consolidate_as_dicts),
+                ("compacto", consolidate_compact),
+                ("streaming", consolidate_ans_expenses.write_consolidated),
+            ):
+                output_csv = os.path.join(root, f"{mode}.csv")
+                issues_csv = os.path.join(root, f"{mode}_issues.csv")
+                elapsed, peak = traced(func, input_dir, output_csv, issues_csv)
+                with open(output_csv, "rb") as f:
+                    outputs[mode] = f.read()
+                print(
+                    f"{quarters:>2} trimestres x {args.rows:,} linhas | {mode:>9}: "
+                    f"pico {peak / 2**20:7.1f} MiB "
+                    f"({peak / 2**20 / (quarters * args.rows) * 1e6:6.1f} MiB/milhao "
+                    f"de linhas) em {elapsed:.2f}s"
+                )
+            assert len(set(outputs.values())) == 1, "saidas divergentes"
+
+
+def build_synthetic_cadop(path, rows):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(
+            "REGISTRO_OPERADORA;CNPJ;Razao_Social;Nome_Fantasia;Modalidade;"
+            "Logradouro;Numero;Complemento;Bairro;Cidade;UF;CEP;DDD;Telefone;"
+            "Endereco_eletronico;Data_Registro_ANS\n"
+        )
+        for idx in range(rows):
+            f.write(
+                f"{300000 + idx};{idx:014d};OPERADORA SINTÉTICA {idx} LTDA;;"
+                f"Medicina de Grupo;RUA {idx % 977};{idx % 3000};;CENTRO;"
+                f"São Paulo;SP;0{idx % 99999:05d}000;11;3{idx:07d};"
+                f"contato{idx}@exemplo.com.br;2015-05-19\n"
+            )
+
+
+def bench_operadoras(args):
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "operadoras_ativas.csv")
+        build_synthetic_cadop(path, args.rows)
+        snapshot = path + operadoras_lookup.SNAPSHOT_SUFFIX
+        timings = {"pandas read_csv": [], "frio (csv + snapshot)": [], "quente": []}
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            pd.read_csv(path, sep=";", dtype=str)
+            timings["pandas read_csv"].append(time.perf_counter() - start)
+            if os.path.exists(snapshot):
+                os.remove(snapshot)
+            start = time.perf_counter()
+            operadoras_lookup.load_lookup(path)
+            timings["frio (csv + snapshot)"].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            lookup = operadoras_lookup.load_lookup(path)
+            timings["quente"].append(time.perf_counter() - start)
+        print(
+            f"{len(lookup):,} operadoras, snapshot {os.path.getsize(snapshot) / 1e6:.1f} MB"
+        )
+        for label, values in timings.items():
+            print(f"{label:>22}: {min(values) * 1000:8.1f} ms")
+
+
+def synthetic_cnpjs(rows, distinct, seed=0):
+    # Poucos CNPJs distintos (um por operadora) repetidos em muitas linhas,
+    # metade com mascara, como no consolidado e no CADOP
+    rng = random.Random(seed)
+    pool = []
+    for idx in range(distinct):
+        digits = f"{rng.randrange(10**12):012d}"
+        for weights in (cnpj_cache.DV1_WEIGHTS, cnpj_cache.DV2_WEIGHTS):
+            digits += str(cnpj_cache.check_digit(digits, weights))
+        if idx % 2:
+            digits = (
+                f"{digits[:2]}.{digits[2:5]}.{digits[5:8]}/{digits[8:12]}-{digits[12:]}"
+            )
+        pool.append(digits)
+    return [pool[rng.randrange(distinct)] for _ in range(rows)]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def bench_cnpjs(args):
+    values = synthetic_cnpjs(args.rows, args.distinct)
+    series = pd.Series(values, dtype=object) if pd is not None else None
+    ratio = len(set(values)) / len(values)
+    print(f"{args.rows:,} linhas, {len(set(values)):,} CNPJs distintos ({ratio:.4%})")
+
+    def uncached_normalize():
+        return [re.sub(r"\D", "", value or "") for value in values]
+
+    def cached_normalize():
+        return [cnpj_cache.normalize_cnpj(value) for value in values]
+
+    def uncached_validate():
+        return [cnpj_cache.is_valid_cnpj.__wrapped__(value) for value in values]
+
+    def cached_validate():
+        return [cnpj_cache.is_valid_cnpj(value) for value in values]
+
+    cases = [
+        ("normalizar por linha", uncached_normalize, cached_normalize),
+        ("validar por linha", uncached_validate, cached_validate),
+    ]
+    if series is not None:
+        cases += [
+            (
+                "normalizar coluna",
+                lambda: series.apply(lambda x: "".join(filter(str.isdigit, str(x)))),
+                lambda: cnpj_cache.normalize_cnpjs(series),
+            ),
+            (
+                "validar coluna",
+                lambda: series.apply(cnpj_cache.is_valid_cnpj.__wrapped__),
+                lambda: cnpj_cache.validate_cnpjs(series),
+            ),
+        ]
+    for label, baseline, cached in cases:
+        cnpj_cache.clear_cache()
+        expected, elapsed_base = timed(baseline)
+        result, elapsed_cached = timed(cached)
+        assert list(expected) == list(result), f"divergencia em {label}"
+        misses = sum(info.misses for info in cnpj_cache.cache_info().values())
+        print(
+            f"{label:>20}: {elapsed_base:.2f}s -> {elapsed_cached:.2f}s "
+            f"(economia {elapsed_base - elapsed_cached:.2f}s, "
+            f"{elapsed_base / elapsed_cached:.1f}x, {misses:,} calculos)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do pipeline ANS (Teste 1).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    crawl = subparsers.add_parser("crawl", help="Descoberta de diretorios (1.1).")
+    crawl.add_argument("--years", type=int, default=25)
+    crawl.add_argument("--subdirs", type=int, default=3)
+    crawl.add_argument("--delay", type=float, default=0.01)
+    crawl.add_argument("--workers", type=int, default=16)
+    crawl.set_defaults(func=bench_crawl)
+
+    process = subparsers.add_parser(
+        "process", help="Processamento dos arquivos em paralelo (1.2)."
+    )
+    process.add_argument("--files", type=int, default=4)
+    process.add_argument("--rows", type=int, default=1_000_000)
+    process.add_argument("--jobs", default="1,2,4")
+    process.add_argument("extra", nargs="*", help="Argumentos extras do process_ans_files.")
+    process.set_defaults(func=bench_process)
+
+    engines = subparsers.add_parser(
+        "engines", help="Engine python x vectorized do processamento (1.2)."
+    )
+    engines.add_argument("--rows", type=int, default=2_000_000)
+    engines.set_defaults(func=bench_engines)
+
+    formats = subparsers.add_parser(
+        "formats", help="Tamanho e tempo de carga CSV x Parquet (1.2/1.3)."
+    )
+    formats.add_argument("--rows", type=int, default=2_000_000)
+    formats.add_argument("--repeat", type=int, default=3)
+    formats.set_defaults(func=bench_formats)
+
+    consolidate = subparsers.add_parser(
+        "consolidate", help="Memoria de pico da consolidacao (1.3), via tracemalloc."
+    )
+    consolidate.add_argument("--quarters", default="1,2,4")
+    consolidate.add_argument("--rows", type=int, default=100_000)
+    consolidate.set_defaults(func=bench_consolidate)
+
+    operadoras = subparsers.add_parser(
+        "operadoras", help="Carga do CADOP: parse frio x snapshot quente."
+    )
+    operadoras.add_argument("--rows", type=int, default=1_200)
+    operadoras.add_argument("--repeat", type=int, default=5)
+    operadoras.set_defaults(func=bench_operadoras)
+
+    cnpjs = subparsers.add_parser(
+        "cnpjs", help="Cache de normalizacao/validacao de CNPJ (1.3/2.1/API)."
+    )
+    cnpjs.add_argument("--rows", type=int, default=1_000_000)
+    cnpjs.add_argument("--distinct", type=int, default=1_500)
+    cnpjs.set_defaults(func=bench_cnpjs)
+
+    args = parser.parse_args()
+    args.func(args)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,104 @@
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict
+
+try:
+    import numpy as np  # type: ignore
+    import pandas as pd  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    np = None
+    pd = None
+
+
+# Poucos milhares de operadoras aparecem em milhoes de linhas: um cache
+# pequeno cobre todos os CNPJs distintos de uma execucao.
+CNPJ_CACHE_SIZE = 1 << 16
+DV1_WEIGHTS = (5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2)
+DV2_WEIGHTS = (6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2)
+
+
+@lru_cache(maxsize=CNPJ_CACHE_SIZE)
+def normalize_cnpj(value: str) -> str:
+    return re.sub(r"\D", "", value or "")
+
+
+def check_digit(digits: str, weights: tuple) -> int:
+    remainder = sum(int(d) * w for d, w in zip(digits, weights)) % 11
+    return 0 if remainder < 2 else 11 - remainder
+
+
+@lru_cache(maxsize=CNPJ_CACHE_SIZE)
+def is_valid_cnpj(value: str) -> bool:
+    digits = normalize_cnpj(value)
+    if len(digits) != 14 or len(set(digits)) == 1:
+        return False
+    return check_digit(digits, DV1_WEIGHTS) == int(digits[12]) and check_digit(
+        digits, DV2_WEIGHTS
+    ) == int(digits[13])
+
+
+def cache_info() -> Dict[str, Any]:
+    return {
+        "normalize": normalize_cnpj.cache_info(),
+        "validate": is_valid_cnpj.cache_info(),
+    }
+
+
+def clear_cache() -> None:
+    normalize_cnpj.cache_clear()
+    is_valid_cnpj.cache_clear()
+
+
+def require_pandas() -> None:
+    if pd is None:
+        raise RuntimeError("pandas nao esta instalado. Instale com: pip install pandas")
+
+
+def distinct_ratio(values: Any) -> float:
+    require_pandas()
+    if len(values) == 0:
+        return 0.0
+    return pd.Series(values).nunique(dropna=False) / len(values)
+
+
+def map_distinct(values: Any, func: Callable[[Any], Any], na_value: Any) -> Any:
+    # Fatoriza a coluna, aplica func uma vez por valor distinto e espalha o
+    # resultado pelos codigos; nulos (codigo -1) recebem na_value.
+    require_pandas()
+    codes, uniques = pd.factorize(values)
+    mapped = np.asarray(func(pd.Series(uniques)))
+    if mapped.dtype.kind in "US":
+        mapped = mapped.astype(object)
+    table = np.append(mapped, np.asarray([na_value], dtype=mapped.dtype))
+    return table[codes]
+
+
+def normalize_cnpjs(values: Any) -> Any:
+    return map_distinct(
+        values,
+        lambda uniques: np.array(
+            [normalize_cnpj(str(value)) for value in uniques], dtype=object
+        ),
+        "",
+    )
+
+
+def build_cnpj_index(values: Any) -> Dict[str, Any]:
+    # Indice CNPJ normalizado -> posicoes (crescentes) das linhas, para trocar
+    # varreduras da coluna inteira por um acesso ao dicionario
+    codes, uniques = pd.factorize(normalize_cnpjs(values))
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    return {
+        key: order[bounds[idx] : bounds[idx + 1]] for idx, key in enumerate(uniques)
+    }
+
+
+def validate_cnpjs(values: Any) -> Any:
+    return map_distinct(
+        values,
+        lambda uniques: np.array(
+            [is_valid_cnpj(str(value)) for value in uniques], dtype=bool
+        ),
+        False,
+    )
@@ -1,29 +1,63 @@
 import argparse
 import csv
+import hashlib
 import json
 import os
 import re
 import zipfile
+from array import array
 from collections import defaultdict
-from typing import Dict, Iterable, List, Optional, Tuple, TypedDict
-from urllib.error import HTTPError, URLError
-from urllib.request import Request, urlopen
+from http.client import HTTPException
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    cast,
+)
+from urllib.error import URLError
 
+import cnpj_cache
+import operadoras_lookup
+import process_ans_files
 
-class RowEntry(TypedDict):
-    cnpj: str
-    base_row: List[str]
-    issues: List[str]
-    source: str
+try:
+    import pyarrow.parquet as pq  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    pq = None
 
 
 DEFAULT_INPUT_DIR = os.path.join("data", "processed", "normalized")
 DEFAULT_OUTPUT_DIR = os.path.join("data", "processed")
-OPERADORAS_URL = (
-    "https://dadosabertos.ans.gov.br/FTP/PDA/"
-    "operadoras_de_plano_de_saude_ativas/Relatorio_cadop.csv"
+OPERADORAS_URL = operadoras_lookup.CADOP_URL
+OPERADORAS_LOCAL_PATH = operadoras_lookup.DEFAULT_CADOP_PATH
+OUTPUT_HEADER = ["CNPJ", "RazaoSocial", "Trimestre", "Ano", "ValorDespesas"]
+ISSUES_HEADER = OUTPUT_HEADER + ["Issues", "SourceFile"]
+ISSUE_CODES = (
+    "ano_invalido",
+    "trimestre_invalido",
+    "trimestre_corrigido_competencia",
+    "cnpj_ausente",
+    "razao_social_ausente",
+    "valor_invalido",
+    "valor_nao_positivo",
+    "cnpj_com_razoes_diferentes",
+)
+ISSUE_BITS = {name: 1 << idx for idx, name in enumerate(ISSUE_CODES)}
+CONSOLIDATE_STATE_VERSION = 1
+CONSOLIDATE_STATE_NAME = "consolidate_state.json"
+CONSOLIDATE_CACHE_DIR = "consolidate_cache"
+CONSOLIDATED_PARQUET_COLUMNS = (
+    ("CNPJ", "string"),
+    ("RazaoSocial", "string"),
+    ("Trimestre", "int8"),
+    ("Ano", "int16"),
+    ("ValorDespesas", "float64"),
 )
-OPERADORAS_LOCAL_PATH = os.path.join("data", "operadoras", "operadoras_ativas.csv")
 
 
 def iter_normalized_files(input_dir: str) -> Iterable[str]:
@@ -33,8 +67,31 @@ def iter_normalized_files(input_dir: str) -> Iterable[str]:
                 yield os.path.join(root, name)
 
 
+def parquet_sibling(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + ".parquet"
+
+
+def iter_normalized_rows(path: str) -> Iterator[Dict[str, str]]:
+    parquet_path = parquet_sibling(path)
+    if (
+        pq is not None
+        and os.path.exists(parquet_path)
+        and os.path.getmtime(parquet_path) >= os.path.getmtime(path)
+    ):
+        parquet_file = pq.ParquetFile(parquet_path)
+        for batch in parquet_file.iter_batches():
+            for record in batch.to_pylist():
+                yield {
+                    key: "" if value is None else str(value)
+                    for key, value in record.items()
+                }
+        return
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        yield from csv.DictReader(f)
+
+
 def normalize_cnpj(value: str) -> str:
-    return re.sub(r"\D", "", value or "")
+    return cnpj_cache.normalize_cnpj(value)
 
 
 def normalize_reg_ans(value: str) -> str:
@@ -103,165 +160,473 @@ def normalize_razao_social(value: str) -> str:
     return " ".join(value.strip().split()).upper() if value else ""
 
 
-def normalize_field_name(name: str) -> str:
-    return re.sub(r"[^a-z0-9]", "", name.lower())
-
-
-def download_operadoras(url: str, dest: str) -> None:
-    os.makedirs(os.path.dirname(dest), exist_ok=True)
-    req = Request(url, headers={"User-Agent": "ans-consolidator/1.0"})
-    with urlopen(req, timeout=60) as resp, open(dest, "wb") as f:
-        f.write(resp.read())
-
-
 def load_operadoras_map(path: str, url: str) -> Dict[str, Dict[str, str]]:
-    if not os.path.exists(path):
-        try:
-            download_operadoras(url, path)
-        except (HTTPError, URLError, TimeoutError) as exc:
-            print(f"Aviso: falha ao baixar cadastro de operadoras: {exc}")
-            return {}
-
     try:
-        file_obj = open(path, "r", encoding="utf-8-sig", errors="replace", newline="")
-    except Exception:
-        file_obj = open(path, "r", encoding="latin-1", errors="replace", newline="")
-
-    with file_obj as f:
-        reader = csv.DictReader(f, delimiter=";")
-        if not reader.fieldnames:
-            return {}
-        field_map = {normalize_field_name(name): name for name in reader.fieldnames}
-        reg_key = (
-            field_map.get("registrooperadora")
-            or field_map.get("regans")
-            or field_map.get("registroans")
-        )
-        cnpj_key = field_map.get("cnpj")
-        razao_key = field_map.get("razaosocial")
-        if not reg_key or not cnpj_key or not razao_key:
-            return {}
-
-        mapping: Dict[str, Dict[str, str]] = {}
-        for row in reader:
-            reg_ans = normalize_reg_ans(row.get(reg_key, ""))
-            if not reg_ans:
-                continue
-            mapping[reg_ans] = {
-                "cnpj": normalize_cnpj(row.get(cnpj_key, "")),
-                "razao": normalize_razao_social(row.get(razao_key, "")),
-            }
-        return mapping
-
-
-def consolidate(
-    input_dir: str,
-) -> Tuple[List[List[str]], List[List[str]], Dict[str, int]]:
-    rows_out: List[List[str]] = []
-    issue_rows: List[List[str]] = []
-    issue_counts: Dict[str, int] = defaultdict(int)
-    cnpj_razao: Dict[str, set] = defaultdict(set)
-    row_entries: List[RowEntry] = []
+        operadoras_lookup.fetch_cadop(url, path)
+    except (URLError, TimeoutError, OSError, HTTPException, RuntimeError) as exc:
+        print(f"Aviso: falha ao baixar cadastro de operadoras: {exc}")
+        return {}
+
+    lookup = operadoras_lookup.load_lookup(path)
+    razao_col = lookup.field("razaosocial")
+    if lookup.registro_col is None or lookup.cnpj_col is None or razao_col is None:
+        return {}
+
+    mapping: Dict[str, Dict[str, str]] = {}
+    for reg_ans, idx in lookup.by_registro.items():
+        record = lookup.records[idx]
+        mapping[reg_ans] = {
+            "cnpj": normalize_cnpj(record[lookup.cnpj_col]),
+            "razao": normalize_razao_social(record[razao_col]),
+        }
+    return mapping
+
+
+def load_operadoras_or_warn() -> Dict[str, Dict[str, str]]:
     operadoras_map = load_operadoras_map(OPERADORAS_LOCAL_PATH, OPERADORAS_URL)
     if not operadoras_map:
         print(
             "Aviso: cadastro de operadoras indisponivel; "
             "CNPJ/RazaoSocial podem ficar vazios."
         )
-
+    return operadoras_map
+
+
+def build_consolidated_row(
+    row: Dict[str, str], operadoras_map: Dict[str, Dict[str, str]]
+) -> Tuple[List[str], List[str]]:
+    cnpj = normalize_cnpj(row.get("cnpj", ""))
+    razao = normalize_razao_social(row.get("razao_social", ""))
+    reg_ans = normalize_reg_ans(row.get("reg_ans", ""))
+    if reg_ans and (not cnpj or not razao):
+        mapped = operadoras_map.get(reg_ans)
+        if mapped:
+            if not cnpj:
+                cnpj = mapped.get("cnpj", "")
+            if not razao:
+                razao = mapped.get("razao", "")
+    valor = parse_number(row.get("valor_despesas", ""))
+    year, quarter, issues = parse_trimestre_ano(row)
+
+    if not cnpj:
+        issues.append("cnpj_ausente")
+    if not razao:
+        issues.append("razao_social_ausente")
+    if valor is None:
+        issues.append("valor_invalido")
+    elif valor <= 0:
+        issues.append("valor_nao_positivo")
+
+    base_row = [
+        cnpj,
+        razao,
+        "" if quarter is None else str(quarter),
+        "" if year is None else str(year),
+        "" if valor is None else f"{valor:.2f}",
+    ]
+    return base_row, issues
+
+
+def iter_consolidated_rows(
+    input_dir: str, operadoras_map: Dict[str, Dict[str, str]]
+) -> Iterator[Tuple[List[str], List[str], str]]:
     for path in iter_normalized_files(input_dir):
-        with open(path, "r", encoding="utf-8", newline="") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                cnpj = normalize_cnpj(row.get("cnpj", ""))
-                razao = normalize_razao_social(row.get("razao_social", ""))
-                reg_ans = normalize_reg_ans(row.get("reg_ans", ""))
-                if reg_ans and (not cnpj or not razao):
-                    mapped = operadoras_map.get(reg_ans)
-                    if mapped:
-                        if not cnpj:
-                            cnpj = mapped.get("cnpj", "")
-                        if not razao:
-                            razao = mapped.get("razao", "")
-                valor = parse_number(row.get("valor_despesas", ""))
-                year, quarter, issues = parse_trimestre_ano(row)
-
-                if not cnpj:
-                    issues.append("cnpj_ausente")
-                if not razao:
-                    issues.append("razao_social_ausente")
-                if valor is None:
-                    issues.append("valor_invalido")
-                elif valor <= 0:
-                    issues.append("valor_nao_positivo")
-
-                if cnpj and razao:
-                    cnpj_razao[cnpj].add(razao)
-
-                base_row = [
-                    cnpj,
-                    razao,
-                    "" if quarter is None else str(quarter),
-                    "" if year is None else str(year),
-                    "" if valor is None else f"{valor:.2f}",
-                ]
-                row_entries.append(
-                    {
-                        "cnpj": cnpj,
-                        "base_row": base_row,
-                        "issues": issues,
-                        "source": os.path.basename(path),
-                    }
+        source = os.path.basename(path)
+        for row in iter_normalized_rows(path):
+            base_row, issues = build_consolidated_row(row, operadoras_map)
+            yield base_row, issues, source
+
+
+def find_duplicated_cnpjs(
+    input_dir: str, operadoras_map: Dict[str, Dict[str, str]]
+) -> Set[str]:
+    first_razao: Dict[str, str] = {}
+    duplicated: Set[str] = set()
+    for base_row, _, _ in iter_consolidated_rows(input_dir, operadoras_map):
+        cnpj, razao = base_row[0], base_row[1]
+        if not cnpj or not razao or cnpj in duplicated:
+            continue
+        if first_razao.setdefault(cnpj, razao) != razao:
+            duplicated.add(cnpj)
+            del first_razao[cnpj]
+    return duplicated
+
+
+def finalize_issues(
+    base_row: List[str],
+    issues: List[str],
+    source: str,
+    duplicated_cnpj: Set[str],
+    issue_counts: Dict[str, int],
+) -> Optional[List[str]]:
+    if base_row[0] and base_row[0] in duplicated_cnpj:
+        if "cnpj_com_razoes_diferentes" not in issues:
+            issues.append("cnpj_com_razoes_diferentes")
+    for issue in issues:
+        issue_counts[issue] += 1
+    if not issues:
+        return None
+    return base_row + [",".join(sorted(set(issues))), source]
+
+
+# Textos repetidos viram ids de uma tabela de strings; valores ficam num
+# array('d') e as inconsistencias num bitmask por linha (ISSUE_BITS).
+class CompactRows:
+    def __init__(self) -> None:
+        self.strings: List[str] = []
+        self.string_ids: Dict[str, int] = {}
+        self.cnpj = array("I")
+        self.razao = array("I")
+        self.trimestre = array("I")
+        self.ano = array("I")
+        self.source = array("I")
+        self.valor = array("d")
+        self.issues = array("I")
+
+    def __len__(self) -> int:
+        return len(self.valor)
+
+    def intern(self, value: str) -> int:
+        idx = self.string_ids.get(value)
+        if idx is None:
+            idx = len(self.strings)
+            self.strings.append(value)
+            self.string_ids[value] = idx
+        return idx
+
+    def append(self, base_row: List[str], issues: List[str], source: str) -> None:
+        cnpj, razao, trimestre, ano, valor = base_row
+        intern = self.intern
+        self.cnpj.append(intern(cnpj))
+        self.razao.append(intern(razao))
+        self.trimestre.append(intern(trimestre))
+        self.ano.append(intern(ano))
+        self.source.append(intern(source))
+        # valor vazio sempre vem com "valor_invalido" no bitmask
+        self.valor.append(float(valor) if valor else 0.0)
+        mask = 0
+        for issue in issues:
+            mask |= ISSUE_BITS[issue]
+        self.issues.append(mask)
+
+    def flag_cnpjs(self, cnpj_ids: Set[int], issue: str) -> None:
+        bit = ISSUE_BITS[issue]
+        issues = self.issues
+        for idx, cnpj_id in enumerate(self.cnpj):
+            if cnpj_id in cnpj_ids:
+                issues[idx] |= bit
+
+    def issue_counts(self) -> Dict[str, int]:
+        mask_counts: Dict[int, int] = defaultdict(int)
+        for mask in self.issues:
+            mask_counts[mask] += 1
+        counts: Dict[str, int] = defaultdict(int)
+        for mask, total in mask_counts.items():
+            for name, bit in ISSUE_BITS.items():
+                if mask & bit:
+                    counts[name] += total
+        return dict(counts)
+
+    def row(self, idx: int) -> List[str]:
+        strings = self.strings
+        invalid = self.issues[idx] & ISSUE_BITS["valor_invalido"]
+        return [
+            strings[self.cnpj[idx]],
+            strings[self.razao[idx]],
+            strings[self.trimestre[idx]],
+            strings[self.ano[idx]],
+            "" if invalid else f"{self.valor[idx]:.2f}",
+        ]
+
+    def rows(self) -> Iterator[List[str]]:
+        for idx in range(len(self)):
+            yield self.row(idx)
+
+    def issue_rows(self) -> Iterator[List[str]]:
+        for idx, mask in enumerate(self.issues):
+            if not mask:
+                continue
+            names = sorted(name for name, bit in ISSUE_BITS.items() if mask & bit)
+            yield self.row(idx) + [",".join(names), self.strings[self.source[idx]]]
+
+
+def consolidate(input_dir: str) -> Tuple[CompactRows, Dict[str, int]]:
+    rows = CompactRows()
+    first_razao: Dict[int, int] = {}
+    duplicated: Set[int] = set()
+    operadoras_map = load_operadoras_or_warn()
+
+    for base_row, issues, source in iter_consolidated_rows(input_dir, operadoras_map):
+        rows.append(base_row, issues, source)
+        cnpj, razao = base_row[0], base_row[1]
+        if cnpj and razao:
+            cnpj_id = rows.cnpj[-1]
+            if first_razao.setdefault(cnpj_id, rows.razao[-1]) != rows.razao[-1]:
+                duplicated.add(cnpj_id)
+
+    rows.flag_cnpjs(duplicated, "cnpj_com_razoes_diferentes")
+    return rows, rows.issue_counts()
+
+
+def add_to_aggregate(
+    aggregates: CompactRows,
+    groups: Dict[Tuple[int, int, int], int],
+    base_row: List[str],
+) -> None:
+    # Uma linha do CompactRows por chave; valor_invalido marca chave sem
+    # nenhum valor valido (ValorDespesas vazio na saida)
+    cnpj, razao, trimestre, ano, valor = base_row
+    intern = aggregates.intern
+    key = (intern(cnpj), intern(trimestre), intern(ano))
+    idx = groups.get(key)
+    if idx is None:
+        groups[key] = len(aggregates)
+        aggregates.append(base_row, [] if valor else ["valor_invalido"], "")
+        return
+    if not aggregates.strings[aggregates.razao[idx]]:
+        aggregates.razao[idx] = intern(razao)
+    if valor:
+        aggregates.valor[idx] += float(valor)
+        aggregates.issues[idx] &= ~ISSUE_BITS["valor_invalido"]
+
+
+def write_consolidated_rows(
+    rows: Iterable[Tuple[List[str], List[str], str]],
+    duplicated_cnpj: Set[str],
+    output_csv: str,
+    issues_csv: str,
+    aggregate: bool = False,
+) -> Tuple[int, Dict[str, int]]:
+    issue_counts: Dict[str, int] = defaultdict(int)
+    aggregates = CompactRows()
+    groups: Dict[Tuple[int, int, int], int] = {}
+    rows_written = 0
+    os.makedirs(os.path.dirname(output_csv) or ".", exist_ok=True)
+    os.makedirs(os.path.dirname(issues_csv) or ".", exist_ok=True)
+    tmp_output = output_csv + ".tmp"
+    tmp_issues = issues_csv + ".tmp"
+    issues_file = None
+    issues_writer = None
+    try:
+        with open(tmp_output, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(OUTPUT_HEADER)
+            for base_row, issues, source in rows:
+                if aggregate:
+                    add_to_aggregate(aggregates, groups, base_row)
+                else:
+                    writer.writerow(base_row)
+                    rows_written += 1
+                issue_row = finalize_issues(
+                    base_row, issues, source, duplicated_cnpj, issue_counts
                 )
+                if issue_row is None:
+                    continue
+                if issues_writer is None:
+                    issues_file = open(tmp_issues, "w", encoding="utf-8", newline="")
+                    issues_writer = csv.writer(issues_file)
+                    issues_writer.writerow(ISSUES_HEADER)
+                issues_writer.writerow(issue_row)
+            for aggregated_row in aggregates.rows():
+                writer.writerow(aggregated_row)
+                rows_written += 1
+    finally:
+        if issues_file is not None:
+            issues_file.close()
+
+    if not rows_written:
+        os.remove(tmp_output)
+        return 0, {}
+    os.replace(tmp_output, output_csv)
+    if issues_file is not None:
+        os.replace(tmp_issues, issues_csv)
+    return rows_written, dict(issue_counts)
+
+
+def write_consolidated(
+    input_dir: str, output_csv: str, issues_csv: str, aggregate: bool = False
+) -> Tuple[int, Dict[str, int]]:
+    operadoras_map = load_operadoras_or_warn()
+    duplicated_cnpj = find_duplicated_cnpjs(input_dir, operadoras_map)
+    return write_consolidated_rows(
+        iter_consolidated_rows(input_dir, operadoras_map),
+        duplicated_cnpj,
+        output_csv,
+        issues_csv,
+        aggregate,
+    )
 
-    duplicated_cnpj = {cnpj for cnpj, razoes in cnpj_razao.items() if len(razoes) > 1}
-    for entry in row_entries:
-        issues = entry["issues"]
-        cnpj = entry["cnpj"]
-        if cnpj and cnpj in duplicated_cnpj:
-            if "cnpj_com_razoes_diferentes" not in issues:
-                issues.append("cnpj_com_razoes_diferentes")
-        for issue in issues:
-            issue_counts[issue] += 1
-        base_row = entry["base_row"]
-        rows_out.append(base_row)
-        if issues:
-            issue_rows.append(
-                base_row
-                + [
-                    ",".join(sorted(set(issues))),
-                    entry["source"],
-                ]
-            )
-
-    return rows_out, issue_rows, dict(issue_counts)
-
-
-def write_output(rows: List[List[str]], output_csv: str) -> None:
+
+def file_fingerprint(path: str) -> Dict[str, int]:
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_state(state_path: str) -> Dict[str, Any]:
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if state.get("version") != CONSOLIDATE_STATE_VERSION:
+        return {}
+    return state
+
+
+def save_state(state_path: str, state: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, state_path)
+
+
+def is_unchanged(path: str, cached: Optional[Dict[str, Any]], cache_dir: str) -> bool:
+    if not cached or not os.path.exists(os.path.join(cache_dir, cached["partial"])):
+        return False
+    fingerprint = file_fingerprint(path)
+    if fingerprint["size"] != cached["size"]:
+        return False
+    if fingerprint["mtime_ns"] == cached["mtime_ns"]:
+        return True
+    if file_sha256(path) != cached["sha256"]:
+        return False
+    cached["mtime_ns"] = fingerprint["mtime_ns"]
+    return True
+
+
+def build_partial(
+    path: str,
+    partial_path: str,
+    operadoras_map: Dict[str, Dict[str, str]],
+) -> Dict[str, Any]:
+    issue_counts: Dict[str, int] = defaultdict(int)
+    razoes: Dict[str, Set[str]] = defaultdict(set)
+    rows = 0
+    tmp_path = partial_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        for row in iter_normalized_rows(path):
+            base_row, issues = build_consolidated_row(row, operadoras_map)
+            writer.writerow(base_row + [",".join(issues)])
+            rows += 1
+            for issue in issues:
+                issue_counts[issue] += 1
+            if base_row[0] and base_row[1]:
+                razoes[base_row[0]].add(base_row[1])
+    os.replace(tmp_path, partial_path)
+    return {
+        **file_fingerprint(path),
+        "sha256": file_sha256(path),
+        "partial": os.path.basename(partial_path),
+        "rows": rows,
+        "issue_counts": dict(issue_counts),
+        "razoes": {cnpj: sorted(names) for cnpj, names in razoes.items()},
+    }
+
+
+def iter_partial_rows(
+    partials: List[Tuple[str, str]],
+) -> Iterator[Tuple[List[str], List[str], str]]:
+    for source, partial_path in partials:
+        with open(partial_path, "r", encoding="utf-8", newline="") as f:
+            for record in csv.reader(f):
+                issues = record[5].split(",") if record[5] else []
+                yield record[:5], issues, source
+
+
+def write_consolidated_incremental(
+    input_dir: str,
+    output_csv: str,
+    issues_csv: str,
+    state_path: str,
+    full_rebuild: bool = False,
+    aggregate: bool = False,
+) -> Tuple[int, Dict[str, int], Dict[str, int]]:
+    cache_dir = os.path.join(os.path.dirname(state_path), CONSOLIDATE_CACHE_DIR)
+    os.makedirs(cache_dir, exist_ok=True)
+    operadoras_map = load_operadoras_or_warn()
+    operadoras = (
+        file_fingerprint(OPERADORAS_LOCAL_PATH)
+        if os.path.exists(OPERADORAS_LOCAL_PATH)
+        else None
+    )
+    state = {} if full_rebuild else load_state(state_path)
+    cached_files = (
+        state.get("files", {}) if state.get("operadoras") == operadoras else {}
+    )
+
+    files: Dict[str, Any] = {}
+    partials: List[Tuple[str, str]] = []
+    stats = {"reprocessed": 0, "reused": 0, "removed": 0}
+    for path in iter_normalized_files(input_dir):
+        key = os.path.relpath(path, input_dir).replace(os.sep, "/")
+        cached = cached_files.get(key)
+        if is_unchanged(path, cached, cache_dir):
+            entry = cast(Dict[str, Any], cached)
+            stats["reused"] += 1
+        else:
+            partial_name = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16] + ".csv"
+            partial_path = os.path.join(cache_dir, partial_name)
+            entry = build_partial(path, partial_path, operadoras_map)
+            stats["reprocessed"] += 1
+        files[key] = entry
+        partials.append(
+            (os.path.basename(path), os.path.join(cache_dir, entry["partial"]))
+        )
+
+    live = {entry["partial"] for entry in files.values()}
+    for name in os.listdir(cache_dir):
+        if name.endswith(".csv") and name not in live:
+            os.remove(os.path.join(cache_dir, name))
+            stats["removed"] += 1
+
+    cnpj_razao: Dict[str, Set[str]] = defaultdict(set)
+    for entry in files.values():
+        for cnpj, names in entry["razoes"].items():
+            cnpj_razao[cnpj].update(names)
+    duplicated_cnpj = {cnpj for cnpj, names in cnpj_razao.items() if len(names) > 1}
+
+    rows_written, issue_counts = write_consolidated_rows(
+        iter_partial_rows(partials), duplicated_cnpj, output_csv, issues_csv, aggregate
+    )
+    save_state(
+        state_path,
+        {
+            "version": CONSOLIDATE_STATE_VERSION,
+            "operadoras": operadoras,
+            "files": files,
+        },
+    )
+    return rows_written, issue_counts, stats
+
+
+def write_output(rows: Iterable[List[str]], output_csv: str) -> None:
     os.makedirs(os.path.dirname(output_csv), exist_ok=True)
     with open(output_csv, "w", encoding="utf-8", newline="") as f:
         writer = csv.writer(f)
-        writer.writerow(["CNPJ", "RazaoSocial", "Trimestre", "Ano", "ValorDespesas"])
+        writer.writerow(OUTPUT_HEADER)
         writer.writerows(rows)
 
 
-def write_issues(issue_rows: List[List[str]], output_csv: str) -> None:
-    if not issue_rows:
+def write_issues(issue_rows: Iterable[List[str]], output_csv: str) -> None:
+    issue_rows = iter(issue_rows)
+    first = next(issue_rows, None)
+    if first is None:
         return
     os.makedirs(os.path.dirname(output_csv), exist_ok=True)
     with open(output_csv, "w", encoding="utf-8", newline="") as f:
         writer = csv.writer(f)
-        writer.writerow(
-            [
-                "CNPJ",
-                "RazaoSocial",
-                "Trimestre",
-                "Ano",
-                "ValorDespesas",
-                "Issues",
-                "SourceFile",
-            ]
-        )
+        writer.writerow(ISSUES_HEADER)
+        writer.writerow(first)
         writer.writerows(issue_rows)
 
 
@@ -271,7 +636,7 @@ def zip_output(csv_path: str, zip_path: str) -> None:
         zf.write(csv_path, arcname=os.path.basename(csv_path))
 
 
-def main() -> int:
+def main(argv: Optional[List[str]] = None) -> int:
     parser = argparse.ArgumentParser(
         description="Consolida despesas com eventos/sinistros e analisa inconsistencias."
     )
@@ -279,18 +644,69 @@ def main() -> int:
     parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
     parser.add_argument("--output-name", default="consolidado_despesas.csv")
     parser.add_argument("--zip-name", default="consolidado_despesas.zip")
-    args = parser.parse_args()
+    parser.add_argument(
+        "--parquet",
+        action="store_true",
+        help="Grava tambem o consolidado em Parquet (requer pyarrow).",
+    )
+    parser.add_argument(
+        "--state",
+        default=None,
+        help=(
+            "Arquivo de estado da consolidacao incremental "
+            f"(padrao: <output-dir>/{CONSOLIDATE_STATE_NAME})."
+        ),
+    )
+    parser.add_argument(
+        "--full-rebuild",
+        action="store_true",
+        help="Ignora o estado salvo e reprocessa todos os CSVs normalizados.",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help=(
+            "Nao acessa a rede: usa a copia local do cadastro de operadoras "
+            "(equivale a ANS_OFFLINE=1)."
+        ),
+    )
+    parser.add_argument(
+        "--aggregate",
+        action="store_true",
+        help=(
+            "Soma ValorDespesas por (CNPJ, Trimestre, Ano), uma linha por chave "
+            "(mesma chave de ConsolidadoDespesa). Inconsistencias seguem por linha."
+        ),
+    )
+    args = parser.parse_args(argv)
+    if args.offline:
+        os.environ["ANS_OFFLINE"] = "1"
 
-    rows, issue_rows, issue_counts = consolidate(args.input_dir)
-    if not rows:
+    output_csv = os.path.join(args.output_dir, args.output_name)
+    issues_csv = os.path.join(args.output_dir, "consolidado_inconsistencias.csv")
+    state_path = args.state or os.path.join(args.output_dir, CONSOLIDATE_STATE_NAME)
+    rows_written, issue_counts, stats = write_consolidated_incremental(
+        args.input_dir,
+        output_csv,
+        issues_csv,
+        state_path,
+        args.full_rebuild,
+        args.aggregate,
+    )
+    print(
+        f"Arquivos reprocessados: {stats['reprocessed']}, "
+        f"reaproveitados do estado: {stats['reused']}"
+    )
+    if not rows_written:
         print("Nenhum dado consolidado. Verifique o input_dir.")
         return 1
 
-    output_csv = os.path.join(args.output_dir, args.output_name)
-    write_output(rows, output_csv)
-    issues_csv = os.path.join(args.output_dir, "consolidado_inconsistencias.csv")
-    write_issues(issue_rows, issues_csv)
     zip_output(output_csv, os.path.join(args.output_dir, args.zip_name))
+    if args.parquet:
+        parquet_path = process_ans_files.write_parquet_copy(
+            output_csv, CONSOLIDATED_PARQUET_COLUMNS
+        )
+        print("Parquet consolidado em:", parquet_path)
     issues_summary_path = os.path.join(args.output_dir, "inconsistencias_resumo.json")
     with open(issues_summary_path, "w", encoding="utf-8") as f:
         json.dump(issue_counts, f, ensure_ascii=False, indent=2)
@@ -3,13 +3,21 @@ import json
 import os
 import re
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from html.parser import HTMLParser
+from http.client import IncompleteRead
 from urllib.error import HTTPError, URLError
 from urllib.parse import urljoin, urlparse
 from urllib.request import Request, urlopen
 
 DEFAULT_BASE_URL = "https://dadosabertos.ans.gov.br/FTP/PDA/demonstracoes_contabeis/"
+LISTING_CACHE_NAME = "listings_cache.json"
+CLOSED_YEAR_GRACE_DAYS = 180
+# Downloads simultaneos por host quando --per-host nao e informado
+DEFAULT_PER_HOST = 4
 DEFAULT_EXTENSIONS = [
     ".zip",
     ".csv",
@@ -37,14 +45,15 @@ class LinkParser(HTMLParser):
             self.links.append(href)
 
 
-def fetch_html(url, timeout):
-    req = Request(url, headers={"User-Agent": "ans-downloader/1.0"})
+def fetch_html(url, timeout, headers=None):
+    req_headers = {"User-Agent": "ans-downloader/1.0"}
+    req_headers.update(headers or {})
+    req = Request(url, headers=req_headers)
     with urlopen(req, timeout=timeout) as resp:
-        return resp.read().decode("utf-8", errors="replace")
+        return resp.read().decode("utf-8", errors="replace"), resp.headers
 
 
-def list_links(url, timeout):
-    html = fetch_html(url, timeout)
+def parse_links(url, html):
     parser = LinkParser()
     parser.feed(html)
     links = []
@@ -55,6 +64,111 @@ def list_links(url, timeout):
     return links
 
 
+def file_validators(headers):
+    return {
+        "etag": headers.get("ETag"),
+        "last_modified": headers.get("Last-Modified"),
+    }
+
+
+def listing_year(url):
+    match = re.search(r"/((19|20)\d{2})/", urlparse(url).path)
+    if match:
+        return int(match.group(1))
+    return None
+
+
+class ListingCache:
+    def __init__(self, path, ttl=0, refresh=False, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.refresh = refresh
+        self.clock = clock
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0}
+        self._lock = threading.Lock()
+        self._entries = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f).get("entries", {})
+            except (OSError, ValueError):
+                self._entries = {}
+
+    def is_closed(self, url, entry):
+        year = listing_year(url)
+        if year is None:
+            return False
+        closed_at = time.mktime((year + 1, 1, 1, 0, 0, 0, 0, 0, -1))
+        return entry["fetched_at"] >= closed_at + CLOSED_YEAR_GRACE_DAYS * 86400
+
+    def is_fresh(self, url, entry):
+        if self.is_closed(url, entry):
+            return True
+        return self.clock() - entry["fetched_at"] < self.ttl
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _store(self, url, links, validators):
+        with self._lock:
+            self._entries[url] = {
+                "links": links,
+                "fetched_at": self.clock(),
+                "etag": validators.get("etag"),
+                "last_modified": validators.get("last_modified"),
+            }
+
+    def list_links(self, url, timeout):
+        with self._lock:
+            entry = None if self.refresh else self._entries.get(url)
+        if entry is None:
+            self._count("misses")
+            html, headers = fetch_html(url, timeout)
+            links = parse_links(url, html)
+            self._store(url, links, file_validators(headers))
+            return links
+        if self.is_fresh(url, entry):
+            self._count("hits")
+            return list(entry["links"])
+
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            html, response_headers = fetch_html(url, timeout, headers)
+        except HTTPError as exc:
+            if exc.code != 304:
+                raise
+            self._count("revalidated")
+            self._store(url, entry["links"], entry)
+            return list(entry["links"])
+        self._count("misses")
+        links = parse_links(url, html)
+        self._store(url, links, file_validators(response_headers))
+        return links
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with self._lock:
+            payload = {"entries": self._entries}
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def list_links(url, timeout, cache=None):
+    if cache is not None:
+        return cache.list_links(url, timeout)
+    html, _ = fetch_html(url, timeout)
+    return parse_links(url, html)
+
+
 def is_dir_link(url):
     return urlparse(url).path.endswith("/")
 
@@ -90,20 +204,47 @@ def extract_quarter_from_url(url, year_hint=None):
     return None
 
 
-def gather_year_urls(base_url, timeout):
+def gather_year_urls(base_url, timeout, cache=None):
     year_urls = {}
-    for link in list_links(base_url, timeout):
+    for link in list_links(base_url, timeout, cache):
         year = extract_year_from_url(link)
         if year:
             year_urls[year] = link
     return year_urls
 
 
-def gather_quarter_entries(base_url, timeout):
+def crawl_links(urls, timeout, max_depth, workers, _seen=None, cache=None):
+    if _seen is None:
+        _seen = set()
+    listings = {}
+    frontier = [url for url in dict.fromkeys(urls) if url not in _seen]
+    _seen.update(frontier)
+    depth = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        while frontier:
+            results = executor.map(
+                lambda url: list_links(url, timeout, cache), frontier
+            )
+            next_frontier = []
+            for url, links in zip(frontier, results):
+                listings[url] = links
+                if depth >= max_depth:
+                    continue
+                for link in links:
+                    if is_dir_link(link) and link not in _seen:
+                        _seen.add(link)
+                        next_frontier.append(link)
+            frontier = next_frontier
+            depth += 1
+    return listings
+
+
+def gather_quarter_entries(base_url, timeout, workers=1, cache=None):
     quarter_map = {}
-    year_urls = gather_year_urls(base_url, timeout)
+    year_urls = gather_year_urls(base_url, timeout, cache)
+    listings = crawl_links(year_urls.values(), timeout, 0, workers, cache=cache)
     for year, year_url in year_urls.items():
-        for link in list_links(year_url, timeout):
+        for link in listings.get(year_url, []):
             quarter = extract_quarter_from_url(link, year_hint=year)
             if not quarter:
                 continue
@@ -123,15 +264,29 @@ def should_download(url, extensions):
     return True
 
 
-def collect_files(url, timeout, extensions, max_depth, _depth=0, _seen=None):
+def collect_files(
+    url,
+    timeout,
+    extensions,
+    max_depth,
+    _depth=0,
+    _seen=None,
+    listings=None,
+    cache=None,
+):
     if _seen is None:
         _seen = set()
     if url in _seen:
         return []
     _seen.add(url)
 
+    if listings is not None and url in listings:
+        links = listings[url]
+    else:
+        links = list_links(url, timeout, cache)
+
     files = []
-    for link in list_links(url, timeout):
+    for link in links:
         if is_dir_link(link):
             if _depth < max_depth:
                 files.extend(
@@ -142,6 +297,8 @@ def collect_files(url, timeout, extensions, max_depth, _depth=0, _seen=None):
                         max_depth,
                         _depth=_depth + 1,
                         _seen=_seen,
+                        listings=listings,
+                        cache=cache,
                     )
                 )
             continue
@@ -160,28 +317,98 @@ def normalize_local_path(base_url, file_url, output_dir):
     return os.path.join(output_dir, *rel_path.split("/"))
 
 
-def download_file(url, dest, timeout, overwrite, retries, backoff_seconds):
+def read_part_validators(part_path):
+    meta_path = part_path + ".json"
+    if not os.path.exists(part_path) or not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            validators = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not validators.get("etag") and not validators.get("last_modified"):
+        return None
+    return validators
+
+
+def discard_part(part_path):
+    for path in (part_path, part_path + ".json"):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def download_file(
+    url,
+    dest,
+    timeout,
+    overwrite,
+    retries,
+    backoff_seconds,
+    validators=None,
+    refresh=False,
+):
     os.makedirs(os.path.dirname(dest), exist_ok=True)
-    if os.path.exists(dest) and not overwrite:
-        return "skipped", 0, 0, None
+    validators = dict(validators or {})
+    exists = os.path.exists(dest)
+    if exists and not overwrite and not refresh:
+        return "skipped", 0, 0, None, validators
+    part_path = dest + ".part"
     attempts = 0
     while True:
         attempts += 1
+        headers = {"User-Agent": "ans-downloader/1.0"}
+        if exists and refresh and not overwrite:
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+        part_validators = read_part_validators(part_path)
+        offset = os.path.getsize(part_path) if part_validators else 0
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = part_validators.get("etag") or part_validators.get(
+                "last_modified"
+            )
         try:
-            req = Request(url, headers={"User-Agent": "ans-downloader/1.0"})
+            req = Request(url, headers=headers)
             with urlopen(req, timeout=timeout) as resp:
+                response_validators = file_validators(resp.headers)
+                if offset and resp.status == 206:
+                    mode = "ab"
+                else:
+                    mode = "wb"
+                    offset = 0
+                    with open(part_path + ".json", "w", encoding="utf-8") as f:
+                        json.dump(response_validators, f)
+                length = resp.headers.get("Content-Length")
+                expected = int(length) if length and length.isdigit() else None
                 total = 0
-                with open(dest, "wb") as f:
+                with open(part_path, mode) as f:
                     while True:
                         chunk = resp.read(1024 * 64)
                         if not chunk:
                             break
                         f.write(chunk)
                         total += len(chunk)
-            return "downloaded", total, attempts, None
-        except (HTTPError, URLError, TimeoutError) as exc:
+                if expected is not None and total < expected:
+                    raise IncompleteRead(b"", expected - total)
+            os.replace(part_path, dest)
+            discard_part(part_path)
+            return "downloaded", total, attempts, None, response_validators
+        except HTTPError as exc:
+            if exc.code == 304:
+                validators.update(
+                    {k: v for k, v in file_validators(exc.headers).items() if v}
+                )
+                return "not-modified", 0, attempts, None, validators
+            if exc.code == 416:
+                discard_part(part_path)
             if attempts >= retries:
-                return "error", 0, attempts, str(exc)
+                return "error", 0, attempts, str(exc), validators
+            time.sleep(backoff_seconds * attempts)
+        except (URLError, TimeoutError, ConnectionError, IncompleteRead) as exc:
+            if attempts >= retries:
+                return "error", 0, attempts, str(exc) or repr(exc), validators
             time.sleep(backoff_seconds * attempts)
 
 
@@ -189,7 +416,143 @@ def quarter_label(year, quarter):
     return f"{quarter}T{year}"
 
 
-def main():
+class HostLimiter:
+    def __init__(self, per_host):
+        if per_host < 1:
+            raise ValueError("per_host deve ser >= 1")
+        self.per_host = per_host
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    def slot(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.per_host)
+                self._semaphores[host] = semaphore
+        return semaphore
+
+
+def download_entry(
+    label,
+    file_url,
+    dest,
+    timeout,
+    overwrite,
+    retries,
+    backoff_seconds,
+    dry_run,
+    limiter=None,
+    refresh=False,
+    previous=None,
+):
+    status = "dry-run"
+    size = 0
+    error = None
+    attempts = 0
+    validators = {
+        "etag": (previous or {}).get("etag"),
+        "last_modified": (previous or {}).get("last_modified"),
+    }
+    slot = limiter.slot(file_url) if limiter is not None else nullcontext()
+    try:
+        if not dry_run:
+            with slot:
+                status, size, attempts, error, validators = download_file(
+                    file_url,
+                    dest,
+                    timeout,
+                    overwrite,
+                    retries,
+                    backoff_seconds,
+                    validators=validators,
+                    refresh=refresh,
+                )
+    except Exception as exc:
+        status = "error"
+        error = str(exc)
+    print(f"[{label}] {status}: {file_url}")
+    return {
+        "quarter": label,
+        "url": file_url,
+        "local_path": dest,
+        "status": status,
+        "bytes": size,
+        "size": os.path.getsize(dest) if os.path.exists(dest) else None,
+        "etag": validators.get("etag"),
+        "last_modified": validators.get("last_modified"),
+        "error": error,
+        "attempts": attempts,
+    }
+
+
+def download_all(
+    jobs,
+    timeout,
+    overwrite,
+    retries,
+    backoff_seconds,
+    dry_run,
+    workers=1,
+    per_host=DEFAULT_PER_HOST,
+    refresh=False,
+    previous=None,
+):
+    previous = previous or {}
+    if workers <= 1 or len(jobs) <= 1:
+        return [
+            download_entry(
+                label,
+                file_url,
+                dest,
+                timeout,
+                overwrite,
+                retries,
+                backoff_seconds,
+                dry_run,
+                refresh=refresh,
+                previous=previous.get(file_url),
+            )
+            for label, file_url, dest in jobs
+        ]
+
+    limiter = HostLimiter(min(per_host, workers))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                download_entry,
+                label,
+                file_url,
+                dest,
+                timeout,
+                overwrite,
+                retries,
+                backoff_seconds,
+                dry_run,
+                limiter,
+                refresh,
+                previous.get(file_url),
+            )
+            for label, file_url, dest in jobs
+        ]
+        return [future.result() for future in futures]
+
+
+def load_previous_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {
+        entry["url"]: entry for entry in payload.get("entries", []) if entry.get("url")
+    }
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(
         description="Baixa as Demonstrações Contábeis mais recentes da ANS."
     )
@@ -201,16 +564,57 @@ def main():
     parser.add_argument("--timeout", type=int, default=30)
     parser.add_argument("--max-depth", type=int, default=2)
     parser.add_argument("--overwrite", action="store_true")
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Revalida arquivos existentes com ETag/Last-Modified do manifest anterior.",
+    )
     parser.add_argument("--dry-run", action="store_true")
     parser.add_argument("--manifest", default="manifest.json")
     parser.add_argument("--retries", type=int, default=3)
     parser.add_argument("--backoff", type=float, default=1.0)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Numero de downloads simultaneos (1 = sequencial).",
+    )
+    parser.add_argument(
+        "--per-host",
+        type=int,
+        default=DEFAULT_PER_HOST,
+        help=f"Limite de downloads simultaneos por host (padrao: {DEFAULT_PER_HOST}).",
+    )
+    parser.add_argument(
+        "--crawl-workers",
+        type=int,
+        default=4,
+        help="Numero maximo de listagens de diretorio simultaneas.",
+    )
+    parser.add_argument(
+        "--listing-cache",
+        default=None,
+        help=f"Cache das listagens de diretorio (padrao: <output-dir>/{LISTING_CACHE_NAME}).",
+    )
+    parser.add_argument(
+        "--listing-ttl",
+        type=float,
+        default=0,
+        help="Segundos em que uma listagem de ano aberto vale sem revalidar.",
+    )
+    parser.add_argument(
+        "--refresh-listings",
+        action="store_true",
+        help="Ignora o cache e lista todos os diretorios novamente.",
+    )
     parser.add_argument(
         "--extensions",
         default=",".join(DEFAULT_EXTENSIONS),
         help="Lista de extensões permitidas, separadas por vírgula. Use vazio para aceitar qualquer.",
     )
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if args.per_host < 1:
+        parser.error("--per-host deve ser >= 1")
 
     extensions = [
         ext.strip().lower() for ext in args.extensions.split(",") if ext.strip()
@@ -218,20 +622,49 @@ def main():
     if not extensions:
         extensions = None
 
-    quarter_map = gather_quarter_entries(args.base_url, args.timeout)
+    manifest_path = os.path.join(args.output_dir, args.manifest)
+    cache = ListingCache(
+        args.listing_cache or os.path.join(args.output_dir, LISTING_CACHE_NAME),
+        ttl=args.listing_ttl,
+        refresh=args.refresh_listings,
+    )
+    quarter_map = gather_quarter_entries(
+        args.base_url, args.timeout, workers=args.crawl_workers, cache=cache
+    )
+    cache.save()
     if not quarter_map:
         print("Nenhum trimestre encontrado. Verifique o base-url.", file=sys.stderr)
         return 1
 
     latest_quarters = sorted(quarter_map.keys(), reverse=True)[: args.quarters]
-    manifest_entries = []
-    summary = {"downloaded": 0, "skipped": 0, "error": 0, "dry-run": 0}
+    summary = {
+        "downloaded": 0,
+        "not-modified": 0,
+        "skipped": 0,
+        "error": 0,
+        "dry-run": 0,
+    }
 
     print(
         "Trimestres selecionados:",
         ", ".join(quarter_label(y, q) for y, q in latest_quarters),
     )
 
+    listings = crawl_links(
+        [
+            entry
+            for key in latest_quarters
+            for entry in quarter_map.get(key, [])
+            if is_dir_link(entry)
+        ],
+        args.timeout,
+        args.max_depth,
+        args.crawl_workers,
+        cache=cache,
+    )
+    cache.save()
+
+    jobs = []
     for year, quarter in latest_quarters:
         entries = quarter_map.get((year, quarter), [])
         if not entries:
@@ -245,6 +678,8 @@ def main():
                         args.timeout,
                         extensions,
                         args.max_depth,
+                        listings=listings,
+                        cache=cache,
                     )
                 )
             elif should_download(entry, extensions):
@@ -256,38 +691,25 @@ def main():
 
         for file_url in sorted(set(quarter_files)):
             dest = normalize_local_path(args.base_url, file_url, args.output_dir)
-            status = "dry-run"
-            size = 0
-            error = None
-            attempts = 0
-            try:
-                if not args.dry_run:
-                    status, size, attempts, error = download_file(
-                        file_url,
-                        dest,
-                        args.timeout,
-                        args.overwrite,
-                        args.retries,
-                        args.backoff,
-                    )
-            except Exception as exc:
-                status = "error"
-                error = str(exc)
-            manifest_entries.append(
-                {
-                    "quarter": quarter_label(year, quarter),
-                    "url": file_url,
-                    "local_path": dest,
-                    "status": status,
-                    "bytes": size,
-                    "error": error,
-                    "attempts": attempts,
-                }
-            )
-            summary[status] = summary.get(status, 0) + 1
-            print(f"[{quarter_label(year, quarter)}] {status}: {file_url}")
+            jobs.append((quarter_label(year, quarter), file_url, dest))
+
+    manifest_entries = download_all(
+        jobs,
+        args.timeout,
+        args.overwrite,
+        args.retries,
+        args.backoff,
+        args.dry_run,
+        workers=args.workers,
+        per_host=args.per_host,
+        refresh=args.refresh,
+        previous=load_previous_manifest(manifest_path),
+    )
+    for entry in manifest_entries:
+        status = entry["status"]
+        summary[status] = summary.get(status, 0) + 1
+    summary["listing_cache"] = dict(cache.stats)
 
-    manifest_path = os.path.join(args.output_dir, args.manifest)
     os.makedirs(args.output_dir, exist_ok=True)
     with open(manifest_path, "w", encoding="utf-8") as f:
         json.dump(
@@ -0,0 +1,274 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import pickle
+import re
+import shutil
+import time
+from http.client import HTTPException
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+try:
+    import pandas as pd  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    pd = None
+
+
+CADOP_URL = (
+    "https://dadosabertos.ans.gov.br/FTP/PDA/"
+    "operadoras_de_plano_de_saude_ativas/Relatorio_cadop.csv"
+)
+DEFAULT_CADOP_PATH = os.path.join("data", "operadoras", "operadoras_ativas.csv")
+CADOP_MAX_AGE = 24 * 60 * 60
+CADOP_META_SUFFIX = ".meta.json"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_SUFFIX = ".snapshot.pkl"
+REGISTRO_FIELDS = ("registrooperadora", "regans", "registroans")
+
+
+def normalize_field_name(name: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def only_digits(value: str) -> str:
+    return re.sub(r"\D", "", value or "")
+
+
+def offline_mode() -> bool:
+    return os.getenv("ANS_OFFLINE", "").lower() in ("1", "true", "yes")
+
+
+def read_cadop_meta(dest: str) -> Dict[str, Any]:
+    try:
+        with open(dest + CADOP_META_SUFFIX, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_cadop_meta(dest: str, meta: Dict[str, Any]) -> None:
+    tmp_path = dest + CADOP_META_SUFFIX + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, dest + CADOP_META_SUFFIX)
+
+
+def fetch_cadop(
+    url: str,
+    dest: str,
+    timeout: float = 60,
+    max_age: float = CADOP_MAX_AGE,
+    offline: Optional[bool] = None,
+    refresh: bool = False,
+    clock=time.time,
+) -> str:
+    offline = offline_mode() if offline is None else offline
+    cached = os.path.exists(dest)
+    meta = read_cadop_meta(dest) if cached else {}
+    if cached and offline:
+        return "offline"
+    if offline:
+        raise RuntimeError(
+            f"Modo offline e cadastro de operadoras ausente em '{dest}'."
+        )
+    if cached and not refresh and clock() - meta.get("checked_at", 0) < max_age:
+        return "cached"
+
+    headers = {"User-Agent": "ans-consolidator/1.0"}
+    if cached and meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if cached and meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+    part_path = dest + ".part"
+    try:
+        with urlopen(Request(url, headers=headers), timeout=timeout) as resp:
+            with open(part_path, "wb") as f:
+                shutil.copyfileobj(resp, f, 1024 * 1024)
+            validators = {
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified"),
+            }
+    except HTTPError as exc:
+        if exc.code == 304 and cached:
+            meta["checked_at"] = clock()
+            write_cadop_meta(dest, meta)
+            return "not-modified"
+        if not cached:
+            raise
+        print(
+            f"Aviso: falha ao atualizar cadastro de operadoras, usando copia local: {exc}"
+        )
+        return "stale"
+    except (URLError, TimeoutError, OSError, HTTPException) as exc:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        if not cached:
+            raise
+        print(
+            f"Aviso: falha ao atualizar cadastro de operadoras, usando copia local: {exc}"
+        )
+        return "stale"
+
+    os.replace(part_path, dest)
+    write_cadop_meta(dest, {"url": url, "checked_at": clock(), **validators})
+    return "downloaded"
+
+
+def decode_cadop(raw: bytes) -> str:
+    try:
+        return raw.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return raw.decode("latin-1")
+
+
+class OperadorasLookup:
+    def __init__(
+        self,
+        columns: Sequence[str],
+        records: List[Tuple[str, ...]],
+        by_registro: Optional[Dict[str, int]] = None,
+        by_cnpj: Optional[Dict[str, int]] = None,
+    ) -> None:
+        self.columns = list(columns)
+        self.records = records
+        self.fields = {normalize_field_name(name): i for i, name in enumerate(columns)}
+        self.registro_col = next(
+            (self.fields[name] for name in REGISTRO_FIELDS if name in self.fields),
+            None,
+        )
+        self.cnpj_col = self.fields.get("cnpj")
+        if by_registro is None or by_cnpj is None:
+            by_registro = self.build_index(self.registro_col)
+            by_cnpj = self.build_index(self.cnpj_col)
+        self.by_registro = by_registro
+        self.by_cnpj = by_cnpj
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def build_index(self, col: Optional[int]) -> Dict[str, int]:
+        index: Dict[str, int] = {}
+        if col is None:
+            return index
+        for idx, record in enumerate(self.records):
+            key = only_digits(record[col])
+            if key:
+                index[key] = idx
+        return index
+
+    def field(self, *names: str) -> Optional[int]:
+        for name in names:
+            if name in self.fields:
+                return self.fields[name]
+        return None
+
+    def record(self, idx: int) -> Dict[str, str]:
+        return dict(zip(self.columns, self.records[idx]))
+
+    def get_by_registro(self, value: str) -> Optional[Dict[str, str]]:
+        idx = self.by_registro.get(only_digits(str(value)))
+        return None if idx is None else self.record(idx)
+
+    def get_by_cnpj(self, value: str) -> Optional[Dict[str, str]]:
+        idx = self.by_cnpj.get(only_digits(str(value)))
+        return None if idx is None else self.record(idx)
+
+    def to_frame(self, rows: Optional[Iterable[int]] = None) -> Any:
+        if pd is None:
+            raise RuntimeError(
+                "pandas nao esta instalado. Instale com: pip install pandas"
+            )
+        records = self.records if rows is None else [self.records[i] for i in rows]
+        frame = pd.DataFrame(records, columns=self.columns, dtype=object)
+        return frame.mask(frame == "")
+
+    def to_snapshot(self) -> Dict[str, Any]:
+        return {
+            "columns": self.columns,
+            "records": self.records,
+            "by_registro": self.by_registro,
+            "by_cnpj": self.by_cnpj,
+        }
+
+
+def parse_cadop(path: str) -> OperadorasLookup:
+    with open(path, "rb") as f:
+        text = decode_cadop(f.read())
+    reader = csv.reader(io.StringIO(text, newline=""), delimiter=";")
+    header = next(reader, None)
+    if not header:
+        return OperadorasLookup([], [])
+    width = len(header)
+    records = []
+    for row in reader:
+        if not row:
+            continue
+        if len(row) < width:
+            row += [""] * (width - len(row))
+        records.append(tuple(value.strip() for value in row[:width]))
+    return OperadorasLookup([name.strip() for name in header], records)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_snapshot(snapshot_path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(snapshot_path, "rb") as f:
+            snapshot = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION:
+        return None
+    return snapshot
+
+
+def write_snapshot(
+    snapshot_path: str, source: Dict[str, Any], lookup: OperadorasLookup
+) -> None:
+    payload = {"version": SNAPSHOT_VERSION, "source": source, **lookup.to_snapshot()}
+    tmp_path = snapshot_path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, snapshot_path)
+    except OSError as exc:
+        print(f"Aviso: falha ao gravar snapshot de operadoras: {exc}")
+
+
+def load_lookup(path: str, snapshot_path: Optional[str] = None) -> OperadorasLookup:
+    snapshot_path = snapshot_path or path + SNAPSHOT_SUFFIX
+    stat = os.stat(path)
+    source: Dict[str, Any] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    snapshot = read_snapshot(snapshot_path)
+    if snapshot is not None and snapshot["source"]["size"] == stat.st_size:
+        cached = snapshot["source"]
+        fresh = cached["mtime_ns"] == stat.st_mtime_ns
+        if not fresh:
+            source["sha256"] = file_sha256(path)
+            fresh = cached["sha256"] == source["sha256"]
+        if fresh:
+            lookup = OperadorasLookup(
+                snapshot["columns"],
+                snapshot["records"],
+                snapshot["by_registro"],
+                snapshot["by_cnpj"],
+            )
+            if cached["mtime_ns"] != stat.st_mtime_ns:
+                write_snapshot(snapshot_path, source, lookup)
+            return lookup
+
+    lookup = parse_cadop(path)
+    source.setdefault("sha256", file_sha256(path))
+    write_snapshot(snapshot_path, source, lookup)
+    return lookup
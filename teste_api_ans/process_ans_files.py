@@ -1,24 +1,76 @@
 import argparse
 import csv
+import functools
+import io
+import itertools
 import json
 import os
 import re
 import time
 import zipfile
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import nullcontext
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Tuple, cast
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    cast,
+)
 
 try:
     import openpyxl  # type: ignore
 except Exception:  # pragma: no cover - optional dependency
     openpyxl = None
 
+try:
+    import numpy as np  # type: ignore
+    import pandas as pd  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    np = None
+    pd = None
+
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.csv as pa_csv  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    pa = None
+    pa_csv = None
+    pq = None
+
 
 DEFAULT_INPUT_DIR = os.path.join("data", "demonstracoes_contabeis")
 DEFAULT_EXTRACT_DIR = os.path.join("data", "extracted")
 DEFAULT_OUTPUT_DIR = os.path.join("data", "processed")
 
 SUPPORTED_EXTENSIONS = {".csv", ".txt", ".xlsx", ".xls"}
+ENGINES = ("python", "vectorized")
+VECTORIZED_BATCH_ROWS = 200_000
+CLASSIFIER_CACHE_SIZE = 65536
+CODE_INDEX_VERSION = 2
+CODE_INDEX_RULE = "descricao contem 'despesa' e ('evento' ou 'sinistro')"
+DEFAULT_CODE_INDEX = os.path.join(DEFAULT_OUTPUT_DIR, "code_index.json")
+PARQUET_BLOCK_SIZE = 64 * 1024 * 1024
+NORMALIZED_PARQUET_COLUMNS = (
+    ("cnpj", "string"),
+    ("reg_ans", "string"),
+    ("razao_social", "string"),
+    ("valor_despesas", "float64"),
+    ("descricao", "string"),
+    ("competencia_raw", "string"),
+    ("ano", "int16"),
+    ("trimestre", "int8"),
+    ("source_file", "string"),
+)
+PLAIN_NUMBER_PATTERN = r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?"
 
 
 def list_zip_files(input_dir: str, manifest_path: Optional[str]) -> List[str]:
@@ -38,7 +90,7 @@ def list_zip_files(input_dir: str, manifest_path: Optional[str]) -> List[str]:
         for name in files:
             if name.lower().endswith(".zip"):
                 zip_files.append(os.path.join(root, name))
-    return zip_files
+    return sorted(zip_files)
 
 
 def extract_zip(zip_path: str, extract_dir: str, overwrite: bool) -> str:
@@ -54,13 +106,23 @@ def extract_zip(zip_path: str, extract_dir: str, overwrite: bool) -> str:
 
 def iter_data_files(extract_dirs: Iterable[str]) -> Iterable[str]:
     for extract_dir in extract_dirs:
-        for root, _, files in os.walk(extract_dir):
-            for name in files:
+        for root, dirs, files in os.walk(extract_dir):
+            dirs.sort()
+            for name in sorted(files):
                 ext = os.path.splitext(name)[1].lower()
                 if ext in SUPPORTED_EXTENSIONS:
                     yield os.path.join(root, name)
 
 
+def iter_zip_members(zf: zipfile.ZipFile) -> Iterable[zipfile.ZipInfo]:
+    for info in zf.infolist():
+        if info.is_dir():
+            continue
+        ext = os.path.splitext(info.filename)[1].lower()
+        if ext in SUPPORTED_EXTENSIONS:
+            yield info
+
+
 def normalize_text(value: str) -> str:
     value = value.strip().lower()
     value = re.sub(r"\s+", " ", value)
@@ -86,6 +148,10 @@ def open_text_file(path: str):
         return open(path, "r", encoding="latin-1", errors="replace", newline="")
 
 
+def open_text_stream(stream: IO[bytes]) -> IO[str]:
+    return io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline="")
+
+
 def guess_columns(columns: List[str]) -> Dict[str, Optional[str]]:
     normalized = {col: normalize_column_name(col) for col in columns}
 
@@ -137,6 +203,7 @@ def guess_columns(columns: List[str]) -> Dict[str, Optional[str]]:
                 (("data", "dt"), 2),
             ]
         ),
+        "conta": pick_column([(("cdconta", "codconta", "codigoconta"), 3)]),
     }
 
 
@@ -147,6 +214,142 @@ def is_despesa_evento(value: str) -> bool:
     return "evento" in text or "sinistro" in text
 
 
+def make_classifier(maxsize: int = CLASSIFIER_CACHE_SIZE) -> Callable[[str], bool]:
+    return functools.lru_cache(maxsize=maxsize)(is_despesa_evento)
+
+
+def classifier_stats(classify: Callable[[str], bool]) -> Dict[str, Any]:
+    info = getattr(classify, "cache_info", None)
+    if info is None:
+        return {"hits": 0, "misses": 0, "size": 0}
+    current = info()
+    return {"hits": current.hits, "misses": current.misses, "size": current.currsize}
+
+
+def merge_classifier_stats(
+    total: Dict[str, Any], stats: Dict[str, Any]
+) -> Dict[str, Any]:
+    merged = {key: total.get(key, 0) + stats.get(key, 0) for key in stats}
+    lookups = merged["hits"] + merged["misses"]
+    merged["hit_rate"] = round(merged["hits"] / lookups, 4) if lookups else 0.0
+    return merged
+
+
+def lookup_code(code_index: Dict[str, Optional[bool]], code: str) -> Optional[bool]:
+    code = code.strip()
+    for size in range(len(code), 0, -1):
+        prefix = code[:size]
+        if prefix in code_index:
+            return code_index[prefix]
+    return None
+
+
+def make_code_classifier(
+    code_index: Optional[Dict[str, Optional[bool]]],
+    maxsize: int = CLASSIFIER_CACHE_SIZE,
+) -> Optional[Callable[[str], Optional[bool]]]:
+    if not code_index:
+        return None
+    return functools.lru_cache(maxsize=maxsize)(
+        functools.partial(lookup_code, code_index)
+    )
+
+
+def build_code_entries(observations: Dict[str, int]) -> Dict[str, Optional[bool]]:
+    return {
+        code: None if flags == 3 else flags == 1
+        for code, flags in sorted(observations.items())
+    }
+
+
+def observe_codes(
+    text_file: IO[str], observations: Dict[str, int], classify: Callable[[str], bool]
+) -> bool:
+    first_line = text_file.readline()
+    if not first_line:
+        return False
+    delimiter = detect_delimiter(first_line)
+    reader = csv.reader(itertools.chain([first_line], text_file), delimiter=delimiter)
+    header = next(reader)
+    mapping = guess_columns(header)
+    if not mapping.get("conta") or not mapping.get("descricao"):
+        return False
+    columns = {col: idx for idx, col in enumerate(header)}
+    conta_idx = columns[cast(str, mapping["conta"])]
+    descricao_idx = columns[cast(str, mapping["descricao"])]
+    for row in reader:
+        if conta_idx >= len(row):
+            continue
+        code = row[conta_idx].strip()
+        if not code:
+            continue
+        descricao = row[descricao_idx] if descricao_idx < len(row) else ""
+        flag = 1 if classify(descricao) else 2
+        observations[code] = observations.get(code, 0) | flag
+    return True
+
+
+def build_code_index(
+    tasks: List[Tuple[Optional[str], str, str]], output_path: str
+) -> Dict[str, Optional[bool]]:
+    observations: Dict[str, int] = {}
+    sources = []
+    classify = make_classifier()
+    for archive, path, _ in tasks:
+        if os.path.splitext(path)[1].lower() not in {".csv", ".txt"}:
+            continue
+        if archive is None:
+            with open_text_file(path) as f:
+                used = observe_codes(f, observations, classify)
+        else:
+            with zipfile.ZipFile(archive, "r") as zf:
+                with zf.open(path) as member:
+                    used = observe_codes(
+                        open_text_stream(member), observations, classify
+                    )
+        if used:
+            sources.append(path if archive is None else f"{archive}:{path}")
+    codes = build_code_entries(observations)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "version": CODE_INDEX_VERSION,
+                "rule": CODE_INDEX_RULE,
+                "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "sources": sources,
+                "codes_observed": len(observations),
+                "ambiguous": sorted(
+                    c for c, flags in observations.items() if flags == 3
+                ),
+                "codes": codes,
+            },
+            f,
+            ensure_ascii=False,
+            indent=2,
+        )
+    return codes
+
+
+def load_code_index(path: str) -> Optional[Dict[str, Optional[bool]]]:
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        payload = json.load(f)
+    if (
+        payload.get("version") != CODE_INDEX_VERSION
+        or payload.get("rule") != CODE_INDEX_RULE
+    ):
+        print(
+            f"Aviso: indice de contas desatualizado em {path}; use --build-code-index."
+        )
+        return None
+    return {
+        str(code): None if flag is None else bool(flag)
+        for code, flag in payload.get("codes", {}).items()
+    }
+
+
 def parse_number(value: str) -> Optional[float]:
     if value is None:
         return None
@@ -210,17 +413,55 @@ def build_output_writer(output_path: str):
     return output_file, writer
 
 
+def write_parquet_copy(
+    csv_path: str, columns: Sequence[Tuple[str, str]] = NORMALIZED_PARQUET_COLUMNS
+) -> str:
+    if pa is None:
+        raise RuntimeError(
+            "pyarrow nao esta instalado. Instale com: pip install pyarrow"
+        )
+    schema = pa.schema([(name, getattr(pa, kind)()) for name, kind in columns])
+    parquet_path = os.path.splitext(csv_path)[0] + ".parquet"
+    reader = pa_csv.open_csv(
+        csv_path,
+        read_options=pa_csv.ReadOptions(block_size=PARQUET_BLOCK_SIZE),
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        convert_options=pa_csv.ConvertOptions(
+            column_types=schema,
+            null_values=[""],
+            strings_can_be_null=True,
+        ),
+    )
+    tmp_path = parquet_path + ".tmp"
+    with pq.ParquetWriter(
+        tmp_path, schema, compression="zstd", write_statistics=True
+    ) as writer:
+        for batch in reader:
+            writer.write_batch(batch)
+    os.replace(tmp_path, parquet_path)
+    return parquet_path
+
+
 def normalize_row(
     row: Dict[str, str],
     mapping: Dict[str, Optional[str]],
     source_file: str,
+    classify: Callable[[str], bool] = is_despesa_evento,
+    classify_code: Optional[Callable[[str], Optional[bool]]] = None,
 ) -> Optional[List[str]]:
     descricao_col = mapping.get("descricao")
-    if descricao_col and row.get(descricao_col) is not None:
-        if not is_despesa_evento(str(row.get(descricao_col))):
+    conta_col = mapping.get("conta")
+    known = None
+    if classify_code is not None and conta_col:
+        known = classify_code(str(row.get(conta_col, "")))
+    if known is not None:
+        if not known:
+            return None
+    elif descricao_col and row.get(descricao_col) is not None:
+        if not classify(str(row.get(descricao_col))):
             return None
     else:
-        if not any(is_despesa_evento(str(value)) for value in row.values()):
+        if not any(classify(str(value)) for value in row.values()):
             return None
 
     def get_value(key: Optional[str]) -> str:
@@ -254,21 +495,26 @@ def normalize_row(
 
 
 def process_csv_file(
-    path: str, output_path: str, manifest_entry: Dict[str, Any]
+    path: str,
+    output_path: str,
+    manifest_entry: Dict[str, Any],
+    stream: Optional[IO[bytes]] = None,
+    code_index: Optional[Dict[str, Optional[bool]]] = None,
 ) -> int:
-    with open_text_file(path) as f:
+    with open_text_file(path) if stream is None else open_text_stream(stream) as f:
         first_line = f.readline()
         if not first_line:
             return 0
         delimiter = detect_delimiter(first_line)
-        f.seek(0)
-        reader = csv.reader(f, delimiter=delimiter)
+        reader = csv.reader(itertools.chain([first_line], f), delimiter=delimiter)
         try:
             header = next(reader)
         except StopIteration:
             return 0
         mapping = guess_columns(header)
         manifest_entry["columns"] = mapping
+        classify = make_classifier()
+        classify_code = make_code_classifier(code_index)
         output_file, writer = build_output_writer(output_path)
         rows_written = 0
         try:
@@ -277,25 +523,329 @@ def process_csv_file(
                     col: (row[idx] if idx < len(row) else "")
                     for idx, col in enumerate(header)
                 }
-                normalized = normalize_row(row_dict, mapping, os.path.basename(path))
+                normalized = normalize_row(
+                    row_dict, mapping, os.path.basename(path), classify, classify_code
+                )
                 if normalized is None:
                     continue
                 writer.writerow(normalized)
                 rows_written += 1
         finally:
             output_file.close()
+        manifest_entry["classifier_cache"] = merge_classifier_stats(
+            {}, classifier_stats(classify)
+        )
+        if classify_code is not None:
+            manifest_entry["code_index_cache"] = merge_classifier_stats(
+                {}, classifier_stats(classify_code)
+            )
+        return rows_written
+
+
+def iter_record_chunks(stream: IO[bytes], chunk_size: int) -> Iterable[bytes]:
+    pending = b""
+    while True:
+        block = stream.read(chunk_size)
+        if not block:
+            break
+        pending += block
+        cut = pending.rfind(b"\n")
+        while cut != -1 and pending.count(b'"', 0, cut) % 2:
+            cut = pending.rfind(b"\n", 0, cut)
+        if cut == -1:
+            continue
+        yield pending[: cut + 1]
+        pending = pending[cut + 1 :]
+    if pending:
+        yield pending
+
+
+def process_csv_chunk(
+    payload: Tuple[
+        bytes,
+        str,
+        List[str],
+        Dict[str, Optional[str]],
+        str,
+        Optional[Dict[str, Optional[bool]]],
+    ],
+) -> Tuple[str, int, Dict[str, Any], Optional[Dict[str, Any]]]:
+    chunk, delimiter, header, mapping, source_name, code_index = payload
+    text = chunk.decode("utf-8", errors="replace")
+    reader = csv.reader(io.StringIO(text, newline=""), delimiter=delimiter)
+    output = io.StringIO()
+    writer = csv.writer(output)
+    classify = make_classifier()
+    classify_code = make_code_classifier(code_index)
+    rows_written = 0
+    for row in reader:
+        row_dict = {
+            col: (row[idx] if idx < len(row) else "") for idx, col in enumerate(header)
+        }
+        normalized = normalize_row(
+            row_dict, mapping, source_name, classify, classify_code
+        )
+        if normalized is None:
+            continue
+        writer.writerow(normalized)
+        rows_written += 1
+    code_stats = None if classify_code is None else classifier_stats(classify_code)
+    return output.getvalue(), rows_written, classifier_stats(classify), code_stats
+
+
+def process_csv_file_chunked(
+    path: str,
+    output_path: str,
+    manifest_entry: Dict[str, Any],
+    stream: Optional[IO[bytes]] = None,
+    executor: Optional[Executor] = None,
+    chunk_size: int = 32 * 1024 * 1024,
+    code_index: Optional[Dict[str, Optional[bool]]] = None,
+) -> int:
+    with open(path, "rb") if stream is None else nullcontext(stream) as f:
+        first_line = f.readline().decode("utf-8-sig", errors="replace")
+        if not first_line:
+            return 0
+        delimiter = detect_delimiter(first_line)
+        try:
+            header = next(csv.reader([first_line], delimiter=delimiter))
+        except StopIteration:
+            return 0
+        mapping = guess_columns(header)
+        manifest_entry["columns"] = mapping
+        source_name = os.path.basename(path)
+        output_file, _ = build_output_writer(output_path)
+        totals: Dict[str, Any] = {
+            "rows": 0,
+            "chunks": 0,
+            "classifier": {},
+            "code_index": None,
+        }
+        max_in_flight = 2 * (os.cpu_count() or 1)
+        pending: deque = deque()
+
+        def consume(
+            result: Tuple[str, int, Dict[str, Any], Optional[Dict[str, Any]]],
+        ) -> None:
+            text, count, stats, code_stats = result
+            output_file.write(text)
+            totals["rows"] += count
+            totals["classifier"] = merge_classifier_stats(totals["classifier"], stats)
+            if code_stats is not None:
+                totals["code_index"] = merge_classifier_stats(
+                    totals["code_index"] or {}, code_stats
+                )
+
+        try:
+            for chunk in iter_record_chunks(f, chunk_size):
+                payload = (chunk, delimiter, header, mapping, source_name, code_index)
+                totals["chunks"] += 1
+                if executor is None:
+                    consume(process_csv_chunk(payload))
+                    continue
+                pending.append(executor.submit(process_csv_chunk, payload))
+                while len(pending) >= max_in_flight:
+                    consume(pending.popleft().result())
+            while pending:
+                consume(pending.popleft().result())
+        finally:
+            for future in pending:
+                future.cancel()
+            output_file.close()
+        manifest_entry["chunks"] = totals["chunks"]
+        manifest_entry["classifier_cache"] = totals["classifier"]
+        if totals["code_index"] is not None:
+            manifest_entry["code_index_cache"] = totals["code_index"]
+        return totals["rows"]
+
+
+def map_unique(values: Any, func: Any) -> List[Any]:
+    codes, uniques = pd.factorize(values)
+    mapped = [func(value) for value in uniques]
+    return [mapped[code] for code in codes]
+
+
+def despesa_evento_mask(values: Any) -> Any:
+    text = values.str.lower()
+    return text.str.contains("despesa", regex=False) & (
+        text.str.contains("evento", regex=False)
+        | text.str.contains("sinistro", regex=False)
+    )
+
+
+def format_numbers(values: Any) -> List[str]:
+    text = values.str.strip()
+    text = text.str.replace("R$", "", regex=False).str.replace(" ", "", regex=False)
+    negative = text.str.startswith("(") & text.str.endswith(")")
+    text = text.where(~negative, text.str.slice(1, -1))
+    has_comma = text.str.contains(",", regex=False)
+    has_dot = text.str.contains(".", regex=False)
+    comma_decimal = has_comma & (~has_dot | (text.str.rfind(",") > text.str.rfind(".")))
+    text = text.where(
+        ~comma_decimal,
+        text.str.replace(".", "", regex=False).str.replace(",", ".", regex=False),
+    )
+    text = text.where(comma_decimal, text.str.replace(",", "", regex=False))
+    plain = text.str.fullmatch(PLAIN_NUMBER_PATTERN).to_numpy(dtype=bool)
+
+    result = np.empty(len(values), dtype=object)
+    numbers = text.to_numpy(dtype=object)[plain].astype(np.float64)
+    numbers = np.where(negative.to_numpy(dtype=bool)[plain], -numbers, numbers)
+    result[plain] = [f"{number:.2f}" for number in numbers]
+    others = np.flatnonzero(~plain)
+    if len(others):
+        raw = values.to_numpy(dtype=object)
+        for idx in others:
+            number = parse_number(raw[idx])
+            result[idx] = "" if number is None else f"{number:.2f}"
+    return result.tolist()
+
+
+def text_filter_mask(
+    frame: Any, columns: Dict[str, int], mapping: Dict[str, Optional[str]]
+) -> Any:
+    descricao_col = mapping.get("descricao")
+    if descricao_col:
+        return despesa_evento_mask(frame[columns[descricao_col]]).to_numpy(dtype=bool)
+    mask = np.zeros(len(frame), dtype=bool)
+    for idx in columns.values():
+        mask |= despesa_evento_mask(frame[idx]).to_numpy(dtype=bool)
+    return mask
+
+
+def normalize_frame(
+    frame: Any,
+    columns: Dict[str, int],
+    mapping: Dict[str, Optional[str]],
+    source_file: str,
+    classify_code: Optional[Callable[[str], Optional[bool]]] = None,
+) -> List[List[str]]:
+    descricao_col = mapping.get("descricao")
+    conta_col = mapping.get("conta")
+    if classify_code is not None and conta_col:
+        known = np.array(
+            map_unique(frame[columns[conta_col]], classify_code), dtype=object
+        )
+        unknown = np.equal(known, None)
+        mask = np.zeros(len(frame), dtype=bool)
+        mask[~unknown] = known[~unknown].astype(bool)
+        if unknown.any():
+            mask[unknown] = text_filter_mask(frame[unknown], columns, mapping)
+    else:
+        mask = text_filter_mask(frame, columns, mapping)
+    frame = frame[mask]
+    if frame.empty:
+        return []
+
+    empty = [""] * len(frame)
+
+    def get_column(key: Optional[str]) -> Any:
+        if not key:
+            return None
+        return frame[columns[key]]
+
+    def stripped(key: Optional[str]) -> List[str]:
+        column = get_column(key)
+        return empty if column is None else column.str.strip().tolist()
+
+    cnpj = get_column(mapping.get("cnpj"))
+    valor = get_column(mapping.get("valor"))
+    competencia = get_column(mapping.get("competencia"))
+    if competencia is None:
+        periods = [("", "")] * len(frame)
+    else:
+        periods = map_unique(
+            competencia,
+            lambda value: tuple(
+                "" if part is None else str(part)
+                for part in extract_year_quarter(value)
+            ),
+        )
+    return [
+        empty if cnpj is None else map_unique(cnpj, lambda v: re.sub(r"\D", "", v)),
+        stripped(mapping.get("reg_ans")),
+        stripped(mapping.get("razao_social")),
+        empty if valor is None else format_numbers(valor),
+        stripped(descricao_col),
+        stripped(mapping.get("competencia")),
+        [period[0] for period in periods],
+        [period[1] for period in periods],
+        [source_file] * len(frame),
+    ]
+
+
+def process_csv_file_vectorized(
+    path: str,
+    output_path: str,
+    manifest_entry: Dict[str, Any],
+    stream: Optional[IO[bytes]] = None,
+    batch_rows: Optional[int] = None,
+    code_index: Optional[Dict[str, Optional[bool]]] = None,
+) -> int:
+    if pd is None:
+        raise RuntimeError("pandas nao esta instalado. Instale com: pip install pandas")
+    batch_rows = batch_rows or VECTORIZED_BATCH_ROWS
+    with open(path, "rb") if stream is None else nullcontext(stream) as f:
+        first_line = f.readline().decode("utf-8-sig", errors="replace")
+        if not first_line:
+            return 0
+        delimiter = detect_delimiter(first_line)
+        try:
+            header = next(csv.reader([first_line], delimiter=delimiter))
+        except StopIteration:
+            return 0
+        mapping = guess_columns(header)
+        manifest_entry["columns"] = mapping
+        columns = {col: idx for idx, col in enumerate(header)}
+        source_name = os.path.basename(path)
+        classify_code = make_code_classifier(code_index)
+        output_file, writer = build_output_writer(output_path)
+        rows_written = 0
+        try:
+            batches = pd.read_csv(
+                f,
+                sep=delimiter,
+                header=None,
+                names=list(range(len(header))),
+                usecols=list(range(len(header))),
+                dtype=str,
+                keep_default_na=False,
+                encoding="utf-8",
+                encoding_errors="replace",
+                chunksize=batch_rows,
+            )
+            for frame in batches:
+                normalized = normalize_frame(
+                    frame, columns, mapping, source_name, classify_code
+                )
+                if not normalized:
+                    continue
+                writer.writerows(zip(*normalized))
+                rows_written += len(normalized[0])
+        finally:
+            output_file.close()
+        if classify_code is not None:
+            manifest_entry["code_index_cache"] = merge_classifier_stats(
+                {}, classifier_stats(classify_code)
+            )
         return rows_written
 
 
 def process_xlsx_file(
-    path: str, output_path: str, manifest_entry: Dict[str, Any]
+    path: str,
+    output_path: str,
+    manifest_entry: Dict[str, Any],
+    stream: Optional[IO[bytes]] = None,
+    code_index: Optional[Dict[str, Optional[bool]]] = None,
 ) -> int:
     if openpyxl is None:
         raise RuntimeError(
             "openpyxl nao esta instalado. Instale com: pip install openpyxl"
         )
     openpyxl_mod = cast(Any, openpyxl)
-    workbook = openpyxl_mod.load_workbook(path, read_only=True, data_only=True)
+    workbook = openpyxl_mod.load_workbook(
+        path if stream is None else stream, read_only=True, data_only=True
+    )
     sheet = workbook.active
     rows = sheet.iter_rows(values_only=True)
     try:
@@ -305,6 +855,8 @@ def process_xlsx_file(
     columns = [str(col) if col is not None else "" for col in header]
     mapping = guess_columns(columns)
     manifest_entry["columns"] = mapping
+    classify = make_classifier()
+    classify_code = make_code_classifier(code_index)
     output_file, writer = build_output_writer(output_path)
     rows_written = 0
     try:
@@ -314,7 +866,9 @@ def process_xlsx_file(
                 col: (row_values[idx] if idx < len(row_values) else "")
                 for idx, col in enumerate(columns)
             }
-            normalized = normalize_row(row_dict, mapping, os.path.basename(path))
+            normalized = normalize_row(
+                row_dict, mapping, os.path.basename(path), classify, classify_code
+            )
             if normalized is None:
                 continue
             writer.writerow(normalized)
@@ -322,10 +876,25 @@ def process_xlsx_file(
     finally:
         output_file.close()
         workbook.close()
+    manifest_entry["classifier_cache"] = merge_classifier_stats(
+        {}, classifier_stats(classify)
+    )
+    if classify_code is not None:
+        manifest_entry["code_index_cache"] = merge_classifier_stats(
+            {}, classifier_stats(classify_code)
+        )
     return rows_written
 
 
-def process_file(path: str, output_dir: str) -> Dict[str, Any]:
+def process_file(
+    path: str,
+    output_dir: str,
+    stream: Optional[IO[bytes]] = None,
+    executor: Optional[Executor] = None,
+    chunk_size: int = 0,
+    engine: str = "python",
+    code_index: Optional[Dict[str, Optional[bool]]] = None,
+) -> Dict[str, Any]:
     ext = os.path.splitext(path)[1].lower()
     output_path = os.path.join(output_dir, "normalized", f"{Path(path).stem}.csv")
     manifest_entry: Dict[str, Any] = {
@@ -335,10 +904,28 @@ def process_file(path: str, output_dir: str) -> Dict[str, Any]:
         "status": "skipped",
     }
     try:
-        if ext in {".csv", ".txt"}:
-            count = process_csv_file(path, output_path, manifest_entry)
+        if ext in {".csv", ".txt"} and engine == "vectorized":
+            count = process_csv_file_vectorized(
+                path, output_path, manifest_entry, stream, code_index=code_index
+            )
+        elif ext in {".csv", ".txt"} and chunk_size > 0:
+            count = process_csv_file_chunked(
+                path,
+                output_path,
+                manifest_entry,
+                stream,
+                executor,
+                chunk_size,
+                code_index,
+            )
+        elif ext in {".csv", ".txt"}:
+            count = process_csv_file(
+                path, output_path, manifest_entry, stream, code_index
+            )
         elif ext in {".xlsx", ".xls"}:
-            count = process_xlsx_file(path, output_path, manifest_entry)
+            count = process_xlsx_file(
+                path, output_path, manifest_entry, stream, code_index
+            )
         else:
             return manifest_entry
         manifest_entry["rows_written"] = str(count)
@@ -349,7 +936,50 @@ def process_file(path: str, output_dir: str) -> Dict[str, Any]:
     return manifest_entry
 
 
-def main() -> int:
+def process_task(
+    task: Tuple[Optional[str], str, str],
+    executor: Optional[Executor] = None,
+    chunk_size: int = 0,
+    engine: str = "python",
+    code_index: Optional[Dict[str, Optional[bool]]] = None,
+) -> Dict[str, Any]:
+    archive, path, output_dir = task
+    if archive is None:
+        return process_file(
+            path, output_dir, None, executor, chunk_size, engine, code_index
+        )
+    with zipfile.ZipFile(archive, "r") as zf:
+        with zf.open(path) as member:
+            entry = process_file(
+                path, output_dir, member, executor, chunk_size, engine, code_index
+            )
+    entry["archive"] = archive
+    return entry
+
+
+def run_tasks(
+    tasks: List[Tuple[Optional[str], str, str]],
+    jobs: int,
+    chunk_size: int = 0,
+    engine: str = "python",
+    code_index: Optional[Dict[str, Optional[bool]]] = None,
+) -> Iterable[Dict[str, Any]]:
+    if chunk_size > 0 and engine == "python":
+        pool = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+        with pool if pool is not None else nullcontext():
+            for task in tasks:
+                yield process_task(task, pool, chunk_size, code_index=code_index)
+        return
+    if jobs <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield process_task(task, engine=engine, code_index=code_index)
+        return
+    worker = functools.partial(process_task, engine=engine, code_index=code_index)
+    with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as executor:
+        yield from executor.map(worker, tasks)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
     parser = argparse.ArgumentParser(
         description="Processa os arquivos da ANS e extrai despesas com eventos/sinistros."
     )
@@ -360,60 +990,169 @@ def main() -> int:
         "--manifest", default=os.path.join(DEFAULT_INPUT_DIR, "manifest.json")
     )
     parser.add_argument("--overwrite", action="store_true")
-    args = parser.parse_args()
+    parser.add_argument(
+        "--extract",
+        action="store_true",
+        help="Extrai os ZIPs em --extract-dir antes de processar (depuracao).",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Numero de processos para processar arquivos em paralelo.",
+    )
+    parser.add_argument(
+        "--chunk-mb",
+        type=float,
+        default=0,
+        help=(
+            "Divide cada CSV em blocos de N MB processados em paralelo pelos "
+            "--jobs processos (0 = desativado)."
+        ),
+    )
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="python",
+        help="python: csv linha a linha; vectorized: pandas em lotes de colunas.",
+    )
+    parser.add_argument(
+        "--parquet",
+        action="store_true",
+        help="Grava tambem cada CSV normalizado em Parquet (requer pyarrow).",
+    )
+    parser.add_argument(
+        "--code-index",
+        default=None,
+        help=(
+            "Indice JSON de codigos de conta (CD_CONTA_CONTABIL) usado como filtro "
+            f"rapido. Com --build-code-index, o padrao e {DEFAULT_CODE_INDEX}."
+        ),
+    )
+    parser.add_argument(
+        "--build-code-index",
+        action="store_true",
+        help="(Re)constroi o indice de codigos de conta a partir dos arquivos.",
+    )
+    args = parser.parse_args(argv)
 
     zip_files = list_zip_files(args.input_dir, args.manifest)
     if not zip_files:
         print("Nenhum ZIP encontrado. Rode o download (1.1) antes.")
         return 1
 
-    extract_dirs = []
+    tasks: List[Tuple[Optional[str], str, str]] = []
     error_entries = []
-    for zip_path in zip_files:
-        if not os.path.exists(zip_path):
-            error_entries.append(
-                {
-                    "stage": "extract",
-                    "file": zip_path,
-                    "error": "arquivo_nao_encontrado",
-                }
-            )
-            continue
-        try:
-            extract_dirs.append(extract_zip(zip_path, args.extract_dir, args.overwrite))
-        except Exception as exc:
-            error_entries.append(
-                {"stage": "extract", "file": zip_path, "error": str(exc)}
-            )
+    if args.extract:
+        extract_dirs = []
+        for zip_path in zip_files:
+            if not os.path.exists(zip_path):
+                error_entries.append(
+                    {
+                        "stage": "extract",
+                        "file": zip_path,
+                        "error": "arquivo_nao_encontrado",
+                    }
+                )
+                continue
+            try:
+                extract_dirs.append(
+                    extract_zip(zip_path, args.extract_dir, args.overwrite)
+                )
+            except Exception as exc:
+                error_entries.append(
+                    {"stage": "extract", "file": zip_path, "error": str(exc)}
+                )
 
-    if not extract_dirs:
-        print("Nenhum ZIP valido para extrair.")
-        return 1
+        if not extract_dirs:
+            print("Nenhum ZIP valido para extrair.")
+            return 1
+
+        for file_path in iter_data_files(extract_dirs):
+            tasks.append((None, file_path, args.output_dir))
+    else:
+        valid_zips = 0
+        for zip_path in zip_files:
+            if not os.path.exists(zip_path):
+                error_entries.append(
+                    {
+                        "stage": "read_zip",
+                        "file": zip_path,
+                        "error": "arquivo_nao_encontrado",
+                    }
+                )
+                continue
+            try:
+                with zipfile.ZipFile(zip_path, "r") as zf:
+                    members = [info.filename for info in iter_zip_members(zf)]
+            except Exception as exc:
+                error_entries.append(
+                    {"stage": "read_zip", "file": zip_path, "error": str(exc)}
+                )
+                continue
+            tasks.extend((zip_path, member, args.output_dir) for member in members)
+            valid_zips += 1
+
+        if not valid_zips:
+            print("Nenhum ZIP valido para processar.")
+            return 1
 
     manifest_entries = []
-    for file_path in iter_data_files(extract_dirs):
-        entry = process_file(file_path, args.output_dir)
+    code_index = None
+    code_index_path = args.code_index
+    if args.build_code_index:
+        code_index_path = code_index_path or DEFAULT_CODE_INDEX
+        code_index = build_code_index(tasks, code_index_path)
+        print("Indice de contas salvo em:", code_index_path)
+    elif code_index_path:
+        code_index = load_code_index(code_index_path)
+
+    chunk_size = int(args.chunk_mb * 1024 * 1024)
+    results = run_tasks(tasks, args.jobs, chunk_size, args.engine, code_index)
+    for (archive, file_path, _), entry in zip(tasks, results):
+        label = file_path if archive is None else f"{archive}:{file_path}"
         manifest_entries.append(entry)
         status = entry.get("status")
         if status == "error":
             error_entries.append(
                 {
                     "stage": "process",
-                    "file": file_path,
+                    "file": label,
                     "error": entry.get("error", "erro_desconhecido"),
                 }
             )
-        print(f"{status}: {file_path}")
+        print(f"{status}: {label}")
+        if args.parquet and status == "processed":
+            try:
+                entry["parquet_file"] = write_parquet_copy(entry["output_file"])
+            except Exception as exc:
+                error_entries.append(
+                    {"stage": "parquet", "file": label, "error": str(exc)}
+                )
 
     os.makedirs(args.output_dir, exist_ok=True)
     manifest_path = os.path.join(args.output_dir, "process_manifest.json")
+    classifier_summary = functools.reduce(
+        merge_classifier_stats,
+        [e["classifier_cache"] for e in manifest_entries if "classifier_cache" in e],
+        {"hits": 0, "misses": 0, "size": 0, "hit_rate": 0.0},
+    )
+    code_index_entries = [
+        e["code_index_cache"] for e in manifest_entries if "code_index_cache" in e
+    ]
+    code_index_summary = (
+        functools.reduce(merge_classifier_stats, code_index_entries, {})
+        if code_index_entries
+        else None
+    )
     with open(manifest_path, "w", encoding="utf-8") as f:
         json.dump(
             {
                 "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
                 "input_dir": args.input_dir,
-                "extract_dir": args.extract_dir,
+                "extract_dir": args.extract_dir if args.extract else None,
                 "output_dir": args.output_dir,
+                "code_index": code_index_path if code_index else None,
                 "summary": {
                     "processed": sum(
                         1 for e in manifest_entries if e.get("status") == "processed"
@@ -424,6 +1163,8 @@ def main() -> int:
                     "error": sum(
                         1 for e in manifest_entries if e.get("status") == "error"
                     ),
+                    "classifier_cache": classifier_summary,
+                    "code_index_cache": code_index_summary,
                 },
                 "errors": error_entries,
                 "entries": manifest_entries,
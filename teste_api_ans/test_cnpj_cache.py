@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+
+import cnpj_cache
+
+VALID_CNPJS = ["19541931000125", "11444777000161", "11222333000181"]
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    cnpj_cache.clear_cache()
+    yield
+    cnpj_cache.clear_cache()
+
+
+def test_validation_rules():
+    """Testa digitos verificadores, mascara, tamanho e digitos repetidos"""
+    assert all(cnpj_cache.is_valid_cnpj(value) for value in VALID_CNPJS)
+    assert cnpj_cache.is_valid_cnpj("11.222.333/0001-81")
+    assert not cnpj_cache.is_valid_cnpj("11222333000182")
+    assert not cnpj_cache.is_valid_cnpj("1122233300018")
+    assert not cnpj_cache.is_valid_cnpj("11111111111111")
+    assert not cnpj_cache.is_valid_cnpj("")
+    assert cnpj_cache.normalize_cnpj(None) == ""
+
+
+def test_distinct_values_are_computed_once():
+    """Testa que cada CNPJ distinto passa uma unica vez pelo cache"""
+    values = pd.Series(
+        ["19.541.931/0001-25", "11444777000161", None, "x"] * 250, dtype=object
+    )
+    normalized = cnpj_cache.normalize_cnpjs(values)
+    assert list(normalized[:4]) == ["19541931000125", "11444777000161", "", ""]
+    assert len(normalized) == 1000
+    assert cnpj_cache.cache_info()["normalize"].misses == 3
+
+    valid = cnpj_cache.validate_cnpjs(values)
+    assert list(valid[:4]) == [True, True, False, False]
+    assert cnpj_cache.cache_info()["validate"].misses == 3
+    assert cnpj_cache.distinct_ratio(values) == pytest.approx(4 / 1000)
+
+
+def test_map_distinct_keeps_na_value():
+    """Testa que nulos recebem na_value mesmo com resultado textual"""
+    values = pd.Series(["1", None, "1"], dtype=object)
+    mapped = cnpj_cache.map_distinct(values, lambda u: [v * 2 for v in u], None)
+    assert list(mapped) == ["11", None, "11"]
+
+
+def test_build_cnpj_index():
+    """Testa o indice CNPJ normalizado -> posicoes das linhas"""
+    values = pd.Series(
+        ["19.541.931/0001-25", None, "19541931000125", "11444777000161", ""],
+        dtype=object,
+    )
+    index = cnpj_cache.build_cnpj_index(values)
+    assert index["19541931000125"].tolist() == [0, 2]
+    assert index["11444777000161"].tolist() == [3]
+    assert index[""].tolist() == [1, 4]
+    assert cnpj_cache.build_cnpj_index(pd.Series([], dtype=object)) == {}
@@ -0,0 +1,241 @@
+import csv
+import os
+
+import pytest
+
+import consolidate_ans_expenses
+import process_ans_files
+
+NORMALIZED_HEADER = (
+    "cnpj,reg_ans,razao_social,valor_despesas,descricao,"
+    "competencia_raw,ano,trimestre,source_file\n"
+)
+NORMALIZED_ROWS = [
+    "12345678000190,123456,Operadora A,1234.50,Despesas com eventos,2024-01,2024,1,a\n",
+    ",654321,,-0.00,Despesas com eventos,2024-05,2024,2,a\n",
+    "11111111000111,,Operadora  b,,Despesas com eventos,,,,a\n",
+    '22222222000122,,"Operadora, C",nan,"Despesas\nmulti",2024,2024,,a\n',
+    "22222222000122,,Operadora D,7000.00,Despesas com eventos,2023-12,2023,4,a\n",
+]
+
+
+def consolidate_lists(input_dir):
+    rows, issue_counts = consolidate_ans_expenses.consolidate(str(input_dir))
+    return list(rows.rows()), list(rows.issue_rows()), issue_counts
+
+
+@pytest.fixture
+def normalized_dir(tmp_path, monkeypatch):
+    operadoras = tmp_path / "operadoras.csv"
+    operadoras.write_text(
+        "Registro_Operadora;CNPJ;Razao_Social\n"
+        "654321;33.333.333/0001-33;Operadora Mapeada\n",
+        encoding="utf-8",
+    )
+    monkeypatch.setattr(
+        consolidate_ans_expenses, "OPERADORAS_LOCAL_PATH", str(operadoras)
+    )
+    monkeypatch.setenv("ANS_OFFLINE", "1")
+    input_dir = tmp_path / "normalized"
+    input_dir.mkdir()
+    (input_dir / "1T2024.csv").write_text(
+        NORMALIZED_HEADER + "".join(NORMALIZED_ROWS * 3), encoding="utf-8"
+    )
+    return input_dir
+
+
+def test_consolidate_reads_parquet_like_csv(normalized_dir):
+    """Testa que o consolidado lido do Parquet e identico ao lido do CSV"""
+    pytest.importorskip("pyarrow")
+    from_csv = consolidate_lists(normalized_dir)
+    process_ans_files.write_parquet_copy(str(normalized_dir / "1T2024.csv"))
+    from_parquet = consolidate_lists(normalized_dir)
+    assert from_parquet == from_csv
+    assert from_csv[0][1] == [
+        "33333333000133",
+        "OPERADORA MAPEADA",
+        "2",
+        "2024",
+        "-0.00",
+    ]
+
+
+def test_consolidate_ignores_stale_parquet(normalized_dir):
+    """Testa que um Parquet mais antigo que o CSV nao e usado"""
+    pytest.importorskip("pyarrow")
+    csv_path = normalized_dir / "1T2024.csv"
+    parquet_path = process_ans_files.write_parquet_copy(str(csv_path))
+    csv_path.write_text(NORMALIZED_HEADER + NORMALIZED_ROWS[0], encoding="utf-8")
+    stat = csv_path.stat()
+    os.utime(parquet_path, (stat.st_atime, stat.st_mtime - 10))
+    rows, _ = consolidate_ans_expenses.consolidate(str(normalized_dir))
+    assert len(rows) == 1
+
+
+def test_main_writes_consolidated_parquet(normalized_dir, tmp_path):
+    """Testa que --parquet grava o consolidado tipado"""
+    pq = pytest.importorskip("pyarrow.parquet")
+    output_dir = tmp_path / "out"
+    argv = [
+        "--input-dir",
+        str(normalized_dir),
+        "--output-dir",
+        str(output_dir),
+        "--parquet",
+    ]
+    assert consolidate_ans_expenses.main(argv) == 0
+    table = pq.read_table(output_dir / "consolidado_despesas.parquet")
+    assert table.schema.field("Trimestre").type == "int8"
+    with open(output_dir / "consolidado_despesas.csv", encoding="utf-8") as f:
+        expected = list(csv.DictReader(f))
+    rows = table.to_pylist()
+    assert [r["CNPJ"] or "" for r in rows] == [r["CNPJ"] for r in expected]
+    assert [
+        "" if r["ValorDespesas"] is None else f"{r['ValorDespesas']:.2f}" for r in rows
+    ] == [r["ValorDespesas"] for r in expected]
+
+
+def test_streaming_output_matches_in_memory(normalized_dir, tmp_path):
+    """Testa que a consolidacao em streaming grava o mesmo que consolidate()"""
+    (normalized_dir / "2T2024.csv").write_text(
+        NORMALIZED_HEADER
+        + "12345678000190,123456,Operadora A2,10.00,Despesas,2024-04,2024,2,b\n",
+        encoding="utf-8",
+    )
+    rows, issue_rows, issue_counts = consolidate_lists(normalized_dir)
+    output_csv = tmp_path / "out" / "consolidado.csv"
+    issues_csv = tmp_path / "out" / "issues.csv"
+    written, streamed_counts = consolidate_ans_expenses.write_consolidated(
+        str(normalized_dir), str(output_csv), str(issues_csv)
+    )
+    assert written == len(rows)
+    assert streamed_counts == issue_counts
+    assert issue_counts["cnpj_com_razoes_diferentes"] == 3 * 3 + 1
+    with open(output_csv, encoding="utf-8", newline="") as f:
+        assert list(csv.reader(f))[1:] == rows
+    with open(issues_csv, encoding="utf-8", newline="") as f:
+        assert list(csv.reader(f))[1:] == issue_rows
+    assert not os.path.exists(str(output_csv) + ".tmp")
+
+
+def test_streaming_without_rows_writes_nothing(normalized_dir, tmp_path):
+    """Testa que sem linhas nenhum arquivo de saida e criado"""
+    empty_dir = tmp_path / "vazio"
+    empty_dir.mkdir()
+    output_csv = tmp_path / "out" / "consolidado.csv"
+    written, counts = consolidate_ans_expenses.write_consolidated(
+        str(empty_dir), str(output_csv), str(tmp_path / "out" / "issues.csv")
+    )
+    assert (written, counts) == (0, {})
+    assert os.listdir(tmp_path / "out") == []
+
+
+def test_compact_rows_round_trip():
+    """Testa que CompactRows devolve exatamente as linhas e issues recebidas"""
+    compact = consolidate_ans_expenses.CompactRows()
+    entries = [
+        (["1", "A", "1", "2024", "10.50"], [], "a.csv"),
+        (["", "", "", "", ""], ["cnpj_ausente", "valor_invalido"], "a.csv"),
+        (["1", "A", "2", "2024", "-0.00"], ["valor_nao_positivo"], "b.csv"),
+        (["2", "B", "", "2023", "nan"], ["trimestre_invalido"], "b.csv"),
+        (["3", "C", "4", "2023", "123456789.12"], [], "b.csv"),
+    ]
+    for base_row, issues, source in entries:
+        compact.append(base_row, issues, source)
+    compact.flag_cnpjs({compact.intern("2")}, "cnpj_com_razoes_diferentes")
+    assert list(compact.rows()) == [row for row, _, _ in entries]
+    assert [row[5:] for row in compact.issue_rows()] == [
+        ["cnpj_ausente,valor_invalido", "a.csv"],
+        ["valor_nao_positivo", "b.csv"],
+        ["cnpj_com_razoes_diferentes,trimestre_invalido", "b.csv"],
+    ]
+    assert compact.issue_counts()["cnpj_com_razoes_diferentes"] == 1
+    assert len(compact.strings) < 5 * 6
+
+
+def test_incremental_reuses_unchanged_files(normalized_dir, tmp_path):
+    """Testa que o estado incremental so reprocessa arquivos novos/alterados"""
+    out = tmp_path / "out"
+    state_path = str(out / "state.json")
+
+    def run(full_rebuild=False):
+        return consolidate_ans_expenses.write_consolidated_incremental(
+            str(normalized_dir),
+            str(out / "consolidado.csv"),
+            str(out / "issues.csv"),
+            state_path,
+            full_rebuild,
+        )
+
+    def expected():
+        result = consolidate_ans_expenses.write_consolidated(
+            str(normalized_dir), str(tmp_path / "ref.csv"), str(tmp_path / "ref_i.csv")
+        )
+        return result, (tmp_path / "ref.csv").read_bytes()
+
+    _, _, stats = run()
+    assert stats["reprocessed"] == 1 and stats["reused"] == 0
+
+    new_file = normalized_dir / "2T2024.csv"
+    new_file.write_text(
+        NORMALIZED_HEADER
+        + "12345678000190,123456,Operadora A2,10.00,Despesas,2024-04,2024,2,b\n",
+        encoding="utf-8",
+    )
+    written, counts, stats = run()
+    assert (stats["reprocessed"], stats["reused"]) == (1, 1)
+    (ref_written, ref_counts), ref_bytes = expected()
+    assert (written, counts) == (ref_written, ref_counts)
+    assert counts["cnpj_com_razoes_diferentes"] == 3 * 3 + 1
+    assert (out / "consolidado.csv").read_bytes() == ref_bytes
+
+    os.utime(new_file, ns=(0, new_file.stat().st_mtime_ns + 10**9))
+    _, _, stats = run()
+    assert (stats["reprocessed"], stats["reused"]) == (0, 2)
+
+    new_file.write_text(NORMALIZED_HEADER, encoding="utf-8")
+    written, counts, stats = run()
+    assert (stats["reprocessed"], stats["reused"]) == (1, 1)
+    assert counts["cnpj_com_razoes_diferentes"] == 3 * 2
+    assert (out / "consolidado.csv").read_bytes() == expected()[1]
+
+    new_file.unlink()
+    _, _, stats = run(full_rebuild=True)
+    assert (stats["reprocessed"], stats["reused"], stats["removed"]) == (1, 0, 1)
+
+
+def test_aggregate_sums_per_cnpj_quarter(normalized_dir, tmp_path):
+    """Testa a agregacao por (CNPJ, Trimestre, Ano) contra a soma das linhas"""
+    detailed, _ = consolidate_ans_expenses.write_consolidated(
+        str(normalized_dir), str(tmp_path / "linhas.csv"), str(tmp_path / "i1.csv")
+    )
+    aggregated, counts = consolidate_ans_expenses.write_consolidated(
+        str(normalized_dir),
+        str(tmp_path / "agregado.csv"),
+        str(tmp_path / "i2.csv"),
+        aggregate=True,
+    )
+    assert (tmp_path / "i1.csv").read_bytes() == (tmp_path / "i2.csv").read_bytes()
+    with open(tmp_path / "linhas.csv", encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    with open(tmp_path / "agregado.csv", encoding="utf-8", newline="") as f:
+        agg_rows = list(csv.DictReader(f))
+    keys = [(r["CNPJ"], r["Trimestre"], r["Ano"]) for r in agg_rows]
+    assert len(keys) == len(set(keys)) == aggregated < detailed
+    by_key = {(r["CNPJ"], r["Trimestre"], r["Ano"]): r for r in agg_rows}
+    assert by_key[("12345678000190", "1", "2024")] == {
+        "CNPJ": "12345678000190",
+        "RazaoSocial": "OPERADORA A",
+        "Trimestre": "1",
+        "Ano": "2024",
+        "ValorDespesas": "3703.50",
+    }
+    assert by_key[("11111111000111", "", "")]["ValorDespesas"] == ""
+    for key, agg in by_key.items():
+        values = [
+            float(r["ValorDespesas"])
+            for r in rows
+            if (r["CNPJ"], r["Trimestre"], r["Ano"]) == key and r["ValorDespesas"]
+        ]
+        if values and agg["ValorDespesas"] != "nan":
+            assert float(agg["ValorDespesas"]) == pytest.approx(sum(values))
@@ -0,0 +1,262 @@
+import functools
+import json
+import os
+import threading
+import time
+from http.server import (
+    BaseHTTPRequestHandler,
+    SimpleHTTPRequestHandler,
+    ThreadingHTTPServer,
+)
+
+import pytest
+
+import download_ans_demos
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def ans_server(tmp_path):
+    """Servidor HTTP local com a estrutura de pastas do FTP da ANS."""
+    root = tmp_path / "ftp"
+    for year in (2023, 2024):
+        year_dir = root / str(year)
+        year_dir.mkdir(parents=True)
+        for quarter in range(1, 5):
+            content = f"PK-fake-{quarter}T{year}".encode() * 1024
+            (year_dir / f"{quarter}T{year}.zip").write_bytes(content)
+    handler = functools.partial(QuietHandler, directory=str(root))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/", root
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def run_download(base_url, output_dir, *extra):
+    argv = ["--base-url", base_url, "--output-dir", str(output_dir), *extra]
+    assert download_ans_demos.main(argv) == 0
+    with open(os.path.join(output_dir, "manifest.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_gather_quarter_entries(ans_server):
+    """Testa a descoberta de trimestres no servidor local"""
+    base_url, _ = ans_server
+    quarter_map = download_ans_demos.gather_quarter_entries(base_url, 5)
+    assert len(quarter_map) == 8
+    assert (2024, 4) in quarter_map
+
+
+def test_workers_keep_manifest_deterministic(ans_server, tmp_path):
+    """Testa que o download paralelo gera o mesmo manifest do sequencial"""
+    base_url, root = ans_server
+    sequential = run_download(base_url, tmp_path / "seq", "--quarters", "5")
+    parallel = run_download(
+        base_url, tmp_path / "par", "--quarters", "5", "--workers", "4", "--per-host", "2"
+    )
+    assert parallel["summary"] == sequential["summary"]
+    assert parallel["summary"]["downloaded"] == 5
+    assert [e["url"] for e in parallel["entries"]] == [
+        e["url"] for e in sequential["entries"]
+    ]
+    for entry in parallel["entries"]:
+        name = os.path.basename(entry["local_path"])
+        year = name[2:6]
+        with open(entry["local_path"], "rb") as f:
+            assert f.read() == (root / year / name).read_bytes()
+
+
+def test_host_limiter_bounds_concurrency(monkeypatch):
+    """Testa o limite de downloads simultaneos por host"""
+    active = {"now": 0, "max": 0}
+    lock = threading.Lock()
+    release = threading.Event()
+
+    def fake_download(url, dest, timeout, overwrite, retries, backoff, **kwargs):
+        with lock:
+            active["now"] += 1
+            active["max"] = max(active["max"], active["now"])
+        release.wait(0.05)
+        with lock:
+            active["now"] -= 1
+        return "downloaded", 1, 1, None, {}
+
+    monkeypatch.setattr(download_ans_demos, "download_file", fake_download)
+    jobs = [("1T2024", f"http://host-a/{i}.zip", f"/tmp/{i}.zip") for i in range(8)]
+    entries = download_ans_demos.download_all(
+        jobs, 5, False, 1, 0, False, workers=8, per_host=2
+    )
+    assert active["max"] == 2
+    assert [e["url"] for e in entries] == [url for _, url, _ in jobs]
+
+    active["max"] = 0
+    download_ans_demos.download_all(jobs, 5, False, 1, 0, False, workers=8)
+    assert active["max"] == download_ans_demos.DEFAULT_PER_HOST
+    with pytest.raises(SystemExit):
+        download_ans_demos.main(["--per-host", "0"])
+
+
+def test_crawl_links_matches_recursive_collect(ans_server):
+    """Testa que o crawler paralelo encontra os mesmos arquivos da recursao"""
+    base_url, root = ans_server
+    for quarter in range(1, 5):
+        sub_dir = root / "2025" / f"{quarter}T" / "dados"
+        sub_dir.mkdir(parents=True)
+        (sub_dir / f"{quarter}T2025.zip").write_bytes(b"PK")
+        (sub_dir.parent / "leiame.txt").write_text("ok")
+
+    sequential = download_ans_demos.gather_quarter_entries(base_url, 5)
+    parallel = download_ans_demos.gather_quarter_entries(base_url, 5, workers=8)
+    assert parallel == sequential
+    assert (2025, 3) in parallel
+
+    entries = [e for e in parallel[(2025, 3)] if download_ans_demos.is_dir_link(e)]
+    listings = download_ans_demos.crawl_links(entries, 5, 2, 8)
+    for entry in entries:
+        expected = download_ans_demos.collect_files(entry, 5, [".zip", ".txt"], 2)
+        found = download_ans_demos.collect_files(
+            entry, 5, [".zip", ".txt"], 2, listings=listings
+        )
+        assert found == expected
+        assert len(found) == 2
+
+
+class ValidatorHandler(BaseHTTPRequestHandler):
+    """Serve um unico arquivo com ETag e Range; trunca a primeira resposta."""
+
+    payload = b""
+    etag = '"v1"'
+    truncate_first = False
+    requests = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        cls = type(self)
+        cls.requests.append(dict(self.headers))
+        if self.headers.get("If-None-Match") == cls.etag:
+            self.send_response(304)
+            self.send_header("ETag", cls.etag)
+            self.end_headers()
+            return
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range") == cls.etag:
+            start = int(range_header.split("=")[1].rstrip("-"))
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {start}-{len(cls.payload) - 1}/{len(cls.payload)}"
+            )
+        else:
+            self.send_response(200)
+        body = cls.payload[start:]
+        self.send_header("ETag", cls.etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if cls.truncate_first:
+            cls.truncate_first = False
+            self.wfile.write(body[: len(body) // 3])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def validator_server():
+    handler = type(
+        "Handler",
+        (ValidatorHandler,),
+        {"payload": os.urandom(300_000), "requests": [], "truncate_first": False},
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/1T2024.zip", handler
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_download_resumes_truncated_transfer(validator_server, tmp_path):
+    """Testa a retomada com Range apos uma transferencia truncada"""
+    url, handler = validator_server
+    handler.truncate_first = True
+    dest = str(tmp_path / "1T2024.zip")
+    status, size, attempts, error, validators = download_ans_demos.download_file(
+        url, dest, 5, False, 3, 0
+    )
+    assert (status, attempts, error) == ("downloaded", 2, None)
+    assert validators["etag"] == handler.etag
+    assert handler.requests[1]["Range"] == f"bytes={len(handler.payload) // 3}-"
+    assert size == len(handler.payload) - len(handler.payload) // 3
+    with open(dest, "rb") as f:
+        assert f.read() == handler.payload
+    assert not os.path.exists(dest + ".part")
+
+
+def test_refresh_sends_conditional_request(validator_server, tmp_path):
+    """Testa que --refresh usa o ETag do manifest e nao baixa arquivo inalterado"""
+    url, handler = validator_server
+    dest = str(tmp_path / "1T2024.zip")
+    first = download_ans_demos.download_entry("1T2024", url, dest, 5, False, 3, 0, False)
+    assert first["status"] == "downloaded"
+    assert first["etag"] == handler.etag
+
+    skipped = download_ans_demos.download_entry(
+        "1T2024", url, dest, 5, False, 3, 0, False, previous=first
+    )
+    assert skipped["status"] == "skipped"
+    assert skipped["etag"] == handler.etag
+
+    refreshed = download_ans_demos.download_entry(
+        "1T2024", url, dest, 5, False, 3, 0, False, refresh=True, previous=skipped
+    )
+    assert refreshed["status"] == "not-modified"
+    assert refreshed["bytes"] == 0
+    assert refreshed["size"] == len(handler.payload)
+    assert handler.requests[-1]["If-None-Match"] == handler.etag
+    assert len(handler.requests) == 2
+
+
+def test_listing_cache_serves_closed_years(ans_server, tmp_path):
+    """Testa que anos fechados saem do cache e --refresh-listings o ignora"""
+    base_url, _ = ans_server
+    first = run_download(base_url, tmp_path, "--dry-run")
+    assert first["summary"]["listing_cache"] == {
+        "hits": 0,
+        "misses": 3,
+        "revalidated": 0,
+    }
+    second = run_download(base_url, tmp_path, "--dry-run")
+    assert second["summary"]["listing_cache"]["hits"] == 2
+    assert second["summary"]["listing_cache"]["misses"] == 1
+    assert second["entries"] == first["entries"]
+    forced = run_download(base_url, tmp_path, "--dry-run", "--refresh-listings")
+    assert forced["summary"]["listing_cache"]["hits"] == 0
+
+
+def test_listing_cache_closed_year_grace():
+    """Testa a regra de ano fechado (carencia apos o fim do ano)"""
+    cache = download_ans_demos.ListingCache(None, ttl=60)
+    url = "http://ans/demonstracoes_contabeis/2023/"
+    march = time.mktime((2024, 3, 1, 0, 0, 0, 0, 0, -1))
+    august = time.mktime((2024, 8, 1, 0, 0, 0, 0, 0, -1))
+    assert not cache.is_closed(url, {"fetched_at": march})
+    assert cache.is_closed(url, {"fetched_at": august})
+    assert not cache.is_closed("http://ans/demonstracoes_contabeis/", {"fetched_at": august})
+
+    cache.clock = lambda: march + 30
+    assert cache.is_fresh(url, {"fetched_at": march})
+    cache.clock = lambda: march + 120
+    assert not cache.is_fresh(url, {"fetched_at": march})
@@ -0,0 +1,177 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import operadoras_lookup
+
+CADOP_HEADER = "REGISTRO_OPERADORA;CNPJ;Razao_Social;Modalidade;UF\n"
+CADOP_ROWS = [
+    "419761;19541931000125;18 DE JULHO ADMINISTRADORA;Administradora;MG\n",
+    "421545;02869997000153;2B ODONTOLOGIA;Odontologia de Grupo;SP\n",
+    "421546;02869997000153;2B ODONTOLOGIA FILIAL;Odontologia de Grupo;SP\n",
+    ";;SEM REGISTRO;;\n",
+]
+
+
+@pytest.fixture
+def cadop(tmp_path):
+    path = tmp_path / "operadoras_ativas.csv"
+    path.write_text(CADOP_HEADER + "".join(CADOP_ROWS), encoding="utf-8")
+    return path
+
+
+def test_indexes_by_registro_and_cnpj(cadop):
+    """Testa os indices por registro ANS e por CNPJ (ultima linha vence)"""
+    lookup = operadoras_lookup.parse_cadop(str(cadop))
+    assert len(lookup) == 4
+    assert lookup.get_by_registro("419761")["UF"] == "MG"
+    assert lookup.get_by_cnpj("02.869.997/0001-53")["REGISTRO_OPERADORA"] == "421546"
+    assert lookup.get_by_registro("000000") is None
+    frame = lookup.to_frame(sorted(lookup.by_cnpj.values()))
+    assert list(frame["CNPJ"]) == ["19541931000125", "02869997000153"]
+
+
+def test_latin1_fallback(tmp_path):
+    """Testa a leitura de um CADOP gravado em latin-1"""
+    path = tmp_path / "cadop.csv"
+    path.write_bytes((CADOP_HEADER + "1;1;SAÚDE;Médica;SP\n").encode("latin-1"))
+    lookup = operadoras_lookup.parse_cadop(str(path))
+    assert lookup.get_by_registro("1")["Razao_Social"] == "SAÚDE"
+
+
+def test_snapshot_is_reused_until_source_changes(cadop, monkeypatch):
+    """Testa que o snapshot binario evita reparsear e e invalidado pelo conteudo"""
+    cold = operadoras_lookup.load_lookup(str(cadop))
+    snapshot = str(cadop) + operadoras_lookup.SNAPSHOT_SUFFIX
+    assert os.path.exists(snapshot)
+
+    parse_calls = []
+    original_parse = operadoras_lookup.parse_cadop
+    monkeypatch.setattr(
+        operadoras_lookup,
+        "parse_cadop",
+        lambda path: parse_calls.append(path) or original_parse(path),
+    )
+    warm = operadoras_lookup.load_lookup(str(cadop))
+    assert parse_calls == []
+    assert warm.records == cold.records
+    assert warm.by_cnpj == cold.by_cnpj
+
+    stat = cadop.stat()
+    os.utime(cadop, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    operadoras_lookup.load_lookup(str(cadop))
+    assert parse_calls == []
+
+    cadop.write_text(CADOP_HEADER + CADOP_ROWS[0], encoding="utf-8")
+    changed = operadoras_lookup.load_lookup(str(cadop))
+    assert len(parse_calls) == 1
+    assert len(changed) == 1
+
+
+class CadopHandler(BaseHTTPRequestHandler):
+    """Serve o CADOP com ETag/Last-Modified e responde 304 se nao mudou."""
+
+    payload = b""
+    etag = '"v1"'
+    last_modified = "Mon, 06 Jan 2025 10:00:00 GMT"
+    requests = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        cls = type(self)
+        cls.requests.append(dict(self.headers))
+        if self.headers.get("If-None-Match") == cls.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", cls.etag)
+        self.send_header("Last-Modified", cls.last_modified)
+        self.send_header("Content-Length", str(len(cls.payload)))
+        self.end_headers()
+        self.wfile.write(cls.payload)
+
+
+@pytest.fixture
+def cadop_server():
+    handler = type(
+        "Handler",
+        (CadopHandler,),
+        {
+            "payload": (CADOP_HEADER + "".join(CADOP_ROWS)).encode("utf-8"),
+            "requests": [],
+        },
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/Relatorio_cadop.csv"
+    try:
+        yield url, handler, server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_fetch_cadop_revalidates_with_validators(cadop_server, tmp_path):
+    """Testa download em disco, cache por max_age e revalidacao com 304"""
+    url, handler, _ = cadop_server
+    dest = str(tmp_path / "operadoras" / "operadoras_ativas.csv")
+    now = [1000.0]
+
+    def clock():
+        return now[0]
+
+    assert operadoras_lookup.fetch_cadop(url, dest, offline=False, clock=clock) == (
+        "downloaded"
+    )
+    with open(dest, "rb") as f:
+        assert f.read() == handler.payload
+    assert len(handler.requests) == 1
+
+    now[0] += 60
+    assert operadoras_lookup.fetch_cadop(url, dest, offline=False, clock=clock) == (
+        "cached"
+    )
+    assert len(handler.requests) == 1
+
+    now[0] += operadoras_lookup.CADOP_MAX_AGE
+    mtime = os.stat(dest).st_mtime_ns
+    assert operadoras_lookup.fetch_cadop(url, dest, offline=False, clock=clock) == (
+        "not-modified"
+    )
+    assert handler.requests[-1]["If-None-Match"] == '"v1"'
+    assert handler.requests[-1]["If-Modified-Since"] == handler.last_modified
+    assert os.stat(dest).st_mtime_ns == mtime
+
+    handler.payload = (CADOP_HEADER + CADOP_ROWS[0]).encode("utf-8")
+    handler.etag = '"v2"'
+    status = operadoras_lookup.fetch_cadop(
+        url, dest, offline=False, refresh=True, clock=clock
+    )
+    assert status == "downloaded"
+    assert len(operadoras_lookup.load_lookup(dest)) == 1
+    assert not os.path.exists(dest + ".part")
+
+
+def test_fetch_cadop_works_offline_from_cache(cadop_server, tmp_path, monkeypatch):
+    """Testa o uso da copia local sem rede e com o servidor fora do ar"""
+    url, handler, server = cadop_server
+    dest = str(tmp_path / "operadoras_ativas.csv")
+    with pytest.raises(RuntimeError):
+        operadoras_lookup.fetch_cadop(url, dest, offline=True)
+
+    operadoras_lookup.fetch_cadop(url, dest, offline=False)
+    monkeypatch.setenv("ANS_OFFLINE", "1")
+    assert operadoras_lookup.fetch_cadop(url, dest, refresh=True) == "offline"
+    assert len(handler.requests) == 1
+
+    server.shutdown()
+    server.server_close()
+    status = operadoras_lookup.fetch_cadop(url, dest, offline=False, refresh=True)
+    assert status == "stale"
+    assert len(operadoras_lookup.load_lookup(dest)) == len(CADOP_ROWS)
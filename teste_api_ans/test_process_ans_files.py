@@ -0,0 +1,400 @@
+import csv
+import io
+import json
+import os
+import zipfile
+
+import pytest
+
+import process_ans_files
+
+CSV_HEADER = (
+    "DATA;REG_ANS;CD_CONTA_CONTABIL;DESCRICAO;VL_SALDO_INICIAL;VL_SALDO_FINAL\n"
+)
+CSV_ROWS = [
+    '2024-01-01;"123456";"411111";"Despesas com Eventos / Sinistros";"10,00";"1.234,56"\n',
+    '2024-01-01;"123456";"311111";"Contraprestações Efetivas";"5,00";"99,00"\n',
+    '2024-01-01;"654321";"411121";"DESPESAS COM EVENTOS/SINISTROS - Judicial";"0";"(12,30)"\n',
+    '2024-04-01;"654321";"41";"Despesa   com Sinistros";"0";"7.000"\n',
+]
+
+
+def build_zip(path, members):
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, content in members.items():
+            zf.writestr(name, content)
+
+
+@pytest.fixture
+def ans_input(tmp_path):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    content = CSV_HEADER + "".join(CSV_ROWS * 50)
+    build_zip(
+        input_dir / "1T2024.zip",
+        {"1T2024.csv": content.encode("utf-8-sig"), "leiame.pdf": b"%PDF"},
+    )
+    build_zip(input_dir / "2T2024.zip", {"dados/2T2024.csv": content.encode("utf-8")})
+    return input_dir
+
+
+def run_process(input_dir, output_dir, *extra):
+    argv = [
+        "--input-dir",
+        str(input_dir),
+        "--output-dir",
+        str(output_dir),
+        "--manifest",
+        "",
+        *extra,
+    ]
+    assert process_ans_files.main(argv) == 0
+    normalized = output_dir / "normalized"
+    return {
+        name: (normalized / name).read_bytes()
+        for name in sorted(os.listdir(normalized))
+    }
+
+
+def test_streaming_matches_extracted_output(ans_input, tmp_path):
+    """Testa que o processamento direto do ZIP gera os mesmos CSVs da extracao"""
+    extract_dir = tmp_path / "extracted"
+    extracted = run_process(
+        ans_input,
+        tmp_path / "out_extract",
+        "--extract",
+        "--extract-dir",
+        str(extract_dir),
+    )
+    streamed = run_process(ans_input, tmp_path / "out_stream")
+    assert streamed == extracted
+    assert sorted(streamed) == ["1T2024.csv", "2T2024.csv"]
+    assert streamed["1T2024.csv"].count(b"\n") == 1 + 3 * 50
+    assert extract_dir.exists()
+
+
+def test_streaming_does_not_extract(ans_input, tmp_path):
+    """Testa que o modo padrao nao grava copia extraida"""
+    extract_dir = tmp_path / "extracted"
+    run_process(ans_input, tmp_path / "out", "--extract-dir", str(extract_dir))
+    assert not extract_dir.exists()
+
+
+def test_process_csv_file_from_zip_stream(ans_input, tmp_path):
+    """Testa a leitura de um membro do ZIP sem extrair"""
+    entry = {}
+    output_path = str(tmp_path / "out.csv")
+    with zipfile.ZipFile(ans_input / "1T2024.zip") as zf:
+        with zf.open("1T2024.csv") as member:
+            count = process_ans_files.process_csv_file(
+                "1T2024.csv", output_path, entry, stream=member
+            )
+    assert count == 150
+    assert entry["columns"]["descricao"] == "DESCRICAO"
+    with open(output_path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert lines[1] == (
+        ",123456,,1234.56,Despesas com Eventos / Sinistros,2024-01-01,2024,1,1T2024.csv"
+    )
+
+
+def test_jobs_keep_manifest_order(ans_input, tmp_path):
+    """Testa que --jobs gera os mesmos arquivos e manifest na mesma ordem"""
+    serial = run_process(ans_input, tmp_path / "serial")
+    parallel = run_process(ans_input, tmp_path / "parallel", "--jobs", "2")
+    assert parallel == serial
+    manifests = []
+    for name in ("serial", "parallel"):
+        with open(tmp_path / name / "process_manifest.json", encoding="utf-8") as f:
+            payload = json.load(f)
+        manifests.append(
+            [
+                (e["archive"], e["source_file"], e["rows_written"])
+                for e in payload["entries"]
+            ]
+        )
+    assert manifests[0] == manifests[1]
+    assert [entry[1] for entry in manifests[0]] == ["1T2024.csv", "dados/2T2024.csv"]
+
+
+def test_iter_record_chunks_respects_quotes():
+    """Testa que os blocos so terminam em fim de registro fora de aspas"""
+    data = b'a;"linha\nquebrada";1\nb;"x";2\nc;"multi\n\nlinha";3\n'
+    chunks = list(process_ans_files.iter_record_chunks(io.BytesIO(data), 4))
+    assert b"".join(chunks) == data
+    assert chunks[0] == b'a;"linha\nquebrada";1\n'
+    for chunk in chunks:
+        assert chunk.endswith(b"\n")
+        assert chunk.count(b'"') % 2 == 0
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_chunked_matches_streaming(ans_input, tmp_path, jobs):
+    """Testa que o modo em blocos gera a mesma saida, na mesma ordem"""
+    streamed = run_process(ans_input, tmp_path / "stream")
+    chunked = run_process(
+        ans_input, tmp_path / "chunked", "--chunk-mb", "0.001", "--jobs", jobs
+    )
+    assert chunked == streamed
+    with open(tmp_path / "chunked" / "process_manifest.json", encoding="utf-8") as f:
+        payload = json.load(f)
+    assert all(entry["chunks"] > 1 for entry in payload["entries"])
+
+
+TRICKY_ROWS = [
+    '"01/2024";" 12.345.678/0001-90 ";"DESPESAS COM EVENTOS";"R$ 1.234,5";" Operadora  A "\n',
+    '"2024-05";"";"despesa c/ sinistro";"(1,234.56)";"B"\n',
+    '"2023.12";"x";"Despesas com eventos";"";"C"\n',
+    '"sem data";"1";"Despesas com eventos";"abc";"D"\n',
+    '"2024";"2";"Despesas com eventos";"1e3";"E"\n',
+    '"2024-13";"3";"Despesas com eventos";"-0,004";"F"\n',
+    '"202402";"4";"Despesas com eventos";"1_000";"G"\n',
+    '"2024-02";"5";"Receitas";"10";"H"\n',
+    '"2024-02";"6";"Despesas com ""eventos""\nmulti";"nan";"I"\n',
+    '"2024-02";"7";"Despesas com eventos";"()";"J";"extra"\n',
+    '"2024-02";"8";"Despesas com eventos"\n',
+]
+
+
+@pytest.mark.parametrize(
+    "header",
+    [
+        "COMPETENCIA;CNPJ;DESCRICAO;VALOR;RAZAO_SOCIAL\n",
+        "COMPETENCIA;CNPJ;HISTORICO;VALOR;RAZAO_SOCIAL\n",
+    ],
+)
+def test_vectorized_engine_parity(tmp_path, header):
+    """Testa que o engine vetorizado gera CSV identico ao engine python"""
+    source = tmp_path / "4T2024.csv"
+    source.write_bytes((header + "".join(TRICKY_ROWS * 3)).encode("utf-8"))
+    outputs = []
+    for engine in ("python", "vectorized"):
+        output_path = str(tmp_path / f"{engine}.csv")
+        entry = process_ans_files.process_file(
+            str(source), str(tmp_path), engine=engine
+        )
+        os.replace(entry["output_file"], output_path)
+        assert entry["status"] == "processed", entry.get("error")
+        with open(output_path, "rb") as f:
+            outputs.append(f.read())
+    assert outputs[0] == outputs[1]
+    assert outputs[0].count(b"\r\n") > 10
+
+
+def test_vectorized_engine_small_batches(ans_input, tmp_path, monkeypatch):
+    """Testa o engine vetorizado lendo o ZIP em varios lotes"""
+    monkeypatch.setattr(process_ans_files, "VECTORIZED_BATCH_ROWS", 7)
+    streamed = run_process(ans_input, tmp_path / "python")
+    vectorized = run_process(
+        ans_input, tmp_path / "vectorized", "--engine", "vectorized"
+    )
+    assert vectorized == streamed
+
+
+def test_classifier_cache_stats_in_manifest(ans_input, tmp_path):
+    """Testa o cache de classificacao de descricoes e suas estatisticas"""
+    run_process(ans_input, tmp_path / "out")
+    with open(tmp_path / "out" / "process_manifest.json", encoding="utf-8") as f:
+        payload = json.load(f)
+    for entry in payload["entries"]:
+        assert entry["classifier_cache"]["misses"] == 4
+        assert entry["classifier_cache"]["hits"] == 4 * 50 - 4
+    summary = payload["summary"]["classifier_cache"]
+    assert summary["misses"] == 8
+    assert summary["hit_rate"] == round(392 / 400, 4)
+
+
+def test_classifier_matches_uncached():
+    """Testa que o classificador com cache limitado responde igual ao original"""
+    classify = process_ans_files.make_classifier(maxsize=2)
+    values = ["Despesas com Eventos", "Receita", "DESPESA SINISTRO", "x"] * 3
+    assert [classify(v) for v in values] == [
+        process_ans_files.is_despesa_evento(v) for v in values
+    ]
+    assert process_ans_files.classifier_stats(classify)["size"] == 2
+
+
+def test_build_code_entries_and_lookup():
+    """Testa a busca pelo codigo observado ou pelo ancestral observado mais longo"""
+    codes = process_ans_files.build_code_entries(
+        {"41": 1, "411121": 1, "4112": 2, "311111": 2, "46": 3}
+    )
+    assert codes == {
+        "311111": False,
+        "41": True,
+        "4112": False,
+        "411121": True,
+        "46": None,
+    }
+    lookup = process_ans_files.lookup_code
+    assert lookup(codes, "411199") is True
+    assert lookup(codes, "411201") is False
+    assert lookup(codes, " 311111 ") is False
+    assert lookup(codes, "31") is None
+    assert lookup(codes, "4611") is None
+    assert lookup(codes, "42") is None
+    assert lookup(codes, "") is None
+
+
+@pytest.mark.parametrize("engine", ["python", "vectorized"])
+def test_code_index_keeps_output(ans_input, tmp_path, engine):
+    """Testa que o filtro por codigo de conta gera a mesma saida do filtro textual"""
+    index_path = tmp_path / "code_index.json"
+    baseline = run_process(ans_input, tmp_path / "baseline", "--engine", engine)
+    built = run_process(
+        ans_input,
+        tmp_path / "built",
+        "--engine",
+        engine,
+        "--build-code-index",
+        "--code-index",
+        str(index_path),
+    )
+    loaded = run_process(
+        ans_input,
+        tmp_path / "loaded",
+        "--engine",
+        engine,
+        "--code-index",
+        str(index_path),
+    )
+    assert built == baseline
+    assert loaded == baseline
+    with open(index_path, encoding="utf-8") as f:
+        payload = json.load(f)
+    assert payload["version"] == process_ans_files.CODE_INDEX_VERSION
+    assert payload["codes"] == {
+        "311111": False,
+        "41": True,
+        "411111": True,
+        "411121": True,
+    }
+    assert payload["codes_observed"] == 4
+
+
+@pytest.mark.parametrize("engine", ["python", "vectorized"])
+def test_code_index_unseen_code_uses_text(ans_input, tmp_path, engine):
+    """Testa que um codigo fora do indice (irmao de um observado) usa o texto"""
+    index_path = tmp_path / "code_index.json"
+    run_process(
+        ans_input,
+        tmp_path / "built",
+        "--build-code-index",
+        "--code-index",
+        str(index_path),
+    )
+    new_input = tmp_path / "novo"
+    new_input.mkdir()
+    rows = CSV_ROWS + [
+        '2024-01-01;"123456";"46";"DESPESAS ADMINISTRATIVAS";"0";"80,00"\n',
+        '2024-01-01;"123456";"461";"Despesas com Eventos / Sinistros";"0";"9,00"\n',
+    ]
+    build_zip(
+        new_input / "3T2024.zip",
+        {"3T2024.csv": (CSV_HEADER + "".join(rows)).encode("utf-8")},
+    )
+    baseline = run_process(new_input, tmp_path / "baseline", "--engine", engine)
+    indexed = run_process(
+        new_input,
+        tmp_path / "indexed",
+        "--engine",
+        engine,
+        "--code-index",
+        str(index_path),
+    )
+    assert indexed == baseline
+    assert baseline["3T2024.csv"].count(b"\n") == 1 + 4
+
+
+def test_code_index_skips_text_heuristic(ans_input, tmp_path, monkeypatch):
+    """Testa que codigos conhecidos nao passam pela heuristica textual"""
+    index_path = tmp_path / "code_index.json"
+    index_path.write_text(
+        json.dumps(
+            {
+                "version": process_ans_files.CODE_INDEX_VERSION,
+                "rule": process_ans_files.CODE_INDEX_RULE,
+                "codes": {"3": False, "4": True},
+            }
+        ),
+        encoding="utf-8",
+    )
+
+    def fail(value):
+        raise AssertionError(f"heuristica textual chamada para {value!r}")
+
+    monkeypatch.setattr(process_ans_files, "is_despesa_evento", fail)
+    output = run_process(ans_input, tmp_path / "out", "--code-index", str(index_path))
+    assert output["1T2024.csv"].count(b"\n") == 1 + 3 * 50
+
+
+@pytest.mark.parametrize(
+    "extra", [(), ("--chunk-mb", "0.002"), ("--engine", "vectorized")]
+)
+def test_code_index_cache_stats_in_manifest(ans_input, tmp_path, extra):
+    """Testa que todos os engines registram as estatisticas do indice de contas"""
+    index_path = tmp_path / "code_index.json"
+    run_process(
+        ans_input,
+        tmp_path / "out",
+        "--code-index",
+        str(index_path),
+        "--build-code-index",
+        *extra,
+    )
+    with open(tmp_path / "out" / "process_manifest.json", encoding="utf-8") as f:
+        payload = json.load(f)
+    for entry in payload["entries"]:
+        stats = entry["code_index_cache"]
+        assert stats["misses"] >= 4
+        if not extra:
+            assert stats["hits"] + stats["misses"] == 4 * 50
+    summary = payload["summary"]["code_index_cache"]
+    assert summary["misses"] == sum(
+        entry["code_index_cache"]["misses"] for entry in payload["entries"]
+    )
+
+
+def test_parquet_copy_matches_csv(tmp_path):
+    """Testa que o Parquet normalizado preserva os valores do CSV"""
+    pq = pytest.importorskip("pyarrow.parquet")
+    source = tmp_path / "4T2024.csv"
+    source.write_bytes(
+        (
+            "COMPETENCIA;CNPJ;DESCRICAO;VALOR;RAZAO_SOCIAL\n" + "".join(TRICKY_ROWS * 3)
+        ).encode("utf-8")
+    )
+    entry = process_ans_files.process_file(str(source), str(tmp_path))
+    assert entry["status"] == "processed", entry.get("error")
+    parquet_path = process_ans_files.write_parquet_copy(entry["output_file"])
+    table = pq.read_table(parquet_path)
+    assert table.schema.field("ano").type == "int16"
+    assert table.schema.field("valor_despesas").type == "double"
+    with open(entry["output_file"], encoding="utf-8", newline="") as f:
+        expected = list(csv.DictReader(f))
+    rows = table.to_pylist()
+    assert len(rows) == len(expected) > 10
+    for row, source_row in zip(rows, expected):
+        assert row["cnpj"] == (source_row["cnpj"] or None)
+        assert row["descricao"] == (source_row["descricao"] or None)
+        assert row["ano"] == (int(source_row["ano"]) if source_row["ano"] else None)
+        if source_row["valor_despesas"]:
+            assert f"{row['valor_despesas']:.2f}" == source_row["valor_despesas"]
+        else:
+            assert row["valor_despesas"] is None
+
+
+def test_parquet_flag_writes_sibling_files(ans_input, tmp_path):
+    """Testa que --parquet grava um Parquet ao lado de cada CSV normalizado"""
+    pytest.importorskip("pyarrow")
+    outputs = run_process(ans_input, tmp_path / "out", "--parquet")
+    assert sorted(outputs) == [
+        "1T2024.csv",
+        "1T2024.parquet",
+        "2T2024.csv",
+        "2T2024.parquet",
+    ]
+    with open(tmp_path / "out" / "process_manifest.json", encoding="utf-8") as f:
+        payload = json.load(f)
+    assert all(e["parquet_file"].endswith(".parquet") for e in payload["entries"])
+    assert payload["errors"] == []
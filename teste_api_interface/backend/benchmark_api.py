@@ -0,0 +1,408 @@
+"""
+Latency benchmarks for the CSV mode of the API, on synthetic CSVs.
+
+aggregates: serves the app with uvicorn in a background thread and hammers
+/api/despesas/por-uf and /api/estatisticas with N concurrent clients, with
+and without the precomputed aggregates.
+
+cnpj: p50/p99 of the CNPJ lookups behind /api/operadoras/{cnpj} and
+/api/despesas/operadora/{cnpj}: full-column scan (original lambda),
+factorized normalization, and the CNPJ index built at load time.
+
+search: p50/p99 of /api/operadoras?search= as typed keystroke by keystroke:
+str.contains over the DataFrame (original) against the n-gram search index.
+
+reload: time to the first answer after startup and request latency while the
+despesas file keeps changing, with the CSVs reloaded on demand (on the
+request path) or by the background data store.
+
+Usage (from the backend directory):
+    python benchmark_api.py aggregates --rows 500000 --concurrency 1,8,32
+    python benchmark_api.py cnpj --rows 1000000
+    python benchmark_api.py search --operadoras 20000
+    python benchmark_api.py reload --rows 1000000
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import numpy as np
+import uvicorn
+
+ENDPOINTS = ["/api/despesas/por-uf", "/api/estatisticas"]
+UFS = ["SP", "RJ", "MG", "RS", "PR", "SC", "BA", "PE", "CE", "GO", "DF", "ES"]
+NAME_WORDS = [
+    "ASSOCIAÇÃO", "ASSISTÊNCIA", "MÉDICA", "SAÚDE", "ODONTOLÓGICA", "UNIMED",
+    "COOPERATIVA", "TRABALHO", "SERVIÇOS", "HOSPITALAR", "PLANO", "VIDA",
+    "BENEFICÊNCIA", "PORTUGUESA", "SÃO", "PAULO", "JOSÉ", "CAIXA", "SERVIDORES",
+    "SINDICATO", "ADMINISTRADORA", "BENEFÍCIOS", "CLÍNICA", "ODONTO", "SUL",
+    "NORDESTE", "BRASIL", "NACIONAL", "REGIONAL", "INTEGRADA",
+]  # fmt: skip
+
+
+def operadora_name(idx):
+    # Three deterministic words plus a suffix, e.g. "UNIMED SAÚDE VIDA 12"
+    words = [NAME_WORDS[(idx * k + k) % len(NAME_WORDS)] for k in (7, 11, 13)]
+    return f"{' '.join(words)} {idx % 97}"
+
+
+def build_csvs(root, rows, operadoras):
+    operadoras_path = os.path.join(root, "operadoras_ativas.csv")
+    with open(operadoras_path, "w", encoding="utf-8") as f:
+        f.write("Registro_Operadora;CNPJ;Razao_Social;Nome_Fantasia;Modalidade;UF\n")
+        for idx in range(operadoras):
+            f.write(
+                f"{300000 + idx};{idx:014d};{operadora_name(idx)};"
+                f"{operadora_name(idx * 31 + 5) if idx % 3 else ''};"
+                f"Medicina de Grupo;{UFS[idx % len(UFS)]}\n"
+            )
+    despesas_path = os.path.join(root, "consolidado_despesas.csv")
+    with open(despesas_path, "w", encoding="utf-8") as f:
+        f.write("CNPJ,RazaoSocial,Trimestre,Ano,ValorDespesas\n")
+        for idx in range(rows):
+            op = (idx * 7919) % operadoras
+            f.write(
+                f"{op:014d},OPERADORA {op},{idx % 4 + 1},{2023 + idx % 2},"
+                f"{(idx * 37 % 10_000_000) / 100:.2f}\n"
+            )
+    return operadoras_path, despesas_path
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(app, port):
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+def run_load(base_url, path, concurrency, requests):
+    latencies = []
+    lock = threading.Lock()
+
+    with httpx.Client(base_url=base_url, timeout=120) as client:
+
+        def worker(count):
+            local = []
+            for _ in range(count):
+                start = time.perf_counter()
+                response = client.get(path)
+                local.append(time.perf_counter() - start)
+                response.raise_for_status()
+            with lock:
+                latencies.extend(local)
+
+        per_worker = [requests // concurrency] * concurrency
+        for idx in range(requests % concurrency):
+            per_worker[idx] += 1
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, per_worker))
+        elapsed = time.perf_counter() - start
+    return latencies, elapsed
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def use_csvs(root, args):
+    operadoras_path, despesas_path = build_csvs(root, args.rows, args.operadoras)
+    # Settings are read at import time, so configure CSV mode first
+    os.environ["USE_CSV"] = "true"
+    os.environ["CSV_PATH_OPERADORAS"] = operadoras_path
+    os.environ["CSV_PATH_DESPESAS"] = despesas_path
+    print(f"{args.rows:,} despesas, {args.operadoras:,} operadoras")
+
+
+def bench_aggregates(args):
+    with tempfile.TemporaryDirectory() as root:
+        use_csvs(root, args)
+        from config import settings
+        from main import app
+
+        port = free_port()
+        server, thread = start_server(app, port)
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            for cached in (False, True):
+                settings.CSV_AGGREGATE_CACHE = cached
+                label = "precomputed" if cached else "per request"
+                for path in ENDPOINTS:
+                    httpx.get(base_url + path, timeout=120).raise_for_status()
+                    for concurrency in [int(v) for v in args.concurrency.split(",")]:
+                        latencies, elapsed = run_load(
+                            base_url, path, concurrency, args.requests
+                        )
+                        print(
+                            f"{label:>11} {path:<22} c={concurrency:<3} "
+                            f"p50 {percentile(latencies, 50) * 1000:8.2f} ms  "
+                            f"p99 {percentile(latencies, 99) * 1000:8.2f} ms  "
+                            f"mean {statistics.mean(latencies) * 1000:8.2f} ms  "
+                            f"{len(latencies) / elapsed:8.1f} req/s"
+                        )
+        finally:
+            server.should_exit = True
+            thread.join()
+
+
+def time_lookups(func, cnpjs):
+    latencies = []
+    for cnpj in cnpjs:
+        start = time.perf_counter()
+        func(cnpj)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_cnpj(args):
+    with tempfile.TemporaryDirectory() as root:
+        use_csvs(root, args)
+        from services import despesa_service, operadora_service
+
+        import cnpj_cache
+
+        despesas = despesa_service.load_despesas_csv()
+        operadoras = operadora_service.load_operadoras_csv()
+        for label, build in [
+            ("operadoras", operadora_service.operadoras_cnpj_index),
+            ("despesas", despesa_service.despesas_cnpj_index),
+        ]:
+            start = time.perf_counter()
+            index = build()
+            elapsed = time.perf_counter() - start
+            print(f"index {label}: {len(index):,} CNPJs in {elapsed * 1000:.0f} ms")
+
+        rng = np.random.default_rng(0)
+        # ~90% hits, ~10% misses
+        cnpjs = [
+            f"{int(op):014d}"
+            for op in rng.integers(0, int(args.operadoras * 1.1), size=args.lookups)
+        ]
+
+        def scan(df):
+            def lookup(cnpj):
+                return df[
+                    df["cnpj"].apply(lambda x: "".join(filter(str.isdigit, str(x))))
+                    == cnpj
+                ].to_dict(orient="records")
+
+            return lookup
+
+        def factorized(df):
+            def lookup(cnpj):
+                return df[cnpj_cache.normalize_cnpjs(df["cnpj"]) == cnpj].to_dict(
+                    orient="records"
+                )
+
+            return lookup
+
+        cases = [
+            ("operadoras", "scan", scan(operadoras), args.scan_lookups),
+            ("operadoras", "factorized", factorized(operadoras), args.scan_lookups),
+            (
+                "operadoras",
+                "index",
+                lambda cnpj: operadora_service.get_operadora_by_cnpj(None, cnpj),
+                args.lookups,
+            ),
+            ("despesas", "scan", scan(despesas), args.scan_lookups),
+            ("despesas", "factorized", factorized(despesas), args.scan_lookups),
+            (
+                "despesas",
+                "index",
+                lambda cnpj: despesa_service.get_expenses_by_operator(None, cnpj),
+                args.lookups,
+            ),
+        ]
+        for label, method, func, count in cases:
+            latencies = time_lookups(func, cnpjs[:count])
+            print(
+                f"{label:>10} {method:>10}: "
+                f"p50 {percentile(latencies, 50) * 1000:9.3f} ms  "
+                f"p99 {percentile(latencies, 99) * 1000:9.3f} ms  "
+                f"({len(latencies)} lookups)"
+            )
+
+
+def keystrokes(rng, operadoras, count):
+    # Prefixes typed into the frontend search box: a word from a name, a
+    # formatted CNPJ prefix, or a term with no match
+    terms = []
+    while len(terms) < count:
+        kind = rng.integers(0, 10)
+        if kind < 7:
+            words = operadora_name(int(rng.integers(0, operadoras))).split()
+            target = words[int(rng.integers(0, len(words) - 1))].lower()
+        elif kind < 9:
+            cnpj = f"{int(rng.integers(0, operadoras)):014d}"
+            target = f"{cnpj[:2]}.{cnpj[2:5]}.{cnpj[5:8]}/{cnpj[8:12]}-{cnpj[12:]}"
+        else:
+            target = "xyzkw"
+        terms.extend(target[:size] for size in range(1, len(target) + 1))
+    return terms[:count]
+
+
+def bench_search(args):
+    with tempfile.TemporaryDirectory() as root:
+        use_csvs(root, args)
+        from services import operadora_service
+
+        df = operadora_service.load_operadoras_csv()
+        start = time.perf_counter()
+        index = operadora_service.operadoras_search_index()
+        elapsed = time.perf_counter() - start
+        print(
+            f"index: {len(index):,} operadoras, {len(index.postings):,} n-grams "
+            f"in {elapsed * 1000:.0f} ms"
+        )
+        terms = keystrokes(np.random.default_rng(0), args.operadoras, args.lookups)
+
+        def contains(term):
+            # Original CSV-mode filter of get_operadoras
+            search_clean = term.lower().strip()
+            matches = df[
+                df["razao_social"].str.lower().str.contains(search_clean, na=False)
+                | df["cnpj"].str.contains(search_clean, na=False)
+            ]
+            return len(matches), matches.iloc[:10].to_dict(orient="records")
+
+        def indexed(search):
+            def lookup(term):
+                positions = search(term)
+                return len(positions), df.iloc[positions[:10]].to_dict(orient="records")
+
+            return lookup
+
+        cases = [
+            ("str.contains", contains),
+            ("index", indexed(index.search.__wrapped__)),
+            ("index + LRU", indexed(index.search)),
+        ]
+        for method, func in cases:
+            latencies = time_lookups(func, terms)
+            print(
+                f"{method:>14}: "
+                f"p50 {percentile(latencies, 50) * 1000:8.3f} ms  "
+                f"p99 {percentile(latencies, 99) * 1000:8.3f} ms  "
+                f"({len(latencies)} keystrokes)"
+            )
+
+
+def bench_reload(args):
+    with tempfile.TemporaryDirectory() as root:
+        use_csvs(root, args)
+        from config import settings
+        from main import app
+        from services import data_store
+
+        despesas_path = os.environ["CSV_PATH_DESPESAS"]
+        settings.CSV_RELOAD_INTERVAL = args.interval
+        paths = ["/api/estatisticas", "/api/operadoras/00000000000007/despesas"]
+        for background in (False, True):
+            settings.CSV_BACKGROUND_RELOAD = background
+            data_store.reset()
+            label = "background" if background else "on demand"
+            start = time.perf_counter()
+            port = free_port()
+            server, thread = start_server(app, port)
+            try:
+                with httpx.Client(
+                    base_url=f"http://127.0.0.1:{port}", timeout=300
+                ) as client:
+                    started = time.perf_counter() - start
+                    client.get(paths[0]).raise_for_status()
+                    first = time.perf_counter() - start
+                    print(
+                        f"{label:>10}: listening after {started:.2f}s, "
+                        f"first answer after {first:.2f}s"
+                    )
+                    latencies = []
+                    for idx in range(args.reloads):
+                        # New mtime: a new version of the despesas file
+                        stamp = time.time_ns() + idx
+                        os.utime(despesas_path, ns=(stamp, stamp))
+                        deadline = time.perf_counter() + args.window
+                        while time.perf_counter() < deadline:
+                            for path in paths:
+                                begin = time.perf_counter()
+                                client.get(path).raise_for_status()
+                                latencies.append(time.perf_counter() - begin)
+                    print(
+                        f"{label:>10}: {args.reloads} reloads, "
+                        f"p50 {percentile(latencies, 50) * 1000:8.2f} ms  "
+                        f"p99 {percentile(latencies, 99) * 1000:8.2f} ms  "
+                        f"max {max(latencies) * 1000:8.2f} ms  "
+                        f"({len(latencies)} requests)"
+                    )
+            finally:
+                server.should_exit = True
+                thread.join()
+                data_store.reset()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    aggregates = subparsers.add_parser(
+        "aggregates", help="Concurrent load on por-uf and estatisticas."
+    )
+    aggregates.add_argument("--rows", type=int, default=500_000)
+    aggregates.add_argument("--operadoras", type=int, default=1_500)
+    aggregates.add_argument("--concurrency", default="1,8,32")
+    aggregates.add_argument("--requests", type=int, default=200)
+    aggregates.set_defaults(func=bench_aggregates)
+
+    cnpj = subparsers.add_parser("cnpj", help="CNPJ lookup: scan x index.")
+    cnpj.add_argument("--rows", type=int, default=1_000_000)
+    cnpj.add_argument("--operadoras", type=int, default=1_500)
+    cnpj.add_argument("--lookups", type=int, default=2_000)
+    cnpj.add_argument(
+        "--scan-lookups",
+        type=int,
+        default=30,
+        help="Lookups for the (slow) full-column scan variants.",
+    )
+    cnpj.set_defaults(func=bench_cnpj)
+
+    search = subparsers.add_parser("search", help="?search=: contains x index.")
+    search.add_argument("--rows", type=int, default=10_000)
+    search.add_argument("--operadoras", type=int, default=20_000)
+    search.add_argument("--lookups", type=int, default=1_000)
+    search.set_defaults(func=bench_search)
+
+    reload = subparsers.add_parser(
+        "reload", help="Latency during reloads: on demand x background."
+    )
+    reload.add_argument("--rows", type=int, default=1_000_000)
+    reload.add_argument("--operadoras", type=int, default=1_500)
+    reload.add_argument("--reloads", type=int, default=3)
+    reload.add_argument(
+        "--window", type=float, default=10, help="Seconds of load after each change."
+    )
+    reload.add_argument("--interval", type=float, default=0.5)
+    reload.set_defaults(func=bench_reload)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
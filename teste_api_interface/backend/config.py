@@ -15,6 +15,18 @@ class Settings:
     # Adjust paths to assume running from backend directory
     CSV_PATH_OPERADORAS = os.getenv("CSV_PATH_OPERADORAS", "../../teste_transformacao_validacao/operadoras_ativas.csv")
     CSV_PATH_DESPESAS = os.getenv("CSV_PATH_DESPESAS", "../../data/processed/consolidado_despesas.csv")
+    # Serve /api/despesas/por-uf and /api/estatisticas from precomputed aggregates in CSV mode
+    CSV_AGGREGATE_CACHE = os.getenv("CSV_AGGREGATE_CACHE", "True").lower() == "true"
+    # Load the CSVs in the background at startup and hot-reload them when they change
+    CSV_BACKGROUND_RELOAD = os.getenv("CSV_BACKGROUND_RELOAD", "True").lower() == "true"
+    # Seconds between checks of the CSVs' version (mtime/size)
+    CSV_RELOAD_INTERVAL = float(os.getenv("CSV_RELOAD_INTERVAL", "2"))
+    # Seconds a request waits for the first background load before loading itself
+    CSV_READY_TIMEOUT = float(os.getenv("CSV_READY_TIMEOUT", "120"))
+    # Seconds a COUNT(*) total is reused by the cursor-paginated operadoras listing
+    COUNT_CACHE_TTL = float(os.getenv("COUNT_CACHE_TTL", "60"))
+    # Pipeline scripts directory (shared operadoras lookup module)
+    PIPELINE_DIR = os.getenv("PIPELINE_DIR", "../../teste_api_ans")
 
     @property
     def DATABASE_URL(self):
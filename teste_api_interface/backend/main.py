@@ -8,7 +8,7 @@ from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routers import despesas, operadoras
 from schemas.despesa import Estatisticas
-from services import despesa_service
+from services import data_store, despesa_service
 
 # Create database tables (if database connection is available)
 # In production, use Alembic for migrations.
@@ -22,9 +22,14 @@ async def lifespan(app: FastAPI):
     print("Starting up application...")
     # Verify setup again
     check_db_and_csv()
+    # Load the CSV-mode data (DataFrames, indexes, aggregates) in the
+    # background and hot-reload it when the pipeline rewrites the files
+    if settings.USE_CSV and settings.CSV_BACKGROUND_RELOAD:
+        data_store.start(settings.CSV_RELOAD_INTERVAL, settings.CSV_READY_TIMEOUT)
     yield
     # Shutdown logic
     print("Shutting down application...")
+    data_store.stop()
 
 
 app = FastAPI(
@@ -60,11 +65,15 @@ def health_check():
     """
     Health check endpoint to verify the API is running.
     """
-    return {
+    payload = {
         "status": "ok",
         "message": "API is online",
         "mode": "CSV" if settings.USE_CSV else "Database",
     }
+    if settings.USE_CSV:
+        # Version of the CSV snapshot being served; never waits for a load
+        payload["data"] = data_store.status()
+    return payload
 
 
 if __name__ == "__main__":
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Float, Integer, Date
+from sqlalchemy import Column, String, Float, Integer, Date, Index
 from database import Base
 
 class Operadora(Base):
@@ -25,6 +25,19 @@ class Operadora(Base):
     regiao_de_comercializacao = Column(String(100))
     data_registro_ans = Column(Date)
 
+    # Full-text search on names (GET /api/operadoras?search=), MySQL only, and
+    # the keyset order of GET /api/operadoras?order_by=razao_social
+    __table_args__ = (
+        Index("idx_operadoras_razao_registro", "razao_social", "registro_operadora"),
+        Index(
+            "ft_operadoras_nome",
+            "razao_social",
+            "nome_fantasia",
+            mysql_prefix="FULLTEXT",
+            mysql_with_parser="ngram",
+        ).ddl_if(dialect="mysql"),
+    )
+
 class ConsolidadoDespesa(Base):
     __tablename__ = "consolidado_despesas"
 
@@ -1,12 +1,12 @@
 from fastapi import APIRouter, Depends, Query, HTTPException
 from sqlalchemy.orm import Session
-from typing import Optional, List
+from typing import Literal, Optional, List
 import math
 
 from database import get_db
 from schemas.operadora import Operadora, PaginatedOperadoras
 from schemas.despesa import Despesa
-from services import operadora_service, despesa_service
+from services import operadora_service, despesa_service, pagination
 
 router = APIRouter(
     prefix="/api/operadoras",
@@ -18,11 +18,33 @@ def read_operadoras(
     page: int = Query(1, ge=1, description="Page number"),
     limit: int = Query(10, ge=1, le=100, description="Items per page"),
     search: Optional[str] = Query(None, description="Search by Razao Social or CNPJ"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page (cursor mode)"),
+    order_by: Optional[Literal["registro_operadora", "razao_social"]] = Query(None, description="Cursor mode ordering"),
+    with_total: bool = Query(True, description="Cursor mode: include the (cached) total"),
     db: Session = Depends(get_db)
 ):
     """
     Lista operadoras com paginacao e filtro opcional (Razao Social ou CNPJ).
+
+    Com `cursor` ou `order_by`, usa paginacao por cursor (keyset): `page` e
+    ignorado e `next_cursor` aponta a pagina seguinte.
     """
+    if cursor or order_by:
+        try:
+            operadoras_list, total_count, next_cursor = operadora_service.get_operadoras_keyset(
+                db, limit, order_by, cursor, search, with_total
+            )
+        except pagination.InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {
+            "data": operadoras_list,
+            "total": total_count,
+            "page": None,
+            "limit": limit,
+            "total_pages": math.ceil(total_count / limit) if total_count is not None else None,
+            "next_cursor": next_cursor
+        }
+
     operadoras_list, total_count = operadora_service.get_operadoras(db, page, limit, search)
 
     total_pages = math.ceil(total_count / limit)
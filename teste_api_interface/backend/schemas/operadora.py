@@ -5,7 +5,8 @@ from datetime import date
 class OperadoraBase(BaseModel):
     registro_operadora: Optional[int]
     cnpj: str
-    razao_social: str
+    # Nullable in the operadoras table
+    razao_social: Optional[str]
     nome_fantasia: Optional[str] = None
     modalidade: Optional[str] = None
     logradouro: Optional[str] = None
@@ -30,7 +31,10 @@ class Operadora(OperadoraBase):
 
 class PaginatedOperadoras(BaseModel):
     data: List[Operadora]
-    total: int
-    page: int
+    # None when the cursor listing is requested with with_total=false
+    total: Optional[int]
+    # None in cursor mode (cursor/order_by)
+    page: Optional[int]
     limit: int
-    total_pages: int
+    total_pages: Optional[int]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,188 @@
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+# Versioned snapshots of everything the CSV mode serves (DataFrames, CNPJ and
+# search indexes, aggregates). Started in the API lifespan, a background
+# thread loads the first snapshot, polls the source files' version and builds
+# each new snapshot off the request path before swapping it in with a single
+# assignment: requests keep reading the previous snapshot while a reload runs.
+# Without start() (tests, scripts) the store works synchronously: every
+# current() checks the version and derived data is built on first use.
+
+_MISSING = object()
+
+
+class Snapshot:
+    def __init__(self, version: Any, strict: bool = False):
+        self.version = version
+        # Set while reload() builds the snapshot: loaders raise instead of
+        # falling back to empty data, so a failed read keeps the previous one
+        self.strict = strict
+        self.loaded_at: Optional[float] = None
+        self._values: Dict[str, Any] = {}
+        # Reentrant: builders fetch the values they depend on
+        self._lock = threading.RLock()
+
+    def get(self, name: str, build: Callable[["Snapshot"], Any]) -> Any:
+        # Derived data of this snapshot, built once
+        value = self._values.get(name, _MISSING)
+        if value is _MISSING:
+            with self._lock:
+                value = self._values.get(name, _MISSING)
+                if value is _MISSING:
+                    value = build(self)
+                    self._values[name] = value
+        return value
+
+
+_snapshot: Optional[Snapshot] = None
+_swap_lock = threading.Lock()
+_reload_lock = threading.Lock()
+_ready = threading.Event()
+_stop = threading.Event()
+_thread: Optional[threading.Thread] = None
+_ready_timeout: Optional[float] = None
+_reloads = 0
+_last_error: Optional[str] = None
+
+
+def data_version():
+    # Imported here: the services import this module
+    from services import despesa_service
+
+    return despesa_service.data_version()
+
+
+def warm(snapshot: Snapshot) -> None:
+    from services import despesa_service, operadora_service
+
+    operadora_service.warm_snapshot(snapshot)
+    despesa_service.warm_snapshot(snapshot)
+
+
+def format_version(version: Any) -> Optional[str]:
+    if version is None:
+        return None
+    return hashlib.sha1(repr(version).encode("utf-8")).hexdigest()[:12]
+
+
+def running() -> bool:
+    return _thread is not None and _thread.is_alive()
+
+
+def current() -> Snapshot:
+    global _snapshot
+    if _ready.is_set():
+        return _snapshot
+    # Background mode: only the first load is waited for, and only up to
+    # _ready_timeout; after that requests load synchronously
+    if running() and _ready.wait(_ready_timeout):
+        return _snapshot
+    version = data_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    with _swap_lock:
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = Snapshot(version)
+            _snapshot.loaded_at = time.time()
+        return _snapshot
+
+
+def resolve(snapshot: Optional[Snapshot] = None) -> Snapshot:
+    # Code serving one request passes the same snapshot to every accessor, so
+    # a reload swapped in mid-request never mixes two data versions
+    return snapshot if snapshot is not None else current()
+
+
+def reload(force: bool = False) -> bool:
+    # Build and swap in a snapshot for the files' current version; returns
+    # whether a new snapshot was published
+    global _snapshot, _reloads
+    with _reload_lock:
+        version = data_version()
+        if not force and _snapshot is not None and _snapshot.version == version:
+            return False
+        snapshot = Snapshot(version, strict=True)
+        warm(snapshot)
+        snapshot.strict = False
+        if data_version() != version:
+            # A file changed while it was being read: retry on the next poll
+            return False
+        snapshot.loaded_at = time.time()
+        with _swap_lock:
+            _snapshot = snapshot
+            _reloads += 1
+        _ready.set()
+        return True
+
+
+def _watch(poll_interval: float) -> None:
+    global _last_error
+    while True:
+        try:
+            # The first load always builds (and warms) a fresh snapshot
+            reload(force=not _ready.is_set())
+            _last_error = None
+        except Exception as e:
+            # Keep serving the previous snapshot
+            _last_error = f"{type(e).__name__}: {e}"
+            print(f"Error reloading CSV data: {_last_error}")
+        if _stop.wait(poll_interval if _ready.is_set() else min(poll_interval, 1)):
+            return
+
+
+def start(poll_interval: float, ready_timeout: Optional[float] = None) -> None:
+    global _thread, _ready_timeout
+    if running():
+        return
+    _ready_timeout = ready_timeout
+    _stop.clear()
+    _thread = threading.Thread(
+        target=_watch, args=(poll_interval,), name="csv-data-store", daemon=True
+    )
+    _thread.start()
+
+
+def wait_ready(timeout: Optional[float] = None) -> bool:
+    return _ready.wait(timeout)
+
+
+def stop() -> None:
+    global _thread
+    _stop.set()
+    if _thread is not None:
+        _thread.join()
+    _thread = None
+
+
+def reset() -> None:
+    # Back to synchronous mode with no snapshot (next current() reloads)
+    global _snapshot, _reloads, _last_error
+    stop()
+    with _swap_lock:
+        _snapshot = None
+        _ready.clear()
+        _reloads = 0
+        _last_error = None
+
+
+def status() -> Dict[str, Any]:
+    snapshot = _snapshot
+    if running():
+        state = "ready" if snapshot is not None and _ready.is_set() else "loading"
+    else:
+        state = "on demand"
+    loaded_at = None
+    if snapshot is not None and snapshot.loaded_at is not None:
+        loaded_at = datetime.fromtimestamp(snapshot.loaded_at, timezone.utc)
+    return {
+        "state": state,
+        "version": format_version(snapshot.version if snapshot else None),
+        "loaded_at": loaded_at.isoformat() if loaded_at else None,
+        "reloads": _reloads,
+        "last_error": _last_error,
+    }
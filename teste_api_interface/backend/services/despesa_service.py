@@ -9,9 +9,13 @@ from schemas.despesa import Despesa, DespesaUF
 from sqlalchemy import func
 from sqlalchemy.orm import Session
 
-from services import operadora_service
+from services import data_store, operadora_service
 
-_despesas_df = None
+# Pipeline dir is put on sys.path by operadora_service
+import cnpj_cache  # noqa: E402
+
+# Read CNPJs as text: keeps leading zeros and skips an int -> str conversion
+CNPJ_DTYPES = {"CNPJ": str, "cnpj": str}
 
 
 def _normalize_col(name: str) -> str:
@@ -39,67 +43,169 @@ def _rename_despesas_columns(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def load_despesas_csv():
-    global _despesas_df
-    if _despesas_df is None:
-        base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-        csv_path = os.path.abspath(os.path.join(base_dir, settings.CSV_PATH_DESPESAS))
+def _read_despesas_parquet(csv_path: str):
+    # Prefer the columnar copy written by consolidate_ans_expenses.py --parquet
+    # when it is at least as new as the CSV and a parquet engine is installed.
+    parquet_path = os.path.splitext(csv_path)[0] + ".parquet"
+    if not os.path.exists(parquet_path):
+        return None
+    if os.path.exists(csv_path) and os.path.getmtime(parquet_path) < os.path.getmtime(
+        csv_path
+    ):
+        return None
+    try:
+        df = pd.read_parquet(parquet_path)
+    except ImportError:
+        return None
+    df = _rename_despesas_columns(df)
+    df["valor_despesas"] = df["valor_despesas"].fillna(0)
+    df["cnpj"] = df["cnpj"].fillna("").astype(str)
+    return df
+
+
+def despesas_csv_path() -> str:
+    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    return os.path.abspath(os.path.join(base_dir, settings.CSV_PATH_DESPESAS))
+
+
+def reset_despesas_cache():
+    # DataFrame, index and aggregates live in the data store's snapshots
+    data_store.reset()
+
+
+def despesas_cnpj_index(snapshot=None):
+    # Normalized CNPJ -> row positions in the despesas DataFrame
+    def build(snap):
+        df = load_despesas_csv(snap)
+        return cnpj_cache.build_cnpj_index(df["cnpj"]) if "cnpj" in df.columns else {}
+
+    return data_store.resolve(snapshot).get("despesas_cnpj_index", build)
+
+
+def _read_despesas_csv(snapshot):
+    csv_path = despesas_csv_path()
+    try:
+        df = _read_despesas_parquet(csv_path)
+    except Exception as e:
+        print(f"Error loading Despesas parquet: {e}")
+        df = None
+    if df is not None:
+        return df
+    try:
+        # Load despesas. Assuming format matches.
+        # Using ; or , separator? Phase 3 usually produces CSV. Let's assume ; based on operadoras.
+        # Usually standard pandas read_csv handles standard CSV.
+        # Let's try default, if fail try ;
         try:
-            # Load despesas. Assuming format matches.
-            # Using ; or , separator? Phase 3 usually produces CSV. Let's assume ; based on operadoras.
-            # Usually standard pandas read_csv handles standard CSV.
-            # Let's try default, if fail try ;
-            try:
-                _despesas_df = pd.read_csv(csv_path, encoding="utf-8", sep=",")
-                _despesas_df = _rename_despesas_columns(_despesas_df)
-                if "cnpj" not in _despesas_df.columns:
-                    # If ',' didn't work properly or it's separated by ';', check columns
-                    _despesas_df = pd.read_csv(csv_path, encoding="utf-8", sep=";")
-                    _despesas_df = _rename_despesas_columns(_despesas_df)
-            except Exception:
-                _despesas_df = pd.read_csv(csv_path, encoding="utf-8", sep=";")
-                _despesas_df = _rename_despesas_columns(_despesas_df)
-
-            # Ensure we have required columns
-            # Clean values
-            if "valor_despesas" in _despesas_df.columns:
-                _despesas_df["valor_despesas"] = pd.to_numeric(
-                    _despesas_df["valor_despesas"].astype(str).str.replace(",", "."),
-                    errors="coerce",
-                ).fillna(0)
-            if "cnpj" in _despesas_df.columns:
-                _despesas_df["cnpj"] = _despesas_df["cnpj"].astype(str)
-
-        except Exception as e:
-            print(f"Error loading Despesas CSV: {e}")
-            _despesas_df = pd.DataFrame()
-    return _despesas_df
+            df = pd.read_csv(csv_path, encoding="utf-8", sep=",", dtype=CNPJ_DTYPES)
+            df = _rename_despesas_columns(df)
+            if "cnpj" not in df.columns:
+                # If ',' didn't work properly or it's separated by ';', check columns
+                df = pd.read_csv(csv_path, encoding="utf-8", sep=";", dtype=CNPJ_DTYPES)
+                df = _rename_despesas_columns(df)
+        except Exception:
+            df = pd.read_csv(csv_path, encoding="utf-8", sep=";", dtype=CNPJ_DTYPES)
+            df = _rename_despesas_columns(df)
+
+        # Ensure we have required columns
+        # Clean values
+        if "valor_despesas" in df.columns:
+            valores = df["valor_despesas"]
+            # Only text columns (decimal comma) need the string round trip,
+            # which holds the GIL for seconds on large files and would stall
+            # requests during a background reload
+            if not pd.api.types.is_numeric_dtype(valores):
+                valores = pd.to_numeric(
+                    valores.astype(str).str.replace(",", "."), errors="coerce"
+                )
+            df["valor_despesas"] = valores.fillna(0)
+        if "cnpj" in df.columns:
+            df["cnpj"] = df["cnpj"].astype(str)
+
+    except Exception as e:
+        if snapshot.strict:
+            raise
+        print(f"Error loading Despesas CSV: {e}")
+        df = pd.DataFrame()
+    return df
 
 
-def get_expenses_by_uf(db: Session) -> List[DespesaUF]:
-    if settings.USE_CSV:
-        despesas = load_despesas_csv()
-        operadoras = operadora_service.load_operadoras_csv()
+def load_despesas_csv(snapshot=None):
+    return data_store.resolve(snapshot).get("despesas_df", _read_despesas_csv)
 
-        if despesas.empty or operadoras.empty:
-            return []
 
-        # Merge to get UF
-        # operadoras has 'cnpj', 'uf'
-        if "uf" not in operadoras.columns:
-            operadoras["uf"] = None
-        merged = pd.merge(
-            despesas,
-            operadoras[["cnpj", "uf"]],
-            on="cnpj",
-            how="inner",
-        )
+def _file_version(path: str):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def data_version():
+    # Cheap (a few stat calls): (mtime, size) of every file the CSV mode reads
+    despesas_csv = despesas_csv_path()
+    return (
+        _file_version(despesas_csv),
+        _file_version(os.path.splitext(despesas_csv)[0] + ".parquet"),
+        _file_version(operadora_service.operadoras_csv_path()),
+    )
+
+
+def _compute_expenses_by_uf(despesas: pd.DataFrame, operadoras: pd.DataFrame):
+    if despesas.empty or operadoras.empty:
+        return []
+
+    # Merge to get UF
+    # operadoras has 'cnpj', 'uf'
+    if "uf" not in operadoras.columns:
+        operadoras["uf"] = None
+    merged = pd.merge(
+        despesas,
+        operadoras[["cnpj", "uf"]],
+        on="cnpj",
+        how="inner",
+    )
+
+    # Group by UF
+    grouped = merged.groupby("uf")["valor_despesas"].sum().reset_index()
+    grouped.rename(columns={"valor_despesas": "total_despesas"}, inplace=True)
+
+    return grouped.to_dict(orient="records")
+
+
+def _compute_aggregates(snapshot):
+    despesas = load_despesas_csv(snapshot)
+    operadoras = operadora_service.load_operadoras_csv(snapshot)
+    return {
+        "por_uf": _compute_expenses_by_uf(despesas, operadoras),
+        "estatisticas": _compute_estatisticas(despesas, operadoras),
+    }
+
 
-        # Group by UF
-        grouped = merged.groupby("uf")["valor_despesas"].sum().reset_index()
-        grouped.rename(columns={"valor_despesas": "total_despesas"}, inplace=True)
+def get_aggregates(snapshot=None):
+    # Precomputed CSV-mode aggregates ("por_uf" and "estatisticas"), built once
+    # per snapshot of the source files
+    return data_store.resolve(snapshot).get("aggregates", _compute_aggregates)
 
-        return grouped.to_dict(orient="records")
+
+def warm_snapshot(snapshot):
+    # Everything the CSV mode reads from despesas, built before a reload is
+    # swapped in
+    load_despesas_csv(snapshot)
+    despesas_cnpj_index(snapshot)
+    if settings.CSV_AGGREGATE_CACHE:
+        get_aggregates(snapshot)
+
+
+def get_expenses_by_uf(db: Session) -> List[DespesaUF]:
+    if settings.USE_CSV:
+        snapshot = data_store.current()
+        if settings.CSV_AGGREGATE_CACHE:
+            return get_aggregates(snapshot)["por_uf"]
+        despesas = load_despesas_csv(snapshot)
+        operadoras = operadora_service.load_operadoras_csv(snapshot)
+        return _compute_expenses_by_uf(despesas, operadoras)
     else:
         # DB Logic
         # Join ConsolidadoDespesa with Operadora (assuming foreign key or implicit join on CNPJ)
@@ -121,7 +227,8 @@ def get_expenses_by_uf(db: Session) -> List[DespesaUF]:
 
 def get_expenses_by_operator(db: Session, cnpj: str) -> List[Despesa]:
     if settings.USE_CSV:
-        df = load_despesas_csv()
+        snapshot = data_store.current()
+        df = load_despesas_csv(snapshot)
         # Filter
         clean_cnpj = "".join(filter(str.isdigit, cnpj))
         # Try both clean and raw ? df should be normalized.
@@ -131,10 +238,11 @@ def get_expenses_by_operator(db: Session, cnpj: str) -> List[Despesa]:
 
         if "cnpj" not in df.columns:
             return []
-        filtered = df[
-            df["cnpj"].apply(lambda x: "".join(filter(str.isdigit, str(x))))
-            == clean_cnpj
-        ]
+        # O(1) lookup in the CNPJ index built at load time
+        positions = despesas_cnpj_index(snapshot).get(clean_cnpj)
+        if positions is None:
+            return []
+        filtered = df.iloc[positions]
 
         return filtered.to_dict(orient="records")
     else:
@@ -146,58 +254,62 @@ def get_expenses_by_operator(db: Session, cnpj: str) -> List[Despesa]:
         )
 
 
-def get_estatisticas(db: Session):
-    if settings.USE_CSV:
-        df = load_despesas_csv()
-        op_df = (
-            operadora_service.load_operadoras_csv()
-        )  # Needed for razao_social if not in despesas
+def _compute_estatisticas(df: pd.DataFrame, op_df: pd.DataFrame):
+    if df.empty or "cnpj" not in df.columns:
+        return {
+            "total_geral": 0,
+            "media_trimestral": 0,
+            "top_5_operadoras": [],
+        }
 
-        if df.empty or "cnpj" not in df.columns:
-            return {
-                "total_geral": 0,
-                "media_trimestral": 0,
-                "top_5_operadoras": [],
-            }
-
-        # Despesas might have razao_social, but let's check
-        if "razao_social" not in df.columns:
-            # Merge
-            if "razao_social" not in op_df.columns:
-                op_df["razao_social"] = None
-            df = pd.merge(df, op_df[["cnpj", "razao_social"]], on="cnpj", how="left")
-
-        if "valor_despesas" not in df.columns:
-            return {
-                "total_geral": 0,
-                "media_trimestral": 0,
-                "top_5_operadoras": [],
-            }
-        total_geral = df["valor_despesas"].sum()
-
-        # Média trimestral considerar (soma das despesas) / (num operadoras * num trimestres) ???
-        # Or just mean of the rows? The rows are (operadora, trimestre).
-        # Requirement: "média de despesas". usually mean of value.
-        media_trimestral = df["valor_despesas"].mean()
-
-        # Top 5
-        # Group by razao_social sum
-        top_5 = (
-            df.groupby("razao_social")["valor_despesas"].sum().nlargest(5).reset_index()
-        )
-        top_5_list = top_5.to_dict(
-            orient="records"
-        )  # [{'razao_social':..., 'valor_despesas':...}]
-        top_5_formatted = [
-            {"razao_social": i["razao_social"], "total_despesas": i["valor_despesas"]}
-            for i in top_5_list
-        ]
+    # Despesas might have razao_social, but let's check
+    if "razao_social" not in df.columns:
+        # Merge
+        if "razao_social" not in op_df.columns:
+            op_df["razao_social"] = None
+        df = pd.merge(df, op_df[["cnpj", "razao_social"]], on="cnpj", how="left")
 
+    if "valor_despesas" not in df.columns:
         return {
-            "total_geral": total_geral,
-            "media_trimestral": media_trimestral,
-            "top_5_operadoras": top_5_formatted,
+            "total_geral": 0,
+            "media_trimestral": 0,
+            "top_5_operadoras": [],
         }
+    total_geral = df["valor_despesas"].sum()
+
+    # Média trimestral considerar (soma das despesas) / (num operadoras * num trimestres) ???
+    # Or just mean of the rows? The rows are (operadora, trimestre).
+    # Requirement: "média de despesas". usually mean of value.
+    media_trimestral = df["valor_despesas"].mean()
+
+    # Top 5
+    # Group by razao_social sum
+    top_5 = df.groupby("razao_social")["valor_despesas"].sum().nlargest(5).reset_index()
+    top_5_list = top_5.to_dict(
+        orient="records"
+    )  # [{'razao_social':..., 'valor_despesas':...}]
+    top_5_formatted = [
+        {"razao_social": i["razao_social"], "total_despesas": i["valor_despesas"]}
+        for i in top_5_list
+    ]
+
+    return {
+        "total_geral": total_geral,
+        "media_trimestral": media_trimestral,
+        "top_5_operadoras": top_5_formatted,
+    }
+
+
+def get_estatisticas(db: Session):
+    if settings.USE_CSV:
+        snapshot = data_store.current()
+        if settings.CSV_AGGREGATE_CACHE:
+            return get_aggregates(snapshot)["estatisticas"]
+        df = load_despesas_csv(snapshot)
+        op_df = operadora_service.load_operadoras_csv(
+            snapshot
+        )  # Needed for razao_social if not in despesas
+        return _compute_estatisticas(df, op_df)
 
     else:
         # DB Logic
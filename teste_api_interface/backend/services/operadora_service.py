@@ -1,16 +1,32 @@
 import os
 import re
+import sys
 from typing import List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 from config import settings
 from models import Operadora as OperadoraModel
 from schemas.operadora import Operadora as OperadoraSchema
-from sqlalchemy import func
+from sqlalchemy import and_, func, or_
+from sqlalchemy.dialects.mysql import match
 from sqlalchemy.orm import Session
 
-# Cache global para CSV (simples)
-_operadoras_df = None
+from services import data_store, pagination, search_index
+
+# Shared CADOP parser/snapshot and CNPJ cache from the pipeline (teste_api_ans/)
+_PIPELINE_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", settings.PIPELINE_DIR)
+)
+if _PIPELINE_DIR not in sys.path:
+    sys.path.append(_PIPELINE_DIR)
+import cnpj_cache  # noqa: E402
+import operadoras_lookup  # noqa: E402
+
+SEARCH_COLUMNS = ["razao_social", "nome_fantasia"]
+# innodb_ft_min_token_size does not apply to the ngram parser; shorter terms
+# than ngram_token_size (default 2) never match a FULLTEXT ngram index
+MYSQL_NGRAM_TOKEN_SIZE = 2
 
 
 def _to_operadora_schema(item: object) -> OperadoraSchema:
@@ -85,64 +101,185 @@ def _coerce_optional_int(value):
     return None
 
 
-def load_operadoras_csv():
-    global _operadoras_df
-    if _operadoras_df is None:
-        base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-        csv_path = os.path.abspath(os.path.join(base_dir, settings.CSV_PATH_OPERADORAS))
-        # Assuming CSV structure matches expected.
-        # The CSV from Phase 2 uses ';' as separator
-        try:
-            _operadoras_df = pd.read_csv(
-                csv_path,
-                sep=";",
-                encoding="utf-8",
-                dtype={"cnpj": str, "registro_operadora": str},
+def _normalize_cnpjs(values: pd.Series) -> list:
+    return [
+        _coerce_optional_str(cnpj_cache.normalize_cnpj(str(value))) for value in values
+    ]
+
+
+def operadoras_csv_path() -> str:
+    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    return os.path.abspath(os.path.join(base_dir, settings.CSV_PATH_OPERADORAS))
+
+
+def reset_operadoras_cache():
+    # DataFrame and indexes live in the data store's snapshots
+    data_store.reset()
+
+
+def operadoras_cnpj_index(snapshot=None):
+    # Normalized CNPJ -> row positions in the operadoras DataFrame
+    def build(snap):
+        df = load_operadoras_csv(snap)
+        return cnpj_cache.build_cnpj_index(df["cnpj"]) if "cnpj" in df.columns else {}
+
+    return data_store.resolve(snapshot).get("operadoras_cnpj_index", build)
+
+
+def operadoras_search_index(snapshot=None):
+    # Accent-folded n-gram index over razao social, nome fantasia and CNPJ
+    def build(snap):
+        return search_index.build_search_index(
+            load_operadoras_csv(snap), SEARCH_COLUMNS
+        )
+
+    return data_store.resolve(snapshot).get("operadoras_search_index", build)
+
+
+def operadoras_sort_order(order_by: str, snapshot=None):
+    # Rows sorted by (key, registro_operadora, file position); razao social
+    # compares accent/case-folded, like the database's _ai_ci collation
+    def build(snap):
+        df = load_operadoras_csv(snap)
+        if "registro_operadora" in df.columns:
+            registro = pd.to_numeric(df["registro_operadora"], errors="coerce")
+        else:
+            registro = pd.Series(np.nan, index=df.index)
+        registro = registro.fillna(-1).astype(np.int64).to_numpy()
+        if order_by == "razao_social" and "razao_social" in df.columns:
+            key = np.array(
+                [search_index.fold_text(value) for value in df["razao_social"]],
+                dtype=str,
             )
-            _operadoras_df = _rename_operadoras_columns(_operadoras_df)
-            if "cnpj" in _operadoras_df.columns:
-                _operadoras_df["cnpj"] = _operadoras_df["cnpj"].apply(
-                    lambda x: _coerce_optional_str(re.sub(r"\D", "", str(x)))
-                )
-            if "registro_operadora" in _operadoras_df.columns:
-                _operadoras_df["registro_operadora"] = _operadoras_df[
-                    "registro_operadora"
-                ].apply(_coerce_optional_int)
-            string_cols = [
-                "razao_social",
-                "nome_fantasia",
-                "modalidade",
-                "logradouro",
-                "numero",
-                "complemento",
-                "bairro",
-                "cidade",
-                "uf",
-                "cep",
-                "ddd",
-                "telefone",
-                "fax",
-                "endereco_eletronico",
-                "representante",
-                "cargo_representante",
-                "regiao_de_comercializacao",
-                "data_registro_ans",
-            ]
-            for col in string_cols:
-                if col in _operadoras_df.columns:
-                    _operadoras_df[col] = _operadoras_df[col].apply(
-                        _coerce_optional_str
-                    )
-            # Simple cleanup for nan values to avoid Pydantic errors
-            _operadoras_df = _operadoras_df.where(pd.notnull(_operadoras_df), None)
-
-            # Map columns if necessary or ensure they match schema
-            # 'data_registro_ans' might need parsing to date object if Pydantic expects date
-            # But let's keep it simple for now, Pydantic might valid strings as dates provided they are ISO8601
-        except Exception as e:
-            print(f"Error loading CSV: {e}")
-            _operadoras_df = pd.DataFrame()
-    return _operadoras_df
+        else:
+            key = registro
+        order = np.lexsort((np.arange(len(df)), registro, key))
+        return order, key[order], registro[order]
+
+    return data_store.resolve(snapshot).get(f"operadoras_order_{order_by}", build)
+
+
+def warm_snapshot(snapshot):
+    # Everything the CSV mode reads from operadoras, built before a reload is
+    # swapped in
+    load_operadoras_csv(snapshot)
+    operadoras_cnpj_index(snapshot)
+    operadoras_search_index(snapshot)
+    for order_by in pagination.ORDER_KEYS:
+        operadoras_sort_order(order_by, snapshot)
+
+
+def _keyset_start(order_by: str, last: list, snapshot) -> int:
+    # Index in the sorted rows right after the cursor's (key, registro, position)
+    order, keys, registros = operadoras_sort_order(order_by, snapshot)
+    if len(last) != 3:
+        raise pagination.InvalidCursor("Invalid cursor")
+    key, registro, position = last
+    try:
+        lo = np.searchsorted(keys, key, side="left")
+        hi = np.searchsorted(keys, key, side="right")
+        same_key = registros[lo:hi]
+        lo, hi = (
+            lo + np.searchsorted(same_key, registro, side="left"),
+            lo + np.searchsorted(same_key, registro, side="right"),
+        )
+        return int(lo + np.searchsorted(order[lo:hi], position, side="right"))
+    except (TypeError, ValueError) as e:
+        raise pagination.InvalidCursor("Invalid cursor") from e
+
+
+def _keyset_after(column, key, registro, last_registro, nulls_first: bool):
+    # Rows after (key, last_registro) in ORDER BY column, registro_operadora.
+    # razao_social is nullable and "column > NULL" matches nothing, so NULL
+    # keys are compared explicitly; the order itself stays index-friendly
+    if key is None:
+        after = and_(column.is_(None), registro > last_registro)
+        return or_(after, column.is_not(None)) if nulls_first else after
+    after = or_(column > key, and_(column == key, registro > last_registro))
+    return after if nulls_first else or_(after, column.is_(None))
+
+
+def _search_filter(db: Session, search: str):
+    # FULLTEXT (ngram parser) on MySQL and trigram-indexed ILIKE on PostgreSQL
+    # for names; CNPJ-like terms use a prefix LIKE that can use idx_operadoras_cnpj
+    digits = search_index.cnpj_term(search)
+    if digits:
+        return OperadoraModel.cnpj.like(f"{digits}%"), None
+    term = search.strip()
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql" and len(term) >= MYSQL_NGRAM_TOKEN_SIZE:
+        # Quoted phrase: rows containing the term's n-grams in sequence
+        phrase = '"{}"'.format(term.replace('"', " "))
+        relevance = match(
+            OperadoraModel.razao_social,
+            OperadoraModel.nome_fantasia,
+            against=phrase,
+        ).in_boolean_mode()
+        return relevance, relevance.desc()
+    return (
+        or_(
+            OperadoraModel.razao_social.ilike(f"%{term}%"),
+            OperadoraModel.nome_fantasia.ilike(f"%{term}%"),
+        ),
+        None,
+    )
+
+
+def _read_operadoras_csv(snapshot):
+    csv_path = operadoras_csv_path()
+    # Assuming CSV structure matches expected.
+    # The CSV from Phase 2 uses ';' as separator
+    try:
+        df = operadoras_lookup.load_lookup(csv_path).to_frame()
+        df = _rename_operadoras_columns(df)
+        if "cnpj" in df.columns:
+            # Normalize each distinct CNPJ once, then map back to the rows
+            df["cnpj"] = cnpj_cache.map_distinct(df["cnpj"], _normalize_cnpjs, None)
+        if "registro_operadora" in df.columns:
+            df["registro_operadora"] = df["registro_operadora"].apply(
+                _coerce_optional_int
+            )
+        string_cols = [
+            "razao_social",
+            "nome_fantasia",
+            "modalidade",
+            "logradouro",
+            "numero",
+            "complemento",
+            "bairro",
+            "cidade",
+            "uf",
+            "cep",
+            "ddd",
+            "telefone",
+            "fax",
+            "endereco_eletronico",
+            "representante",
+            "cargo_representante",
+            "regiao_de_comercializacao",
+            "data_registro_ans",
+        ]
+        for col in string_cols:
+            if col in df.columns:
+                df[col] = df[col].apply(_coerce_optional_str)
+        # Simple cleanup for nan values to avoid Pydantic errors
+        # (object dtype first: string columns would turn None back into NaN)
+        df = df.astype(object)
+        df = df.where(pd.notnull(df), None)
+
+        # Map columns if necessary or ensure they match schema
+        # 'data_registro_ans' might need parsing to date object if Pydantic expects date
+        # But let's keep it simple for now, Pydantic might valid strings as dates provided they are ISO8601
+    except Exception as e:
+        if snapshot.strict:
+            raise
+        print(f"Error loading CSV: {e}")
+        df = pd.DataFrame()
+    return df
+
+
+def load_operadoras_csv(snapshot=None):
+    return data_store.resolve(snapshot).get("operadoras_df", _read_operadoras_csv)
 
 
 def get_operadoras(
@@ -151,7 +288,8 @@ def get_operadoras(
     offset = (page - 1) * limit
 
     if settings.USE_CSV:
-        df = load_operadoras_csv()
+        snapshot = data_store.current()
+        df = load_operadoras_csv(snapshot)
         if "razao_social" not in df.columns:
             df["razao_social"] = ""
         if "cnpj" not in df.columns:
@@ -159,23 +297,17 @@ def get_operadoras(
 
         # Filtering
         if search:
-            # Case insensitive search in razao_social OR cnpj
-            search_clean = search.lower().strip()
-            # For dataframes we can do boolean indexing
-            # We check if razao_social contains search OR cnpj contains search
-            df = df[
-                df["razao_social"].str.lower().str.contains(search_clean, na=False)
-                | df["cnpj"].str.contains(search_clean, na=False)
-            ]
-
-        total = len(df)
-
-        # Pagination
-        # Ensure we don't go out of bounds
-        start = offset
-        end = offset + limit
-
-        paginated_df = df.iloc[start:end]
+            # Ranked matches from the search index built at load time
+            # (accent and case insensitive, over razao social, nome fantasia
+            # and CNPJ); the total is exact without scanning the DataFrame
+            positions = operadoras_search_index(snapshot).search(search)
+            total = len(positions)
+            paginated_df = df.iloc[positions[offset : offset + limit]]
+        else:
+            total = len(df)
+            # Pagination
+            # Ensure we don't go out of bounds
+            paginated_df = df.iloc[offset : offset + limit]
 
         # Convert to list of dicts
         data = paginated_df.to_dict(orient="records")
@@ -189,26 +321,110 @@ def get_operadoras(
         # Database logic
         query = db.query(OperadoraModel)
 
+        order_by = None
         if search:
-            from sqlalchemy import or_
-
-            query = query.filter(
-                or_(
-                    OperadoraModel.razao_social.ilike(f"%{search}%"),
-                    OperadoraModel.cnpj.ilike(f"%{search}%"),
-                )
-            )
+            condition, order_by = _search_filter(db, search)
+            query = query.filter(condition)
 
         total = query.count()
+        if order_by is not None:
+            query = query.order_by(order_by)
         operadoras = query.offset(offset).limit(limit).all()
         operadoras_schema = [_to_operadora_schema(item) for item in operadoras]
 
         return operadoras_schema, total
 
 
+def get_operadoras_keyset(
+    db: Session,
+    limit: int = 10,
+    order_by: Optional[str] = None,
+    cursor: Optional[str] = None,
+    search: Optional[str] = None,
+    with_total: bool = True,
+) -> Tuple[List[OperadoraSchema], Optional[int], Optional[str]]:
+    # Cursor pagination: the cursor carries order and search, so follow-up
+    # requests only send it back; raises pagination.InvalidCursor
+    last = None
+    if cursor:
+        payload = pagination.decode_cursor(cursor)
+        if (order_by and order_by != payload["o"]) or (
+            search and search != payload["s"]
+        ):
+            raise pagination.InvalidCursor("Cursor does not match the query")
+        order_by, search, last = payload["o"], payload["s"], payload["k"]
+    order_by = order_by or "registro_operadora"
+    if order_by not in pagination.ORDER_KEYS:
+        raise pagination.InvalidCursor(f"Invalid order_by: {order_by}")
+
+    if settings.USE_CSV:
+        snapshot = data_store.current()
+        df = load_operadoras_csv(snapshot)
+        order, keys, registros = operadoras_sort_order(order_by, snapshot)
+        start = _keyset_start(order_by, last, snapshot) if last is not None else 0
+        if search:
+            positions = operadoras_search_index(snapshot).search(search)
+            total = len(positions)
+            # Matches in sort order, from the cursor on
+            matched = np.zeros(len(df), dtype=bool)
+            matched[positions] = True
+            rows = np.flatnonzero(matched[order[start:]])[: limit + 1] + start
+        else:
+            total = len(df)
+            rows = np.arange(start, min(start + limit + 1, len(order)))
+        next_cursor = None
+        if len(rows) > limit:
+            idx = rows[limit - 1]
+            key = keys[idx].item()
+            next_cursor = pagination.encode_cursor(
+                order_by, search, [key, int(registros[idx]), int(order[idx])]
+            )
+        data = df.iloc[order[rows[:limit]]].to_dict(orient="records")
+        operadoras = [_to_operadora_schema(item) for item in data]
+        return operadoras, total if with_total else None, next_cursor
+
+    # registro_operadora is the model's primary key: a unique tiebreaker, so
+    # "after the cursor" is a seek on (key, registro_operadora)
+    query = db.query(OperadoraModel)
+    if search:
+        condition, _ = _search_filter(db, search)
+        query = query.filter(condition)
+    total = None
+    if with_total:
+        total = pagination.cached_count(
+            ("operadoras", search or None), settings.COUNT_CACHE_TTL, query.count
+        )
+    registro = OperadoraModel.registro_operadora
+    if order_by == "registro_operadora":
+        if last is not None:
+            query = query.filter(registro > last[-1])
+        query = query.order_by(registro)
+    else:
+        column = getattr(OperadoraModel, order_by)
+        if last is not None:
+            if len(last) != 2:
+                raise pagination.InvalidCursor("Invalid cursor")
+            # PostgreSQL sorts NULLs last, MySQL and SQLite first
+            nulls_first = db.get_bind().dialect.name != "postgresql"
+            query = query.filter(
+                _keyset_after(column, last[0], registro, last[1], nulls_first)
+            )
+        query = query.order_by(column, registro)
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        tail = rows[limit - 1]
+        key = [tail.registro_operadora]
+        if order_by != "registro_operadora":
+            key = [getattr(tail, order_by), tail.registro_operadora]
+        next_cursor = pagination.encode_cursor(order_by, search, key)
+    return [_to_operadora_schema(item) for item in rows[:limit]], total, next_cursor
+
+
 def get_operadora_by_cnpj(db: Session, cnpj: str):
     if settings.USE_CSV:
-        df = load_operadoras_csv()
+        snapshot = data_store.current()
+        df = load_operadoras_csv(snapshot)
         # Clean CNPJ input just in case
         clean_cnpj = "".join(filter(str.isdigit, cnpj))
         # Assuming CSV has numbers only or formatted?
@@ -217,12 +433,10 @@ def get_operadora_by_cnpj(db: Session, cnpj: str):
         # Let's try direct match first.
         if "cnpj" not in df.columns:
             return None
-        result = df[
-            df["cnpj"].apply(lambda x: "".join(filter(str.isdigit, str(x))))
-            == clean_cnpj
-        ]
-        if result.empty:
+        # O(1) lookup in the CNPJ index built at load time
+        positions = operadoras_cnpj_index(snapshot).get(clean_cnpj)
+        if positions is None:
             return None
-        return result.iloc[0].to_dict()
+        return df.iloc[positions[0]].to_dict()
     else:
         return db.query(OperadoraModel).filter(OperadoraModel.cnpj == cnpj).first()
@@ -0,0 +1,64 @@
+import base64
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Keyset (cursor) pagination for GET /api/operadoras/: rows are ordered by
+# (key, registro_operadora) and a page starts right after the last row of the
+# previous one, so deep pages cost the same as the first.
+ORDER_KEYS = ["registro_operadora", "razao_social"]
+CURSOR_VERSION = 1
+# Distinct (listing, search) totals kept by cached_count
+COUNT_CACHE_SIZE = 1024
+
+_counts: Dict[Any, tuple] = {}
+_counts_lock = threading.Lock()
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(order_by: str, search: Optional[str], last: List[Any]) -> str:
+    # Opaque to clients: order, search term and sort key of the last row sent
+    payload = {"v": CURSOR_VERSION, "o": order_by, "s": search or None, "k": last}
+    raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw.decode("utf-8"))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+    if (
+        not isinstance(payload, dict)
+        or payload.get("v") != CURSOR_VERSION
+        or payload.get("o") not in ORDER_KEYS
+        or not isinstance(payload.get("k"), list)
+        or not payload["k"]
+    ):
+        raise InvalidCursor("Invalid cursor")
+    return payload
+
+
+def cached_count(key: Any, ttl: float, count: Callable[[], int]) -> int:
+    # COUNT(*) of a filtered listing, recomputed at most every ttl seconds
+    now = time.monotonic()
+    with _counts_lock:
+        cached = _counts.get(key)
+    if cached is not None and now - cached[1] < ttl:
+        return cached[0]
+    total = count()
+    with _counts_lock:
+        if len(_counts) >= COUNT_CACHE_SIZE:
+            _counts.clear()
+        _counts[key] = (total, now)
+    return total
+
+
+def reset_counts():
+    with _counts_lock:
+        _counts.clear()
@@ -0,0 +1,139 @@
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Substring search over short texts (razao social, nome fantasia, CNPJ).
+# Every 1..GRAM_SIZE-character gram of a row's folded text maps to the sorted
+# positions of the rows containing it: terms up to GRAM_SIZE characters are
+# answered by a single posting list, longer terms intersect the postings of
+# their grams and only the surviving candidates are checked with `in`.
+GRAM_SIZE = 3
+SEARCH_CACHE_SIZE = 1024
+# Fields are joined with a separator no search term contains, so grams never
+# span two fields
+FIELD_SEP = "\x00"
+_EMPTY = np.empty(0, dtype=np.int64)
+_CNPJ_TERM = re.compile(r"[\d\s./-]+")
+
+# Ranking: exact CNPJ, field prefix, word prefix, anywhere
+RANK_CNPJ, RANK_PREFIX, RANK_WORD, RANK_SUBSTRING = range(4)
+
+
+def fold_text(value) -> str:
+    # Lowercase, strip accents and collapse whitespace ("São  Paulo" -> "sao paulo");
+    # characters with no ASCII decomposition are dropped
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ""
+    text = str(value).replace(FIELD_SEP, " ")
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+    return " ".join(text.lower().split())
+
+
+def cnpj_term(term: str) -> str:
+    # Digits of a term that looks like a (possibly formatted) CNPJ
+    if not _CNPJ_TERM.fullmatch(term.strip()):
+        return ""
+    return re.sub(r"\D", "", term)
+
+
+def _grams(fields: Iterable[str], sizes: Iterable[int]) -> set:
+    return {
+        field[i : i + size]
+        for field in fields
+        for size in sizes
+        for i in range(len(field) - size + 1)
+    }
+
+
+class SearchIndex:
+    def __init__(self, texts: Iterable[str], cnpjs: Iterable[str]):
+        docs: List[str] = []
+        grams: List[str] = []
+        positions: List[int] = []
+        sizes = range(1, GRAM_SIZE + 1)
+        for pos, (text, cnpj) in enumerate(zip(texts, cnpjs)):
+            doc = f"{text}{FIELD_SEP}{cnpj or ''}"
+            docs.append(doc)
+            row_grams = _grams(doc.split(FIELD_SEP), sizes)
+            grams.extend(row_grams)
+            positions.extend([pos] * len(row_grams))
+        # Fixed-width arrays so matching and ranking candidates run in numpy
+        self.docs = np.array(docs, dtype=str)
+        self.cnpjs = np.array([cnpj or "" for cnpj in cnpjs], dtype=str)
+
+        # Group the (gram, row) pairs by gram; a stable sort keeps each
+        # posting list in row order
+        codes, uniques = pd.factorize(pd.Series(grams, dtype=object))
+        order = np.argsort(codes, kind="stable")
+        rows = np.asarray(positions, dtype=np.int64)[order]
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        self.postings = {
+            gram: rows[bounds[idx] : bounds[idx + 1]]
+            for idx, gram in enumerate(uniques)
+        }
+        self.search = lru_cache(maxsize=SEARCH_CACHE_SIZE)(self._search)
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def _match(self, term: str) -> np.ndarray:
+        if len(term) <= GRAM_SIZE:
+            return self.postings.get(term, _EMPTY)
+        lists = []
+        for gram in _grams([term], [GRAM_SIZE]):
+            posting = self.postings.get(gram)
+            if posting is None:
+                return _EMPTY
+            lists.append(posting)
+        lists.sort(key=len)
+        candidates = lists[0]
+        for posting in lists[1:]:
+            if len(candidates) == 0:
+                return _EMPTY
+            candidates = np.intersect1d(candidates, posting, assume_unique=True)
+        return candidates[np.char.find(self.docs[candidates], term) >= 0]
+
+    def _rank(self, matches: np.ndarray, term: str, digits: str) -> np.ndarray:
+        docs = self.docs[matches]
+        ranks = np.full(len(matches), RANK_SUBSTRING, dtype=np.int8)
+        ranks[np.char.find(docs, f" {term}") >= 0] = RANK_WORD
+        prefix = np.char.startswith(docs, term)
+        prefix |= np.char.find(docs, f"{FIELD_SEP}{term}") >= 0
+        ranks[prefix] = RANK_PREFIX
+        if digits:
+            ranks[self.cnpjs[matches] == digits] = RANK_CNPJ
+        return ranks
+
+    def _search(self, query: str) -> np.ndarray:
+        # Row positions matching query, best ranked first (ties in row order)
+        term = fold_text(query)
+        if not term:
+            return np.arange(len(self.docs), dtype=np.int64)
+        matches = self._match(term)
+        digits = cnpj_term(query)
+        if digits and digits != term:
+            matches = np.union1d(matches, self._match(digits))
+        if len(matches) == 0:
+            return _EMPTY
+        ranks = self._rank(matches, term, digits)
+        return matches[np.lexsort((matches, ranks))]
+
+
+def build_search_index(
+    df: pd.DataFrame, text_columns: List[str], cnpj_column: Optional[str] = "cnpj"
+) -> SearchIndex:
+    columns = [col for col in text_columns if col in df.columns]
+    texts = [
+        FIELD_SEP.join(fold_text(value) for value in row)
+        for row in df[columns].itertuples(index=False, name=None)
+    ]
+    if cnpj_column in df.columns:
+        cnpjs = df[cnpj_column].tolist()
+    else:
+        cnpjs = [""] * len(df)
+    return SearchIndex(texts, cnpjs)
@@ -59,3 +59,253 @@ def test_estatisticas_gerais():
     assert "total_geral" in data
     assert "media_trimestral" in data
     assert "top_5_operadoras" in data
+
+
+@pytest.fixture
+def csv_data(tmp_path, monkeypatch):
+    from services import despesa_service
+
+    operadoras = tmp_path / "operadoras.csv"
+    operadoras.write_text(
+        "Registro_Operadora;CNPJ;Razao_Social;UF\n"
+        "1;11222333000181;OPERADORA A;SP\n"
+        "2;11444777000161;OPERADORA B;MG\n",
+        encoding="utf-8",
+    )
+    despesas = tmp_path / "despesas.csv"
+    despesas.write_text(
+        "CNPJ,RazaoSocial,Trimestre,Ano,ValorDespesas\n"
+        "11222333000181,OPERADORA A,1,2024,100.0\n"
+        "11444777000161,OPERADORA B,1,2024,50.0\n",
+        encoding="utf-8",
+    )
+    monkeypatch.setattr(settings, "USE_CSV", True)
+    monkeypatch.setattr(settings, "CSV_AGGREGATE_CACHE", True)
+    monkeypatch.setattr(settings, "CSV_PATH_OPERADORAS", str(operadoras))
+    monkeypatch.setattr(settings, "CSV_PATH_DESPESAS", str(despesas))
+    despesa_service.reset_despesas_cache()
+    operadora_service.reset_operadoras_cache()
+    yield despesas
+    despesa_service.reset_despesas_cache()
+    operadora_service.reset_operadoras_cache()
+
+
+def test_aggregates_follow_csv_version(csv_data, monkeypatch):
+    """Testa que os agregados pre-calculados acompanham a versao dos CSVs"""
+    from services import despesa_service
+
+    por_uf = client.get("/api/despesas/por-uf").json()
+    assert {row["uf"]: row["total_despesas"] for row in por_uf} == {
+        "MG": 50.0,
+        "SP": 100.0,
+    }
+    assert client.get("/api/estatisticas").json()["total_geral"] == 150.0
+
+    def fail(*args):
+        raise AssertionError("agregados recalculados sem mudanca nos CSVs")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(despesa_service, "_compute_expenses_by_uf", fail)
+        patch.setattr(despesa_service, "_compute_estatisticas", fail)
+        assert client.get("/api/despesas/por-uf").status_code == 200
+        assert client.get("/api/estatisticas").status_code == 200
+
+    with open(csv_data, "a", encoding="utf-8") as f:
+        f.write("11444777000161,OPERADORA B,2,2024,25.0\n")
+    stats = client.get("/api/estatisticas").json()
+    assert stats["total_geral"] == 175.0
+    assert stats["top_5_operadoras"][1] == {
+        "razao_social": "OPERADORA B",
+        "total_despesas": 75.0,
+    }
+
+
+def test_cnpj_lookups_use_index(csv_data, monkeypatch):
+    """Testa as buscas por CNPJ via indice, sem varrer o DataFrame"""
+    with open(csv_data, "a", encoding="utf-8") as f:
+        f.write("11.444.777/0001-61,OPERADORA B,2,2024,25.0\n")
+
+    def fail(*args):
+        raise AssertionError("busca por CNPJ varreu a coluna inteira")
+
+    operadora_service.operadoras_cnpj_index()
+    from services import despesa_service
+
+    despesa_service.despesas_cnpj_index()
+    monkeypatch.setattr(operadora_service.cnpj_cache, "normalize_cnpjs", fail)
+
+    response = client.get("/api/operadoras/11444777000161")
+    assert response.status_code == 200
+    assert response.json()["razao_social"] == "OPERADORA B"
+    assert client.get("/api/operadoras/99999999000199").status_code == 404
+
+    despesas = client.get("/api/despesas/operadora/11444777000161").json()
+    assert [row["valor_despesas"] for row in despesas] == [50.0, 25.0]
+    assert client.get("/api/despesas/operadora/99999999000199").json() == []
+
+
+def test_search_operadoras_index(csv_data, monkeypatch):
+    """Testa a busca indexada: acentos, nome fantasia, CNPJ formatado e ranking"""
+    with open(settings.CSV_PATH_OPERADORAS, "w", encoding="utf-8") as f:
+        f.write(
+            "Registro_Operadora;CNPJ;Razao_Social;Nome_Fantasia;UF\n"
+            "1;11222333000181;ASSOCIAÇÃO SAÚDE;;SP\n"
+            "2;11444777000161;UNIMED SÃO PAULO;SAUDE SP;MG\n"
+            "3;19541931000125;SAUDEVIDA LTDA;;RJ\n"
+        )
+    operadora_service.reset_operadoras_cache()
+    operadora_service.operadoras_search_index()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("busca varreu o DataFrame")
+
+    monkeypatch.setattr("pandas.Series.str", property(fail))
+
+    def search(term, limit=10):
+        response = client.get(f"/api/operadoras/?search={term}&limit={limit}")
+        assert response.status_code == 200
+        return response.json()
+
+    payload = search("saude")
+    assert [row["registro_operadora"] for row in payload["data"]] == [2, 3, 1]
+    assert payload["total"] == 3
+    assert search("saude", limit=1)["total"] == 3
+    assert [row["registro_operadora"] for row in search("são")["data"]] == [2]
+    assert [row["registro_operadora"] for row in search("aud")["data"]] == [1, 2, 3]
+    assert search("11.444.777/0001-61")["data"][0]["registro_operadora"] == 2
+    assert search("1954")["total"] == 1
+    assert search("inexistente")["total"] == 0
+
+
+def test_operadoras_cursor_pagination(csv_data):
+    """Testa a paginacao por cursor (keyset) nas duas ordenacoes"""
+    with open(settings.CSV_PATH_OPERADORAS, "w", encoding="utf-8") as f:
+        f.write("Registro_Operadora;CNPJ;Razao_Social;UF\n")
+        for registro, nome in [(5, "Beta"), (2, "ÁGUA"), (9, "beta"), (1, "Zeta")]:
+            f.write(f"{registro};{registro:014d};{nome};SP\n")
+        f.write("7;00000000000007;Alfa;SP\n")
+    operadora_service.reset_operadoras_cache()
+
+    def walk(params):
+        pages, url = [], f"/api/operadoras/?limit=2&{params}"
+        while url:
+            payload = client.get(url).json()
+            pages.append([row["registro_operadora"] for row in payload["data"]])
+            cursor = payload["next_cursor"]
+            url = f"/api/operadoras/?limit=2&cursor={cursor}" if cursor else None
+        return pages, payload
+
+    pages, last = walk("order_by=registro_operadora")
+    assert pages == [[1, 2], [5, 7], [9]]
+    assert last["total"] == 5 and last["page"] is None
+    pages, _ = walk("order_by=razao_social")
+    assert pages == [[2, 7], [5, 9], [1]]
+    pages, last = walk("order_by=razao_social&search=beta&with_total=false")
+    assert pages == [[5, 9]]
+    assert last["total"] is None and last["total_pages"] is None
+
+    first = client.get("/api/operadoras/?limit=2&order_by=razao_social").json()
+    response = client.get(
+        f"/api/operadoras/?cursor={first['next_cursor']}&order_by=registro_operadora"
+    )
+    assert response.status_code == 400
+    assert client.get("/api/operadoras/?cursor=invalido").status_code == 400
+    # Offset pagination is unchanged
+    page = client.get("/api/operadoras/?page=2&limit=2").json()
+    assert page["page"] == 2 and page["total_pages"] == 3
+    assert page["next_cursor"] is None
+
+
+def test_operadoras_cursor_null_keys(monkeypatch):
+    """Testa a paginacao por cursor no banco com razao_social nula"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from database import Base
+    from models import Operadora
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[Operadora.__table__])
+    db = sessionmaker(bind=engine)()
+    for registro, nome in [(4, None), (2, "Beta"), (3, None), (1, "Alfa"), (5, None)]:
+        db.add(
+            Operadora(
+                registro_operadora=registro, cnpj=f"{registro:014d}", razao_social=nome
+            )
+        )
+    db.commit()
+    monkeypatch.setattr(settings, "USE_CSV", False)
+
+    pages, cursor = [], None
+    while True:
+        rows, _, cursor = operadora_service.get_operadoras_keyset(
+            db, limit=2, order_by="razao_social", cursor=cursor, with_total=False
+        )
+        pages.append([row.registro_operadora for row in rows])
+        if cursor is None:
+            break
+    db.close()
+    assert pages == [[3, 4], [5, 1], [2]]
+
+
+def test_data_store_hot_reload(csv_data, monkeypatch):
+    """Testa o recarregamento em segundo plano sem bloquear as requisicoes"""
+    import threading
+    import time
+
+    from services import data_store, despesa_service
+
+    data_store.start(poll_interval=0.05)
+    assert data_store.wait_ready(timeout=10)
+    health = client.get("/").json()["data"]
+    assert health["state"] == "ready" and health["reloads"] == 1
+    assert client.get("/api/estatisticas").json()["total_geral"] == 150.0
+
+    building, release = threading.Event(), threading.Event()
+    compute = despesa_service._compute_estatisticas
+
+    def slow_compute(*args):
+        building.set()
+        release.wait(10)
+        return compute(*args)
+
+    monkeypatch.setattr(despesa_service, "_compute_estatisticas", slow_compute)
+    with open(csv_data, "a", encoding="utf-8") as f:
+        f.write("11444777000161,OPERADORA B,2,2024,25.0\n")
+    assert building.wait(10)
+    # Reload in progress: the previous snapshot keeps being served
+    start = time.perf_counter()
+    assert client.get("/api/estatisticas").json()["total_geral"] == 150.0
+    assert client.get("/").json()["data"]["version"] == health["version"]
+    assert time.perf_counter() - start < 5
+    release.set()
+
+    deadline = time.monotonic() + 10
+    while client.get("/").json()["data"]["reloads"] < 2:
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    assert client.get("/").json()["data"]["version"] != health["version"]
+    assert client.get("/api/estatisticas").json()["total_geral"] == 175.0
+    response = client.get("/api/despesas/operadora/11444777000161")
+    assert [row["valor_despesas"] for row in response.json()] == [50.0, 25.0]
+
+
+def test_data_store_keeps_snapshot_on_failed_reload(csv_data):
+    """Testa que uma falha de leitura mantem o snapshot anterior"""
+    import os
+    import time
+
+    from services import data_store
+
+    data_store.start(poll_interval=0.05)
+    assert data_store.wait_ready(timeout=10)
+    os.remove(operadora_service.operadoras_csv_path())
+
+    deadline = time.monotonic() + 10
+    while client.get("/").json()["data"]["last_error"] is None:
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    health = client.get("/").json()["data"]
+    assert health["state"] == "ready" and health["reloads"] == 1
+    assert len(operadora_service.load_operadoras_csv()) == 2
+    assert client.get("/api/estatisticas").json()["total_geral"] == 150.0
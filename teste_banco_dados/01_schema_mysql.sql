@@ -15,7 +15,7 @@ CREATE TABLE operadoras (
   operadora_id BIGINT AUTO_INCREMENT PRIMARY KEY,
   registro_operadora INT,
   cnpj CHAR(14),
-  razao_social TEXT,
+  razao_social VARCHAR(255),
   nome_fantasia TEXT,
   modalidade VARCHAR(120),
   logradouro TEXT,
@@ -35,7 +35,12 @@ CREATE TABLE operadoras (
   data_registro_ans DATE,
   KEY idx_operadoras_cnpj (cnpj),
   KEY idx_operadoras_registro (registro_operadora),
-  KEY idx_operadoras_uf (uf)
+  KEY idx_operadoras_uf (uf),
+  -- Paginacao por cursor da API ordenada por razao social (keyset)
+  KEY idx_operadoras_razao_registro (razao_social, registro_operadora),
+  -- Busca por nome da API (?search=); o parser ngram casa trechos de palavras
+  -- e a collation _ai_ci ignora acentos e caixa
+  FULLTEXT KEY ft_operadoras_nome (razao_social, nome_fantasia) WITH PARSER ngram
 ) ENGINE=InnoDB;
 
 CREATE TABLE consolidado_despesas (
@@ -34,6 +34,12 @@ CREATE TABLE operadoras (
 CREATE INDEX idx_operadoras_cnpj ON operadoras (cnpj);
 CREATE INDEX idx_operadoras_registro ON operadoras (registro_operadora);
 CREATE INDEX idx_operadoras_uf ON operadoras (uf);
+-- Paginacao por cursor da API ordenada por razao social (keyset)
+CREATE INDEX idx_operadoras_razao_registro ON operadoras (razao_social, registro_operadora);
+-- Busca por nome da API (?search=): ILIKE '%termo%' usa os indices de trigramas
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX idx_operadoras_nome_trgm ON operadoras
+  USING gin (razao_social gin_trgm_ops, nome_fantasia gin_trgm_ops);
 
 CREATE TABLE consolidado_despesas (
   despesa_id BIGSERIAL PRIMARY KEY,
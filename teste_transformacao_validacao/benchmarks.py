@@ -0,0 +1,219 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import run_transformation
+
+
+def build_synthetic_cnpjs(rows, seed=0):
+    # Metade valida, metade com o ultimo digito trocado; 1/4 com mascara
+    rng = np.random.default_rng(seed)
+    base = rng.integers(0, 10, size=(rows, 12), dtype=np.int16)
+    dv1 = run_transformation.digito_verificador(base, run_transformation.PESOS_DV1)
+    matriz = np.column_stack([base, dv1])
+    dv2 = run_transformation.digito_verificador(matriz, run_transformation.PESOS_DV2)
+    dv2[1::2] = (dv2[1::2] + 1) % 10
+    matriz = np.column_stack([matriz, dv2]).astype(np.uint8) + ord("0")
+    cnpjs = matriz.view("S14").ravel().astype(str).astype(object)
+    cnpjs[::4] = [f"{c[:2]}.{c[2:5]}.{c[5:8]}/{c[8:12]}-{c[12:]}" for c in cnpjs[::4]]
+    return pd.Series(cnpjs, dtype="str")
+
+
+def bench_validacao(args):
+    if args.distinct:
+        # Poucas operadoras repetidas em muitas linhas, como no consolidado
+        pool = build_synthetic_cnpjs(args.distinct)
+        codes = np.random.default_rng(1).integers(0, args.distinct, size=args.rows)
+        cnpjs = pool.take(codes).reset_index(drop=True)
+    else:
+        cnpjs = build_synthetic_cnpjs(args.rows)
+    ratio = cnpjs.nunique() / args.rows
+    print(f"{args.rows:,} CNPJs sinteticos ({ratio:.4%} distintos)")
+
+    start = time.perf_counter()
+    direto = run_transformation.validar_cnpjs_distintos(cnpjs)
+    elapsed_direct = time.perf_counter() - start
+    print(
+        f"matriz sem deduplicar: {elapsed_direct:.2f}s "
+        f"({args.rows / elapsed_direct:,.0f} linhas/s)"
+    )
+
+    start = time.perf_counter()
+    vetorizado = run_transformation.validar_cnpj_vetorizado(cnpjs)
+    elapsed_vec = time.perf_counter() - start
+    assert (direto == vetorizado).all(), "divergencia"
+    print(
+        f"vetorizado (distintos + codigos): {elapsed_vec:.2f}s "
+        f"({args.rows / elapsed_vec:,.0f} linhas/s, {int(vetorizado.sum()):,} "
+        f"validos, economia {elapsed_direct - elapsed_vec:.2f}s)"
+    )
+
+    sample = cnpjs.sample(min(args.sample, args.rows), random_state=0)
+    start = time.perf_counter()
+    # Referencia escalar sem o cache de cnpj_cache (validar_cnpj original)
+    escalar = sample.astype(object).map(
+        lambda valor: run_transformation.cnpj_cache.is_valid_cnpj.__wrapped__(
+            str(valor)
+        )
+    )
+    elapsed_apply = time.perf_counter() - start
+    assert (escalar.to_numpy() == vetorizado[sample.index]).all(), "divergencia"
+    estimate = elapsed_apply * args.rows / len(sample)
+    label = "apply" if len(sample) == args.rows else f"apply ({len(sample):,} amostras)"
+    print(
+        f"{label}: {elapsed_apply:.2f}s -> {estimate:.2f}s estimado para "
+        f"{args.rows:,} linhas (speedup {estimate / elapsed_vec:.1f}x)"
+    )
+
+
+# Executa o main() num interpretador novo e imprime o pico de RSS (VmHWM, em
+# KiB) apos os imports e no fim; ru_maxrss nao serve aqui porque e herdado do
+# processo pai atraves do exec
+PEAK_RSS_SCRIPT = """
+import contextlib, io, sys
+import run_transformation
+def vmhwm():
+    with open("/proc/self/status") as f:
+        return next(l.split()[1] for l in f if l.startswith("VmHWM:"))
+antes = vmhwm()
+with contextlib.redirect_stdout(io.StringIO()):
+    run_transformation.main(sys.argv[1:])
+print(antes, vmhwm())
+"""
+
+
+def build_synthetic_pipeline(root, rows, distinct=1_500):
+    # Consolidado (8 trimestres) e CADOP sinteticos nos caminhos relativos
+    # usados por run_transformation
+    pool = build_synthetic_cnpjs(distinct)
+    cadop_path = os.path.join(root, run_transformation.OPERADORAS_CADOP_PATH)
+    os.makedirs(os.path.dirname(cadop_path), exist_ok=True)
+    with open(cadop_path, "w", encoding="utf-8") as f:
+        f.write("REGISTRO_OPERADORA;CNPJ;Razao_Social;Modalidade;UF\n")
+        for idx, cnpj in enumerate(pool):
+            f.write(f"{300000 + idx};{cnpj};OPERADORA {idx};Medicina de Grupo;SP\n")
+
+    csv_path = os.path.join(root, run_transformation.CONSOLIDATED_CSV_PATH)
+    os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+    os.makedirs(os.path.join(root, "teste_transformacao_validacao"), exist_ok=True)
+    rng = np.random.default_rng(2)
+    with open(csv_path, "w", encoding="utf-8") as f:
+        f.write("CNPJ,RazaoSocial,Trimestre,Ano,ValorDespesas\n")
+        for inicio in range(0, rows, 500_000):
+            n = min(500_000, rows - inicio)
+            codes = rng.integers(0, distinct, size=n)
+            trimestres = (np.arange(inicio, inicio + n) * 8 // rows) % 4 + 1
+            anos = 2023 + (np.arange(inicio, inicio + n) * 8 // rows) // 4
+            valores = rng.uniform(1, 1e6, size=n).round(2)
+            bloco = pd.DataFrame(
+                {
+                    "CNPJ": pool.take(codes).to_numpy(),
+                    "RazaoSocial": [f"OPERADORA {c}" for c in codes],
+                    "Trimestre": trimestres,
+                    "Ano": anos,
+                    "ValorDespesas": valores,
+                }
+            )
+            bloco.to_csv(f, header=False, index=False)
+
+
+def peak_rss(root, argv):
+    env = dict(os.environ, ANS_OFFLINE="1")
+    env["PYTHONPATH"] = os.pathsep.join(
+        [os.path.dirname(os.path.abspath(__file__)), env.get("PYTHONPATH", "")]
+    )
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", PEAK_RSS_SCRIPT, *argv],
+        cwd=root,
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+    antes, depois = (int(value) for value in result.stdout.split())
+    return elapsed, antes / 1024, depois / 1024
+
+
+def bench_streaming(args):
+    modes = [("em memoria", [])]
+    modes.append(
+        (f"blocos de {args.chunksize:,}", ["--chunksize", str(args.chunksize)])
+    )
+    modes.append(
+        (
+            "blocos sem intermediarios",
+            ["--chunksize", str(args.chunksize), "--sem-intermediarios"],
+        )
+    )
+    for rows in [int(value) for value in args.rows.split(",")]:
+        with tempfile.TemporaryDirectory() as root:
+            build_synthetic_pipeline(root, rows)
+            size = os.path.getsize(
+                os.path.join(root, run_transformation.CONSOLIDATED_CSV_PATH)
+            )
+            print(f"{rows:,} linhas ({size / 1e6:.0f} MB de CSV)")
+            agregados = {}
+            for label, argv in modes:
+                elapsed, antes, depois = peak_rss(root, argv)
+                agregados[label] = pd.read_csv(
+                    os.path.join(root, run_transformation.AGGREGATED_CSV_PATH),
+                    sep=";",
+                    decimal=",",
+                )
+                print(
+                    f"  {label:>26}: {elapsed:6.2f}s, pico RSS {depois:7.1f} MiB "
+                    f"(+{depois - antes:.1f} MiB apos imports)"
+                )
+            base = agregados.pop("em memoria")
+            for agregado in agregados.values():
+                pd.testing.assert_frame_equal(
+                    agregado.reset_index(drop=True), base.reset_index(drop=True)
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks das etapas de transformacao (Teste 2)."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    validacao = subparsers.add_parser(
+        "validacao", help="Validacao de CNPJ: apply x vetorizada (2.1)."
+    )
+    validacao.add_argument("--rows", type=int, default=10_000_000)
+    validacao.add_argument(
+        "--distinct",
+        type=int,
+        default=0,
+        help="Numero de CNPJs distintos (0 = todas as linhas distintas).",
+    )
+    validacao.add_argument(
+        "--sample",
+        type=int,
+        default=1_000_000,
+        help="Linhas validadas com apply (o tempo total e extrapolado).",
+    )
+    validacao.set_defaults(func=bench_validacao)
+
+    streaming = subparsers.add_parser(
+        "streaming", help="Pico de memoria: em memoria x --chunksize (2.1-2.3)."
+    )
+    streaming.add_argument("--rows", default="500000,1000000,2000000")
+    streaming.add_argument("--chunksize", type=int, default=100_000)
+    streaming.set_defaults(func=bench_streaming)
+
+    args = parser.parse_args()
+    args.func(args)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,12 +1,30 @@
+import argparse
 import os
-import re
+import sys
 import zipfile
 
+import numpy as np
 import pandas as pd
 
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except Exception:  # pragma: no cover - dependência opcional
+    pa = None
+    pq = None
+
+# Módulo compartilhado de operadoras (teste_api_ans/operadoras_lookup.py)
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "teste_api_ans")
+)
+import cnpj_cache  # noqa: E402
+import operadoras_lookup  # noqa: E402
+
 # --- Caminhos dos Arquivos ---
 # Saída do Teste 1
 CONSOLIDATED_CSV_PATH = os.path.join("data", "processed", "consolidado_despesas.csv")
+# Cópia colunar opcional (consolidate_ans_expenses.py --parquet)
+CONSOLIDATED_PARQUET_PATH = os.path.splitext(CONSOLIDATED_CSV_PATH)[0] + ".parquet"
 # Saída da Etapa 2.1
 VALIDATED_CSV_PATH = os.path.join(
     "teste_transformacao_validacao", "2.1_dados_validados.csv"
@@ -16,6 +34,8 @@ OPERADORAS_URL = "https://dadosabertos.ans.gov.br/FTP/PDA/operadoras_de_plano_de
 OPERADORAS_LOCAL_PATH = os.path.join(
     "teste_transformacao_validacao", "operadoras_ativas.csv"
 )
+# CSV original do CADOP, compartilhado com a consolidação (Teste 1.3)
+OPERADORAS_CADOP_PATH = operadoras_lookup.DEFAULT_CADOP_PATH
 # Saída da Etapa 2.2
 ENRICHED_CSV_PATH = os.path.join(
     "teste_transformacao_validacao", "2.2_dados_enriquecidos.csv"
@@ -27,59 +47,164 @@ AGGREGATED_CSV_PATH = os.path.join(
 AGGREGATED_ZIP_NAME = os.getenv("TESTE_ZIP_NAME", "Teste_Mateus.zip")
 AGGREGATED_ZIP_PATH = os.path.join("teste_transformacao_validacao", AGGREGATED_ZIP_NAME)
 
+# --- Validação vetorizada ---
+# Pesos dos dígitos verificadores do CNPJ (1º sobre 12 dígitos, 2º sobre 13)
+PESOS_DV1 = np.array(cnpj_cache.DV1_WEIGHTS, dtype=np.int16)
+PESOS_DV2 = np.array(cnpj_cache.DV2_WEIGHTS, dtype=np.int16)
+# Ordem dos problemas na coluna problemas_validacao (bit i = problema i)
+PROBLEMAS_VALIDACAO = ("cnpj_invalido", "valor_nao_positivo", "razao_social_vazia")
+ROTULOS_PROBLEMAS = np.array(
+    [
+        ",".join(p for i, p in enumerate(PROBLEMAS_VALIDACAO) if codigo >> i & 1)
+        for codigo in range(1 << len(PROBLEMAS_VALIDACAO))
+    ],
+    dtype=object,
+)
 
-def validar_cnpj(cnpj: str) -> bool:
-    """Valida um CNPJ com base no formato e nos dígitos verificadores."""
-    cnpj = "".join(re.findall(r"\d", str(cnpj)))
-    if len(cnpj) != 14:
-        return False
-    if len(set(cnpj)) == 1:
-        return False
-
-    # Validação do primeiro dígito verificador
-    soma = sum(int(cnpj[i]) * (5 - i if i < 4 else 13 - i) for i in range(12))
-    dv1 = 0 if (soma % 11) < 2 else 11 - (soma % 11)
-    if dv1 != int(cnpj[12]):
-        return False
-
-    # Validação do segundo dígito verificador
-    soma = sum(int(cnpj[i]) * (6 - i if i < 5 else 14 - i) for i in range(13))
-    dv2 = 0 if (soma % 11) < 2 else 11 - (soma % 11)
-    if dv2 != int(cnpj[13]):
-        return False
-
-    return True
+# --- Agregação ---
+CHAVES_AGREGACAO = ["RazaoSocial", "UF"]
+CHAVES_TRIMESTRE = CHAVES_AGREGACAO + ["Ano", "Trimestre"]
+COLUNAS_AGREGADAS = [
+    "RazaoSocial",
+    "UF",
+    "total_despesas",
+    "media_despesas_trimestre",
+    "desvio_padrao_despesas",
+]
 
 
-def run_validation():
-    """Executa a etapa de validação dos dados do arquivo consolidado."""
-    print("--- Iniciando Etapa 2.1: Validação de Dados ---")
-    if not os.path.exists(CONSOLIDATED_CSV_PATH):
-        print(f"Erro: Arquivo consolidado não encontrado em '{CONSOLIDATED_CSV_PATH}'.")
-        print("Por favor, execute os scripts do Teste 1 primeiro.")
-        return None
+def validar_cnpj(cnpj: str) -> bool:
+    """Valida um CNPJ com base no formato e nos dígitos verificadores.
+
+    Usa o cache compartilhado de teste_api_ans/cnpj_cache.py: cada valor
+    distinto é validado uma única vez por execução.
+    """
+    return cnpj_cache.is_valid_cnpj(str(cnpj))
+
+
+def digito_verificador(matriz: np.ndarray, pesos: np.ndarray) -> np.ndarray:
+    """Calcula um dígito verificador para cada linha da matriz de dígitos."""
+    resto = (matriz[:, : len(pesos)] @ pesos) % 11
+    return np.where(resto < 2, 0, 11 - resto)
+
+
+def matriz_digitos(digitos: pd.Series) -> np.ndarray:
+    """Converte strings de 14 dígitos ASCII numa matriz (n, 14) de uint8.
+
+    Com pyarrow, os bytes são lidos direto do buffer da coluna, sem criar
+    objetos Python por linha; sem ele, as strings são concatenadas.
+    """
+    if pa is None:
+        bruto = np.frombuffer("".join(digitos).encode("ascii"), dtype=np.uint8)
+    else:
+        arr = pa.array(digitos)
+        if isinstance(arr, pa.ChunkedArray):
+            arr = arr.combine_chunks()
+        largura = np.int64 if pa.types.is_large_string(arr.type) else np.int32
+        offsets = np.frombuffer(arr.buffers()[1], dtype=largura)
+        inicio, fim = offsets[arr.offset], offsets[arr.offset + len(arr)]
+        bruto = np.frombuffer(arr.buffers()[2], dtype=np.uint8)[inicio:fim]
+    return (bruto - ord("0")).reshape(-1, 14)
+
+
+def validar_cnpj_vetorizado(cnpjs: pd.Series) -> np.ndarray:
+    """Versão vetorizada de validar_cnpj para uma coluna inteira.
+
+    Só os valores distintos são validados (em geral poucos milhares de
+    operadoras para milhões de linhas); o resultado volta para cada linha
+    pelos códigos de pd.factorize.
+    """
+    return cnpj_cache.map_distinct(cnpjs, validar_cnpjs_distintos, False)
+
+
+def validar_cnpjs_distintos(cnpjs: pd.Series) -> np.ndarray:
+    """Valida uma coluna de CNPJs sem deduplicar.
+
+    Os CNPJs com 14 dígitos viram uma matriz (n, 14) de inteiros e os dois
+    dígitos verificadores são calculados com produtos matriciais. Valores com
+    dígitos não ASCII seguem pela validação escalar, como no regex de
+    validar_cnpj.
+    """
+    texto = cnpjs.astype(str)
+    digitos = texto.str.replace(r"[^0-9]", "", regex=True)
+    validos = (digitos.str.len() == 14).fillna(False).to_numpy(dtype=bool, copy=True)
+
+    if validos.any():
+        matriz = matriz_digitos(digitos[validos])
+        ok = (matriz != matriz[:, :1]).any(axis=1)
+        ok &= matriz[:, 12] == digito_verificador(matriz, PESOS_DV1)
+        ok &= matriz[:, 13] == digito_verificador(matriz, PESOS_DV2)
+        validos[validos] = ok
+
+    nao_ascii = ~texto.str.isascii().fillna(True).to_numpy(dtype=bool)
+    if nao_ascii.any():
+        validos[nao_ascii] = [validar_cnpj(valor) for valor in cnpjs[nao_ascii]]
+    return validos
+
+
+def rotular_problemas(*mascaras: np.ndarray) -> np.ndarray:
+    """Monta os rótulos de problemas a partir de uma máscara por problema."""
+    codigos = np.zeros(len(mascaras[0]), dtype=np.int8)
+    for bit, mascara in enumerate(mascaras):
+        codigos |= np.asarray(mascara, dtype=np.int8) << bit
+    return ROTULOS_PROBLEMAS[codigos]
+
+
+def consolidado_parquet_atualizado() -> bool:
+    """Indica se a cópia Parquet do consolidado é mais nova que o CSV."""
+    return os.path.exists(CONSOLIDATED_PARQUET_PATH) and os.path.getmtime(
+        CONSOLIDATED_PARQUET_PATH
+    ) >= os.path.getmtime(CONSOLIDATED_CSV_PATH)
+
+
+def carregar_consolidado():
+    """Lê o consolidado, preferindo o Parquet quando ele está atualizado.
+
+    O Parquet só é usado se for mais novo que o CSV e se o pandas tiver um
+    engine de Parquet (pyarrow) disponível; caso contrário, lê o CSV.
+    """
+    if consolidado_parquet_atualizado():
+        try:
+            return pd.read_parquet(CONSOLIDATED_PARQUET_PATH)
+        except ImportError:
+            pass
+    return pd.read_csv(CONSOLIDATED_CSV_PATH, dtype={"CNPJ": str, "RazaoSocial": str})
+
+
+def iterar_consolidado(chunksize: int):
+    """Lê o consolidado em blocos de até chunksize linhas.
+
+    Usa os row groups do Parquet (via pyarrow) quando ele está atualizado e,
+    caso contrário, o leitor em blocos do pandas sobre o CSV.
+    """
+    if pq is not None and consolidado_parquet_atualizado():
+        arquivo = pq.ParquetFile(CONSOLIDATED_PARQUET_PATH)
+        for lote in arquivo.iter_batches(batch_size=chunksize):
+            yield lote.to_pandas()
+        return
+    yield from pd.read_csv(
+        CONSOLIDATED_CSV_PATH,
+        dtype={"CNPJ": str, "RazaoSocial": str},
+        chunksize=chunksize,
+    )
 
-    df = pd.read_csv(CONSOLIDATED_CSV_PATH, dtype={"CNPJ": str, "RazaoSocial": str})
-    print(f"{len(df)} linhas carregadas para validação.")
 
-    validation_issues = [[] for _ in range(len(df))]
-    is_cnpj_valid = df["CNPJ"].apply(validar_cnpj)
-    for i, is_valid in enumerate(is_cnpj_valid):
-        if not is_valid:
-            validation_issues[i].append("cnpj_invalido")
+def validar_bloco(df: pd.DataFrame) -> pd.DataFrame:
+    """Adiciona a coluna problemas_validacao e mantém as colunas da etapa 2.1."""
+    cnpj_invalido = ~validar_cnpj_vetorizado(df["CNPJ"])
 
     df["ValorDespesas"] = pd.to_numeric(df["ValorDespesas"], errors="coerce")
-    for i, value in enumerate(df["ValorDespesas"]):
-        if pd.isna(value) or value <= 0:
-            validation_issues[i].append("valor_nao_positivo")
+    valor_positivo = df["ValorDespesas"].gt(0).fillna(False)
+    valor_nao_positivo = ~valor_positivo.to_numpy(dtype=bool)
 
-    for i, razao in enumerate(df["RazaoSocial"]):
-        if pd.isna(razao) or str(razao).strip() == "":
-            validation_issues[i].append("razao_social_vazia")
+    razao = df["RazaoSocial"]
+    razao_social_vazia = (
+        razao.isna() | razao.astype(str).str.strip().eq("").fillna(False)
+    ).to_numpy(dtype=bool)
 
-    df["problemas_validacao"] = [
-        ",".join(issues) if issues else "" for issues in validation_issues
-    ]
+    df["problemas_validacao"] = rotular_problemas(
+        cnpj_invalido, valor_nao_positivo, razao_social_vazia
+    )
 
     cols = [
         "CNPJ",
@@ -89,51 +214,87 @@ def run_validation():
         "ValorDespesas",
         "problemas_validacao",
     ]
-    df = df[cols]
+    return df[cols]
 
-    df.to_csv(VALIDATED_CSV_PATH, index=False, sep=";", decimal=",")
-    print(f"Arquivo com dados validados salvo em: '{VALIDATED_CSV_PATH}'")
 
+def resumo_problemas(df: pd.DataFrame) -> pd.Series:
+    """Conta as ocorrências de cada problema de validação."""
     issues_series = (
         pd.Series(df.loc[:, "problemas_validacao"]).fillna("").astype("string")
     )
-    total_issues = issues_series.str.get_dummies(sep=",").sum()
+    return issues_series.str.get_dummies(sep=",").sum()
+
+
+def run_validation():
+    """Executa a etapa de validação dos dados do arquivo consolidado."""
+    print("--- Iniciando Etapa 2.1: Validação de Dados ---")
+    if not os.path.exists(CONSOLIDATED_CSV_PATH):
+        print(f"Erro: Arquivo consolidado não encontrado em '{CONSOLIDATED_CSV_PATH}'.")
+        print("Por favor, execute os scripts do Teste 1 primeiro.")
+        return None
+
+    df = carregar_consolidado()
+    print(f"{len(df)} linhas carregadas para validação.")
+
+    df = validar_bloco(df)
+
+    df.to_csv(VALIDATED_CSV_PATH, index=False, sep=";", decimal=",")
+    print(f"Arquivo com dados validados salvo em: '{VALIDATED_CSV_PATH}'")
+
     print("\nResumo dos problemas de validação encontrados:")
-    print(total_issues)
+    print(resumo_problemas(df))
     print("--- Etapa 2.1 Concluída ---\n")
     return df
 
 
-def run_enrichment(df_validated):
-    """Executa a etapa de enriquecimento de dados."""
-    print("--- Iniciando Etapa 2.2: Enriquecimento de Dados ---")
-    if df_validated is None:
-        print("Etapa de enriquecimento pulada pois não há dados da etapa anterior.")
-        return None
+def carregar_operadoras():
+    """Baixa/lê o CADOP e devolve o cadastro indexado por CNPJ para o join.
 
+    Mantém uma linha por CNPJ (a última do cadastro, via índice por CNPJ do
+    lookup) com as colunas RegistroANS, Modalidade e UF. Retorna None se o
+    cadastro não puder ser obtido.
+    """
     try:
-        print(f"Baixando dados cadastrais de '{OPERADORAS_URL}'...")
-        df_operadoras = pd.read_csv(
-            OPERADORAS_URL, sep=";", encoding="latin1", dtype={"CNPJ": str}
-        )
-        df_operadoras.to_csv(OPERADORAS_LOCAL_PATH, index=False, sep=";")
+        status = operadoras_lookup.fetch_cadop(OPERADORAS_URL, OPERADORAS_CADOP_PATH)
+        print(f"Cadastro de operadoras ({status}): '{OPERADORAS_CADOP_PATH}'")
+        lookup = operadoras_lookup.load_lookup(OPERADORAS_CADOP_PATH)
+        lookup.to_frame().to_csv(OPERADORAS_LOCAL_PATH, index=False, sep=";")
         print(f"Dados cadastrais salvos em '{OPERADORAS_LOCAL_PATH}'")
     except Exception as e:
         print(f"Erro ao baixar ou processar o arquivo de operadoras: {e}")
         return None
 
-    df_operadoras.drop_duplicates(subset="CNPJ", keep="last", inplace=True)
+    df_operadoras = lookup.to_frame(sorted(lookup.by_cnpj.values()))
 
     cols_to_join = ["CNPJ", "REGISTRO_OPERADORA", "Modalidade", "UF"]
     df_operadoras_subset: pd.DataFrame = df_operadoras.loc[:, cols_to_join]
-    df_operadoras_join = df_operadoras_subset.rename(
+    return df_operadoras_subset.rename(
         columns={"REGISTRO_OPERADORA": "RegistroANS"}
-    )
+    ).set_index("CNPJ")
+
+
+def enriquecer_bloco(df: pd.DataFrame, operadoras: pd.DataFrame) -> pd.DataFrame:
+    """Left join por CNPJ contra o cadastro indexado, preservando as linhas."""
+    cadastro = operadoras.reindex(df["CNPJ"].to_numpy())
+    cadastro.index = df.index
+    return pd.concat([df, cadastro], axis=1)
+
+
+def run_enrichment(df_validated):
+    """Executa a etapa de enriquecimento de dados."""
+    print("--- Iniciando Etapa 2.2: Enriquecimento de Dados ---")
+    if df_validated is None:
+        print("Etapa de enriquecimento pulada pois não há dados da etapa anterior.")
+        return None
+
+    operadoras = carregar_operadoras()
+    if operadoras is None:
+        return None
 
     df_to_join = df_validated[df_validated["problemas_validacao"] == ""].copy()
     print(f"Número de linhas com CNPJ válido para enriquecimento: {len(df_to_join)}")
 
-    df_enriched = pd.merge(df_validated, df_operadoras_join, on="CNPJ", how="left")
+    df_enriched = enriquecer_bloco(df_validated, operadoras)
 
     df_enriched.to_csv(ENRICHED_CSV_PATH, index=False, sep=";", decimal=",")
     print(f"Arquivo com dados enriquecidos salvo em: '{ENRICHED_CSV_PATH}'")
@@ -161,25 +322,8 @@ def run_aggregation(df_enriched):
     df_valid = df_enriched[df_enriched["problemas_validacao"] == ""].copy()
     if df_valid.empty:
         print("Nenhuma linha valida para agregacao.")
-        df_agg = pd.DataFrame(
-            columns=pd.Index(
-                [
-                    "RazaoSocial",
-                    "UF",
-                    "total_despesas",
-                    "media_despesas_trimestre",
-                    "desvio_padrao_despesas",
-                ]
-            )
-        )
-        df_agg.to_csv(AGGREGATED_CSV_PATH, index=False, sep=";", decimal=",")
-        print(f"Arquivo com despesas agregadas salvo em: '{AGGREGATED_CSV_PATH}'")
-        os.makedirs(os.path.dirname(AGGREGATED_ZIP_PATH), exist_ok=True)
-        with zipfile.ZipFile(
-            AGGREGATED_ZIP_PATH, "w", compression=zipfile.ZIP_DEFLATED
-        ) as zf:
-            zf.write(AGGREGATED_CSV_PATH, arcname=os.path.basename(AGGREGATED_CSV_PATH))
-        print(f"Arquivo compactado salvo em: '{AGGREGATED_ZIP_PATH}'")
+        df_agg = pd.DataFrame(columns=pd.Index(COLUNAS_AGREGADAS))
+        salvar_agregado(df_agg)
         print("--- Etapa 2.3 Concluida ---\n")
         return df_agg
 
@@ -216,6 +360,13 @@ def run_aggregation(df_enriched):
     df_agg = totals.merge(stats, on=["RazaoSocial", "UF"], how="left")
     df_agg = df_agg.sort_values("total_despesas", ascending=False)
 
+    salvar_agregado(df_agg)
+    print("--- Etapa 2.3 Concluida ---\n")
+    return df_agg
+
+
+def salvar_agregado(df_agg: pd.DataFrame) -> None:
+    """Grava o CSV agregado e o ZIP de entrega."""
     df_agg.to_csv(AGGREGATED_CSV_PATH, index=False, sep=";", decimal=",")
     print(f"Arquivo com despesas agregadas salvo em: '{AGGREGATED_CSV_PATH}'")
     os.makedirs(os.path.dirname(AGGREGATED_ZIP_PATH), exist_ok=True)
@@ -225,13 +376,171 @@ def run_aggregation(df_enriched):
         zf.write(AGGREGATED_CSV_PATH, arcname=os.path.basename(AGGREGATED_CSV_PATH))
     print(f"Arquivo compactado salvo em: '{AGGREGATED_ZIP_PATH}'")
 
-    print("--- Etapa 2.3 Concluida ---\n")
+
+def agregar_parcial(df_enriched: pd.DataFrame) -> pd.Series:
+    """Soma ValorDespesas por operadora/UF e trimestre nas linhas sem problemas.
+
+    Linhas sem Ano/Trimestre ficam num grupo com chave nula: entram no total,
+    mas não na média/desvio padrão.
+    """
+    df_valid = df_enriched[df_enriched["problemas_validacao"] == ""]
+    df_valid = df_valid.assign(
+        ValorDespesas=pd.to_numeric(df_valid["ValorDespesas"], errors="coerce"),
+        Ano=pd.to_numeric(df_valid["Ano"], errors="coerce"),
+        Trimestre=pd.to_numeric(df_valid["Trimestre"], errors="coerce"),
+    )
+    return df_valid.groupby(CHAVES_TRIMESTRE, dropna=False)["ValorDespesas"].sum()
+
+
+def somar_parciais(acumulado, parcial: pd.Series) -> pd.Series:
+    """Funde duas somas parciais por (RazaoSocial, UF, Ano, Trimestre)."""
+    if acumulado is None:
+        return parcial
+    return (
+        pd.concat([acumulado, parcial])
+        .groupby(level=CHAVES_TRIMESTRE, dropna=False)
+        .sum()
+    )
+
+
+def combinar_momentos(a, b):
+    """Combina momentos (n, média, M2) de conjuntos disjuntos, por grupo.
+
+    Fórmula paralela de Chan, Golub e LeVeque: usa a diferença entre as
+    médias em vez de somas de quadrados, evitando cancelamento catastrófico
+    com valores grandes. Grupos com n = 0 em um dos lados são neutros.
+    """
+    n_a, media_a, m2_a = a
+    n_b, media_b, m2_b = b
+    n = n_a + n_b
+    delta = media_b - media_a
+    peso_b = np.divide(n_b, n, out=np.zeros(len(n)), where=n > 0)
+    media = media_a + delta * peso_b
+    m2 = m2_a + m2_b + delta**2 * n_a * peso_b
+    return n, media, m2
+
+
+def finalizar_agregacao(parciais) -> pd.DataFrame:
+    """Monta o agregado final a partir das somas por trimestre.
+
+    A média e o desvio padrão são sobre os totais trimestrais; como um
+    trimestre pode chegar em vários blocos, eles só são calculados aqui,
+    combinando um trimestre por vez com combinar_momentos.
+    """
+    if parciais is None or parciais.empty:
+        return pd.DataFrame(columns=pd.Index(COLUNAS_AGREGADAS))
+
+    totais = parciais.groupby(level=CHAVES_AGREGACAO, dropna=False).sum()
+    trimestrais = parciais.reset_index().dropna(subset=["Ano", "Trimestre"])
+    grupos = totais.index.get_indexer(
+        pd.MultiIndex.from_frame(trimestrais[CHAVES_AGREGACAO])
+    )
+
+    zeros = np.zeros(len(totais))
+    momentos = (zeros, zeros, zeros)
+    valores = trimestrais["ValorDespesas"].to_numpy(dtype=float)
+    for posicoes in trimestrais.groupby(["Ano", "Trimestre"]).indices.values():
+        n_b = zeros.copy()
+        media_b = zeros.copy()
+        n_b[grupos[posicoes]] = 1.0
+        media_b[grupos[posicoes]] = valores[posicoes]
+        momentos = combinar_momentos(momentos, (n_b, media_b, zeros))
+
+    n, media, m2 = momentos
+    df_agg = totais.rename("total_despesas").reset_index()
+    df_agg["media_despesas_trimestre"] = np.where(n > 0, media, np.nan)
+    df_agg["desvio_padrao_despesas"] = np.sqrt(
+        np.divide(m2, n - 1, out=np.full(len(n), np.nan), where=n > 1)
+    )
+    return df_agg.sort_values("total_despesas", ascending=False)
+
+
+def gravar_bloco(df: pd.DataFrame, path: str, primeiro: bool) -> None:
+    """Grava (ou acrescenta) um bloco no CSV intermediário."""
+    df.to_csv(
+        path,
+        mode="w" if primeiro else "a",
+        header=primeiro,
+        index=False,
+        sep=";",
+        decimal=",",
+    )
+
+
+def run_streaming(chunksize: int, intermediarios: bool = True):
+    """Executa as etapas 2.1 a 2.3 em blocos de chunksize linhas.
+
+    Cada bloco é validado, enriquecido contra o cadastro em memória e somado
+    por operadora/UF/trimestre; só as somas parciais ficam em memória, então
+    o pico não depende do tamanho do consolidado. Os CSVs intermediários são
+    gravados por acréscimo (ou omitidos com intermediarios=False).
+    """
+    print(f"--- Modo em blocos: {chunksize} linhas por bloco ---")
+    if not os.path.exists(CONSOLIDATED_CSV_PATH):
+        print(f"Erro: Arquivo consolidado não encontrado em '{CONSOLIDATED_CSV_PATH}'.")
+        print("Por favor, execute os scripts do Teste 1 primeiro.")
+        return None
+
+    operadoras = carregar_operadoras()
+    if operadoras is None:
+        print("Enriquecimento e agregacao pulados pois nao ha cadastro de operadoras.")
+
+    linhas = 0
+    enriquecidas = 0
+    resumo = pd.Series(dtype="int64")
+    parciais = None
+    for numero, bloco in enumerate(iterar_consolidado(chunksize)):
+        bloco = validar_bloco(bloco)
+        linhas += len(bloco)
+        resumo = resumo.add(resumo_problemas(bloco), fill_value=0)
+        if intermediarios:
+            gravar_bloco(bloco, VALIDATED_CSV_PATH, numero == 0)
+        if operadoras is None:
+            continue
+
+        bloco = enriquecer_bloco(bloco, operadoras)
+        enriquecidas += int(bloco["RegistroANS"].notna().sum())
+        if intermediarios:
+            gravar_bloco(bloco, ENRICHED_CSV_PATH, numero == 0)
+        parciais = somar_parciais(parciais, agregar_parcial(bloco))
+
+    print(f"{linhas} linhas validadas.")
+    print("\nResumo dos problemas de validação encontrados:")
+    print(resumo.astype("int64"))
+    if operadoras is None:
+        return None
+
+    print(f" - {enriquecidas} de {linhas} linhas foram enriquecidas com sucesso.")
+    df_agg = finalizar_agregacao(parciais)
+    salvar_agregado(df_agg)
+    print("--- Modo em blocos concluido ---\n")
     return df_agg
 
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Teste 2: validação, enriquecimento e agregação das despesas."
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=0,
+        help="Processa o consolidado em blocos de N linhas (0 = tudo em memória).",
+    )
+    parser.add_argument(
+        "--sem-intermediarios",
+        action="store_true",
+        help="No modo em blocos, não grava os CSVs das etapas 2.1 e 2.2.",
+    )
+    args = parser.parse_args(argv)
+
     print("--- Iniciando Teste 2: Transformação e Validação de Dados ---\n")
 
+    if args.chunksize > 0:
+        run_streaming(args.chunksize, intermediarios=not args.sem_intermediarios)
+        print("\n--- Teste 2 concluído ---")
+        return 0
+
     # Etapa 2.1: Validação
     df_validated = run_validation()
 
@@ -242,7 +551,8 @@ def main():
     run_aggregation(df_enriched)
 
     print("\n--- Teste 2 concluído ---")
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(main())
@@ -0,0 +1,169 @@
+import random
+
+import numpy as np
+import pandas as pd
+
+import run_transformation
+
+
+def gerar_cnpj(rng: random.Random) -> str:
+    base = [rng.randrange(10) for _ in range(12)]
+    for pesos in (run_transformation.PESOS_DV1, run_transformation.PESOS_DV2):
+        resto = sum(d * int(p) for d, p in zip(base, pesos)) % 11
+        base.append(0 if resto < 2 else 11 - resto)
+    return "".join(str(d) for d in base)
+
+
+def problemas_escalares(df: pd.DataFrame) -> list:
+    problemas = []
+    for cnpj, valor, razao in zip(df["CNPJ"], df["ValorDespesas"], df["RazaoSocial"]):
+        linha = []
+        if not run_transformation.validar_cnpj(cnpj):
+            linha.append("cnpj_invalido")
+        valor = pd.to_numeric(valor, errors="coerce")
+        if pd.isna(valor) or valor <= 0:
+            linha.append("valor_nao_positivo")
+        if pd.isna(razao) or str(razao).strip() == "":
+            linha.append("razao_social_vazia")
+        problemas.append(",".join(linha))
+    return problemas
+
+
+def test_vetorizado_igual_ao_escalar(monkeypatch):
+    """Testa a paridade de validar_cnpj_vetorizado com validar_cnpj."""
+    rng = random.Random(42)
+    validos = [gerar_cnpj(rng) for _ in range(500)]
+    valores = list(validos)
+    valores += [c[:13] + str((int(c[13]) + 1) % 10) for c in validos[:100]]
+    valores += [c[:12] + str((int(c[12]) + 3) % 10) + c[13] for c in validos[:100]]
+    valores += [f"{c[:2]}.{c[2:5]}.{c[5:8]}/{c[8:12]}-{c[12:]}" for c in validos[:50]]
+    valores += [c[:13] for c in validos[:20]] + [c + "0" for c in validos[:20]]
+    valores += [
+        "".join(rng.choice("0123456789") for _ in range(14)) for _ in range(300)
+    ]
+    valores += ["11111111111111", "00000000000000", "", " ", "abc", None, np.nan]
+    valores += ["١١٢٢٢٣٣٣٠٠٠١٨١", "11.222.333/0001-81"]
+
+    serie = pd.Series(valores, dtype=object)
+    esperado = [run_transformation.validar_cnpj(v) for v in valores]
+    assert run_transformation.validar_cnpj_vetorizado(serie).tolist() == esperado
+    assert run_transformation.validar_cnpjs_distintos(serie).tolist() == esperado
+    assert (
+        run_transformation.validar_cnpj_vetorizado(
+            pd.Series(valores[:-4], dtype="string")
+        ).tolist()
+        == esperado[:-4]
+    )
+
+    monkeypatch.setattr(run_transformation, "pa", None)
+    assert run_transformation.validar_cnpj_vetorizado(serie).tolist() == esperado
+
+
+def test_run_validation_monta_problemas(tmp_path, monkeypatch):
+    """Testa que run_validation gera os mesmos problemas da versão por linha."""
+    rng = random.Random(7)
+    cnpjs = [gerar_cnpj(rng) for _ in range(6)] + ["123", "11111111111111"]
+    df = pd.DataFrame(
+        {
+            "CNPJ": cnpjs,
+            "RazaoSocial": ["A", "", None, "  ", "B", "C", "D", None],
+            "Trimestre": [1] * 8,
+            "Ano": [2024] * 8,
+            "ValorDespesas": ["10.5", "0", "-1", "x", None, "3", "4", "0"],
+        }
+    )
+    consolidado = tmp_path / "consolidado.csv"
+    df.to_csv(consolidado, index=False)
+    monkeypatch.setattr(run_transformation, "CONSOLIDATED_CSV_PATH", str(consolidado))
+    monkeypatch.setattr(
+        run_transformation, "CONSOLIDATED_PARQUET_PATH", str(tmp_path / "x.parquet")
+    )
+    monkeypatch.setattr(
+        run_transformation, "VALIDATED_CSV_PATH", str(tmp_path / "validado.csv")
+    )
+
+    resultado = run_transformation.run_validation()
+
+    esperado = problemas_escalares(run_transformation.carregar_consolidado())
+    assert resultado["problemas_validacao"].tolist() == esperado
+    assert esperado[0] == ""
+    assert esperado[-1] == "cnpj_invalido,valor_nao_positivo,razao_social_vazia"
+
+
+def test_combinar_momentos_igual_ao_numpy():
+    """Testa a combinação paralela de média/M2 contra o numpy, com offset alto."""
+    rng = np.random.default_rng(0)
+    valores = 1e9 + rng.normal(0, 1, size=(3, 40))
+    momentos = (np.zeros(3), np.zeros(3), np.zeros(3))
+    for inicio in range(0, 40, 7):
+        parte = valores[:, inicio : inicio + 7]
+        bloco = (
+            np.full(3, parte.shape[1], dtype=float),
+            parte.mean(axis=1),
+            ((parte - parte.mean(axis=1, keepdims=True)) ** 2).sum(axis=1),
+        )
+        momentos = run_transformation.combinar_momentos(momentos, bloco)
+    n, media, m2 = momentos
+    assert n.tolist() == [40, 40, 40]
+    np.testing.assert_allclose(media, valores.mean(axis=1), rtol=1e-15)
+    np.testing.assert_allclose(np.sqrt(m2 / (n - 1)), valores.std(axis=1, ddof=1))
+
+
+def test_modo_em_blocos_igual_ao_em_memoria(tmp_path, monkeypatch):
+    """Testa que --chunksize gera as mesmas saídas do modo em memória."""
+    rng = random.Random(11)
+    cnpjs = [gerar_cnpj(rng) for _ in range(4)]
+    cadop = tmp_path / "cadop.csv"
+    cadop.write_text(
+        "REGISTRO_OPERADORA;CNPJ;Razao_Social;Modalidade;UF\n"
+        f"1;{cnpjs[0]};OP A;Medicina de Grupo;SP\n"
+        f"2;{cnpjs[1]};OP B;Cooperativa Medica;MG\n"
+        f"3;{cnpjs[2]};OP C;Odontologia de Grupo;SP\n",
+        encoding="utf-8",
+    )
+    linhas = []
+    for ano in (2023, 2024):
+        for trimestre in (1, 2, 3, 4):
+            for idx, cnpj in enumerate(cnpjs):
+                for parte in range(2):
+                    valor = 1e6 * (idx + 1) + trimestre * 1234.5 + parte + ano
+                    linhas.append((cnpj, f"OP {idx}", trimestre, ano, valor))
+    linhas += [
+        ("123", "OP X", 1, 2024, 10.0),
+        (cnpjs[0], "OP 0", None, None, 77.0),
+        (cnpjs[1], "OP 1", 2, 2024, -5.0),
+        (cnpjs[2], "", 3, 2024, 9.0),
+    ]
+    rng.shuffle(linhas)
+    consolidado = tmp_path / "consolidado.csv"
+    pd.DataFrame(
+        linhas, columns=["CNPJ", "RazaoSocial", "Trimestre", "Ano", "ValorDespesas"]
+    ).to_csv(consolidado, index=False)
+
+    monkeypatch.setenv("ANS_OFFLINE", "1")
+    caminhos = {
+        "CONSOLIDATED_CSV_PATH": consolidado,
+        "CONSOLIDATED_PARQUET_PATH": tmp_path / "ausente.parquet",
+        "OPERADORAS_CADOP_PATH": cadop,
+        "OPERADORAS_LOCAL_PATH": tmp_path / "operadoras_ativas.csv",
+        "VALIDATED_CSV_PATH": tmp_path / "validado.csv",
+        "ENRICHED_CSV_PATH": tmp_path / "enriquecido.csv",
+        "AGGREGATED_CSV_PATH": tmp_path / "agregado.csv",
+        "AGGREGATED_ZIP_PATH": tmp_path / "agregado.zip",
+    }
+    for nome, caminho in caminhos.items():
+        monkeypatch.setattr(run_transformation, nome, str(caminho))
+
+    saidas = ["validado.csv", "enriquecido.csv", "agregado.csv"]
+    assert run_transformation.main([]) == 0
+    em_memoria = {nome: (tmp_path / nome).read_bytes() for nome in saidas}
+    assert run_transformation.main(["--chunksize", "5"]) == 0
+    em_blocos = {nome: (tmp_path / nome).read_bytes() for nome in saidas}
+
+    assert em_blocos["validado.csv"] == em_memoria["validado.csv"]
+    assert em_blocos["enriquecido.csv"] == em_memoria["enriquecido.csv"]
+    agregado_em_blocos = pd.read_csv(tmp_path / "agregado.csv", sep=";", decimal=",")
+    (tmp_path / "agregado.csv").write_bytes(em_memoria["agregado.csv"])
+    agregado_em_memoria = pd.read_csv(tmp_path / "agregado.csv", sep=";", decimal=",")
+    assert len(agregado_em_memoria) == 4
+    pd.testing.assert_frame_equal(agregado_em_blocos, agregado_em_memoria, rtol=1e-12)